@@ -3,13 +3,24 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
 import os
+import time
 
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor. Hashes with any other cost are flagged by needs_update()
+# and replaced on the user's next login (see auth_router.login).
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -35,13 +46,88 @@ def decode_token(token: str) -> dict:
             detail="Invalid authentication credentials"
         )
 
-async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+# Slim per-request view of the authenticated user, enough for auth/role checks
+# and the common handler needs without loading the full document (photos etc.)
+@dataclass(slots=True)
+class UserContext:
+    id: str
+    email: str = ""
+    name: str = ""
+    blocked: bool = False
+    profile_completed: bool = False
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    city: Optional[str] = None
+    smoking: Optional[str] = None
+    is_admin: bool = False
+    is_super_admin: bool = False
+    admin_permissions: List[str] = field(default_factory=list)
+    active_subscription: Optional[str] = None
+    subscription_expires_at: Optional[datetime] = None
+
+USER_CONTEXT_PROJECTION = {"_id": 0, **{name: 1 for name in UserContext.__dataclass_fields__}}
+
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 30))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 10000))
+
+class UserContextCache:
+    """LRU of UserContext with a short TTL.
+
+    Writes that change a cached field call invalidate(); the TTL bounds how
+    long other workers can serve a stale entry.
+    """
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[UserContext]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires, context = entry
+        if expires < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return context
+
+    def put(self, context: UserContext):
+        self._entries[context.id] = (time.monotonic() + self.ttl, context)
+        self._entries.move_to_end(context.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+user_context_cache = UserContextCache(AUTH_CACHE_TTL, AUTH_CACHE_SIZE)
+
+async def load_user_context(user_id: str) -> Optional[UserContext]:
+    context = user_context_cache.get(user_id)
+    if context is None:
+        from database import users_collection
+        user = await users_collection.find_one({"id": user_id}, USER_CONTEXT_PROJECTION)
+        if not user:
+            return None
+        context = UserContext(**user)
+        user_context_cache.put(context)
+    return context
+
+async def get_user_context(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserContext:
+    """Resolve the authenticated user once per request (FastAPI caches dependencies)"""
     token = credentials.credentials
     payload = decode_token(token)
     user_id = payload.get("sub")
-    if user_id is None:
+    context = await load_user_context(user_id) if user_id else None
+    if context is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
-    return user_id
+    if context.blocked:
+        raise HTTPException(status_code=403, detail="Your account has been blocked")
+    return context
+
+async def get_current_user_id(user: UserContext = Depends(get_user_context)) -> str:
+    return user.id
@@ -0,0 +1,94 @@
+"""Mail dispatcher against a local SMTP stand-in.
+
+Starts a minimal in-process SMTP server that accepts every message after
+--delay seconds (and drops the connection for every --drop-every-th message),
+points services/email_service at it and queues --messages emails. Reports how
+long send_email() took for the caller, delivery throughput and the
+dispatcher's counters.
+
+Run from backend/:
+    python -m benchmarks.email_dispatch [--messages 200] [--delay 0.05]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+HOST = "127.0.0.1"
+
+
+class SmtpStandIn:
+    """Just enough SMTP for smtplib: greets, accepts any envelope, counts DATA"""
+
+    def __init__(self, delay: float, drop_every: int):
+        self.delay = delay
+        self.drop_every = drop_every
+        self.received = 0
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        writer.write(b"220 stand-in ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command in (b"EHLO", b"HELO"):
+                    writer.write(b"250 stand-in\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 go ahead\r\n")
+                    await writer.drain()
+                    await reader.readuntil(b"\r\n.\r\n")
+                    await asyncio.sleep(self.delay)
+                    self.received += 1
+                    if self.drop_every and self.received % self.drop_every == 0:
+                        break
+                    writer.write(b"250 queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 bye\r\n")
+                    break
+                else:
+                    writer.write(b"250 ok\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def main(args):
+    stand_in = SmtpStandIn(args.delay, args.drop_every)
+    server = await asyncio.start_server(stand_in.handle, HOST, 0)
+    port = server.sockets[0].getsockname()[1]
+    os.environ.update({
+        "SMTP_HOST": HOST, "SMTP_PORT": str(port), "SMTP_SSL": "false", "SMTP_AUTH": "false",
+        "SMTP_FROM": "bench@localhost", "EMAIL_WORKERS": str(args.workers),
+    })
+    from services.email_service import mail_dispatcher, send_email
+
+    mail_dispatcher.start()
+    started = time.perf_counter()
+    for i in range(args.messages):
+        await send_email(f"user{i}@localhost", "Benchmark", "<p>hello</p>")
+    queued = time.perf_counter() - started
+
+    while mail_dispatcher.sent + mail_dispatcher.failed < args.messages:
+        await asyncio.sleep(0.01)
+    delivered = time.perf_counter() - started
+    await mail_dispatcher.stop()
+    server.close()
+
+    print(f"queued {args.messages} emails in {queued * 1000:.1f} ms "
+          f"({queued / args.messages * 1e6:.0f} us per send_email call)")
+    print(f"delivered in {delivered:.2f} s ({args.messages / delivered:.0f} emails/s), "
+          f"server saw {stand_in.connections} connections")
+    print(mail_dispatcher.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds the server takes per message")
+    parser.add_argument("--drop-every", type=int, default=0, help="drop the connection every N messages")
+    parser.add_argument("--workers", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,87 @@
+"""Event loop latency during a login storm.
+
+Fires --logins concurrent password checks and meanwhile measures how late a
+10 ms ticker wakes up on the event loop, first with bcrypt called inline (as
+the routers used to) and then through services/password_hasher.
+
+Run from backend/:
+    python -m benchmarks.password_hashing [--logins 50] [--rounds 12]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+TICK = 0.01
+
+
+async def measure_lag(stop: asyncio.Event) -> list:
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+    return lags
+
+
+async def storm(check, logins: int) -> dict:
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop))
+    await asyncio.sleep(TICK * 5)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(check() for _ in range(logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = sorted(await ticker)
+
+    return {
+        "logins": logins,
+        "ok": sum(result is True for result in results),
+        "rejected": sum(isinstance(result, Exception) for result in results),
+        "seconds": elapsed,
+        "lag_p50_ms": statistics.median(lags) * 1000,
+        "lag_p99_ms": lags[int(len(lags) * 0.99) - 1] * 1000 if len(lags) > 1 else lags[-1] * 1000,
+        "lag_max_ms": lags[-1] * 1000,
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<10} {result['ok']:>4}/{result['logins']} ok {result['rejected']:>4} rejected "
+        f"{result['seconds']:7.2f}s  loop lag p50 {result['lag_p50_ms']:8.1f} ms  "
+        f"p99 {result['lag_p99_ms']:8.1f} ms  max {result['lag_max_ms']:8.1f} ms"
+    )
+
+
+async def main(args):
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    from auth import pwd_context
+    from services.password_hasher import PasswordHasher
+
+    hashed = pwd_context.hash("password")
+    print(f"bcrypt rounds={args.rounds}, {args.logins} concurrent logins")
+
+    async def inline():
+        return pwd_context.verify("password", hashed)
+
+    report("inline", await storm(inline, args.logins))
+
+    for workers, queue_limit in ((args.workers, args.logins), (args.workers, args.queue_limit)):
+        hasher = PasswordHasher(workers, queue_limit)
+
+        async def pooled():
+            return await hasher.verify("password", hashed)
+
+        report(f"pool q={queue_limit}", await storm(pooled, args.logins))
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-limit", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""Per-request serialization CPU, before and after serialization.py.
+
+"before" is what a handler returning User(**doc) cost: model validation, then
+FastAPI's response_model validation and jsonable_encoder, then JSONResponse.
+"after" is ResponseSchema.response() / FastJSONResponse. Both produce the same
+bytes; only the encoding work is measured (no network, no Mongo).
+
+Run from backend/ (database.py is not imported):
+    python -m benchmarks.serialization [--users 100] [--repeat 200]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models import User, UserPublic, USER_RESPONSE, USERS_RESPONSE, USER_PUBLIC_RESPONSE
+from serialization import FastJSONResponse
+
+
+def user_doc(i: int) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()), "email": f"user{i}@example.com", "name": f"User {i}",
+        "age": 20 + i % 40, "height": 170, "weight": 70, "gender": "female", "education": "higher",
+        "smoking": "negative", "city": "Москва", "description": "Люблю путешествия и кино " * 4,
+        "photos": [f"photos/{uuid.uuid4().hex}" for _ in range(3)], "created_at": now - timedelta(days=i),
+        "last_login": now, "blocked": False, "complaint_count": 0, "profile_completed": True,
+        "active_subscription": "Золото", "subscription_expires_at": now + timedelta(days=10),
+        "subscription_activated_at": now, "is_super_admin": False, "is_admin": False,
+        "admin_permissions": [], "password_hash": "$2b$12$" + "x" * 53,
+    }
+
+
+def chat_rows(docs: list) -> list:
+    now = datetime.now(timezone.utc)
+    return [{
+        "id": str(uuid.uuid4()), "partner": doc, "matched_at": now.isoformat(), "expires_in_days": 5,
+        "active": True, "unread_count": 2,
+        "last_message": {"text": "Привет!", "timestamp": now, "is_own": False},
+    } for doc in docs]
+
+
+async def before_single(doc, field):
+    content = await serialize_response(field=field, response_content=User(**doc))
+    return JSONResponse(content).body
+
+
+async def before_list(docs, field):
+    content = await serialize_response(field=field, response_content=[User(**doc) for doc in docs])
+    return JSONResponse(content).body
+
+
+async def before_chats(rows, field):
+    rows = [{**row, "partner": UserPublic(**row["partner"]).model_dump()} for row in rows]
+    content = await serialize_response(response_content=rows)
+    return JSONResponse(content).body
+
+
+async def after_single(doc, field):
+    return USER_RESPONSE.response(doc).body
+
+
+async def after_list(docs, field):
+    return USERS_RESPONSE.response(docs).body
+
+
+async def after_chats(rows, field):
+    rows = [{**row, "partner": USER_PUBLIC_RESPONSE.dump(row["partner"])} for row in rows]
+    return FastJSONResponse(rows).body
+
+
+async def measure(func, payload, field, repeat: int) -> float:
+    await func(payload, field)
+    started = time.process_time()
+    for _ in range(repeat):
+        await func(payload, field)
+    return (time.process_time() - started) / repeat * 1e6
+
+
+async def main(args):
+    docs = [user_doc(i) for i in range(args.users)]
+    user_field = create_response_field(name="user", type_=User)
+    users_field = create_response_field(name="users", type_=List[User])
+
+    cases = [
+        ("GET /profile", docs[0], user_field, before_single, after_single),
+        (f"active users ({args.users})", docs, users_field, before_list, after_list),
+        (f"chat matches ({args.users})", chat_rows(docs), None, before_chats, after_chats),
+    ]
+    print(f"{'endpoint':<24} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, payload, field, before, after in cases:
+        assert await before(payload, field) == await after(payload, field), name
+        t_before = await measure(before, payload, field, args.repeat)
+        t_after = await measure(after, payload, field, args.repeat)
+        print(f"{name:<24} {t_before:>10.1f} {t_after:>10.1f} {t_before / t_after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -1,8 +1,10 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from datetime import timezone
 import os
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Timestamps are stored as BSON dates and read back as aware UTC datetimes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, tzinfo=timezone.utc)
 db = client[os.environ['DB_NAME']]
 
 # Collections
@@ -18,6 +20,8 @@ subscriptions_settings_collection = db.subscriptions_settings
 user_subscriptions_collection = db.user_subscriptions
 subscription_history_collection = db.subscription_history
 feedback_collection = db.feedback
+deletion_jobs_collection = db.deletion_jobs
+scheduler_jobs_collection = db.scheduler_jobs
 
 async def close_db():
     client.close()
@@ -0,0 +1,240 @@
+"""Mongo index declarations, bootstrap and reporting.
+
+ensure_indexes() runs on server startup and creates every declared index
+(create_index is a no-op for indexes that already exist). verify_indexes()
+explains the hot queries and warns when one is not served by the expected
+index.
+
+CLI (from backend/, with MONGO_URL and DB_NAME set):
+    python indexes.py ensure   # create missing indexes
+    python indexes.py verify   # explain() the hot queries
+    python indexes.py report   # missing, undeclared and unused indexes
+"""
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    keys: tuple
+    name: str
+    unique: bool = False
+    partial: dict = None
+
+    def options(self) -> dict:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.partial:
+            options["partialFilterExpression"] = self.partial
+        return options
+
+
+# Admin user list (GET /admin/users): keyset pagination by (sort key, id).
+# Every sort key has a full index plus small partial ones for the selective
+# filters; blocked=false, role=user and subscription=none match most users and
+# are served by the full index. role=admin is an $or (admin flags or an admin
+# email), which a partial index cannot express; admins are few, so its
+# branches are sorted in memory.
+ADMIN_USER_SORT_KEYS = ("created_at", "last_login", "complaint_count")
+ADMIN_USER_FILTER_PARTIALS = {
+    "blocked": {"blocked": True},
+    "subscribed": {"active_subscription": {"$type": "string"}},
+}
+
+
+def _admin_user_indexes() -> list:
+    specs = []
+    for key in ADMIN_USER_SORT_KEYS:
+        keys = ((key, DESCENDING), ("id", DESCENDING))
+        specs.append(IndexSpec(keys, f"{key}_id"))
+        for name, partial in ADMIN_USER_FILTER_PARTIALS.items():
+            specs.append(IndexSpec(keys, f"{name}_{key}_id", partial=partial))
+    return specs
+
+
+INDEXES = {
+    "users": [
+        IndexSpec((("id", ASCENDING),), "id_unique", unique=True),
+        IndexSpec((("email", ASCENDING),), "email_unique", unique=True),
+        # Admin user search by name prefix (emails use email_unique)
+        IndexSpec((("name", ASCENDING),), "name"),
+        IndexSpec(
+            (("active_subscription", ASCENDING), ("subscription_expires_at", ASCENDING)),
+            "subscription_expiry",
+        ),
+        *_admin_user_indexes(),
+    ],
+    "filters": [
+        IndexSpec((("user_id", ASCENDING),), "user_id_unique", unique=True),
+    ],
+    "video_sessions": [
+        IndexSpec((("id", ASCENDING),), "id_unique", unique=True),
+        IndexSpec((("user1_id", ASCENDING),), "user1_id"),
+        IndexSpec((("user2_id", ASCENDING),), "user2_id"),
+        # Seen filter rebuild at startup
+        IndexSpec((("started_at", ASCENDING),), "started_at"),
+    ],
+    "matches": [
+        IndexSpec((("id", ASCENDING),), "id_unique", unique=True),
+        IndexSpec((("user1_id", ASCENDING), ("active", ASCENDING)), "user1_id_active"),
+        IndexSpec((("user2_id", ASCENDING), ("active", ASCENDING)), "user2_id_active"),
+        IndexSpec((("matched_at", ASCENDING),), "matched_at"),
+    ],
+    "messages": [
+        # Cursor pagination, unread counts and last-message lookups. Keeps the
+        # default name it was first created with, so existing databases do not
+        # hit an IndexOptionsConflict.
+        IndexSpec(
+            (("match_id", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)),
+            "match_id_1_timestamp_1_id_1",
+        ),
+    ],
+    "complaints": [
+        IndexSpec((("complainant_id", ASCENDING),), "complainant_id"),
+        IndexSpec((("reported_user_id", ASCENDING),), "reported_user_id"),
+        IndexSpec((("created_at", DESCENDING),), "created_at"),
+    ],
+    "daily_communications": [
+        IndexSpec((("user_id", ASCENDING), ("date", ASCENDING)), "user_id_date_unique", unique=True),
+    ],
+    "subscriptions_settings": [
+        IndexSpec((("plan_name", ASCENDING),), "plan_name_unique", unique=True),
+    ],
+    "user_subscriptions": [
+        IndexSpec((("user_id", ASCENDING),), "user_id"),
+    ],
+    "subscription_history": [
+        IndexSpec((("user_id", ASCENDING), ("purchase_date", DESCENDING)), "user_id_purchase_date"),
+    ],
+    "feedback": [
+        IndexSpec((("user_id", ASCENDING), ("created_at", DESCENDING)), "user_id_created_at"),
+        IndexSpec((("created_at", DESCENDING),), "created_at"),
+    ],
+    "deletion_jobs": [
+        IndexSpec((("id", ASCENDING),), "id_unique", unique=True),
+        # Unfinished jobs resumed at startup
+        IndexSpec((("status", ASCENDING),), "status"),
+    ],
+    "documents": [
+        IndexSpec((("id", ASCENDING),), "id_unique", unique=True),
+    ],
+}
+
+# (collection, filter, sort, index expected to serve it)
+HOT_QUERIES = [
+    ("users", {"id": ""}, None, "id_unique"),
+    ("users", {"email": ""}, None, "email_unique"),
+    ("users", {"email": {"$regex": "^a"}}, None, "email_unique"),
+    ("users", {}, [("created_at", DESCENDING), ("id", DESCENDING)], "created_at_id"),
+    ("filters", {"user_id": ""}, None, "user_id_unique"),
+    ("video_sessions", {"id": ""}, None, "id_unique"),
+    ("matches", {"id": ""}, None, "id_unique"),
+    ("matches", {"user1_id": "", "active": True}, None, "user1_id_active"),
+    ("messages", {"match_id": ""}, [("timestamp", ASCENDING), ("id", ASCENDING)], "match_id_1_timestamp_1_id_1"),
+    ("daily_communications", {"user_id": "", "date": ""}, None, "user_id_date_unique"),
+    ("subscription_history", {"user_id": ""}, [("purchase_date", DESCENDING)], "user_id_purchase_date"),
+]
+
+
+async def ensure_indexes(db) -> list:
+    """Create every declared index; returns the names that failed"""
+    failed = []
+    for collection_name, specs in INDEXES.items():
+        collection = db[collection_name]
+        for spec in specs:
+            try:
+                await collection.create_index(list(spec.keys), **spec.options())
+            except OperationFailure as e:
+                # Typically duplicates blocking a unique index, or an existing
+                # index with the same keys but different options
+                failed.append(f"{collection_name}.{spec.name}")
+                logger.error(f"Could not create index {collection_name}.{spec.name}: {e}")
+    return failed
+
+
+def _plan_index_names(plan: dict) -> set:
+    names = set()
+    if plan.get("indexName"):
+        names.add(plan["indexName"])
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            names |= _plan_index_names(plan[key])
+    for stage in plan.get("inputStages", []):
+        names |= _plan_index_names(stage)
+    return names
+
+
+async def explain_index_names(collection, filter: dict, sort=None) -> set:
+    cursor = collection.find(filter)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = await cursor.explain()
+    return _plan_index_names(explanation["queryPlanner"]["winningPlan"])
+
+
+async def verify_indexes(db) -> list:
+    """Explain the hot queries; returns those not served by their index"""
+    problems = []
+    for collection_name, filter, sort, expected in HOT_QUERIES:
+        used = await explain_index_names(db[collection_name], filter, sort)
+        if expected not in used:
+            problems.append((collection_name, filter, expected, sorted(used)))
+            logger.warning(
+                f"{collection_name} query {filter} uses {sorted(used) or 'COLLSCAN'}, expected {expected}"
+            )
+    return problems
+
+
+async def index_report(db) -> dict:
+    """Declared-but-missing, present-but-undeclared and never-used indexes"""
+    report = {"missing": [], "undeclared": [], "unused": []}
+    existing_collections = set(await db.list_collection_names())
+    for collection_name in sorted(existing_collections | set(INDEXES)):
+        if collection_name.startswith("system."):
+            continue
+        declared = {spec.name for spec in INDEXES.get(collection_name, [])}
+        present = set()
+        if collection_name in existing_collections:
+            present = set(await db[collection_name].index_information()) - {"_id_"}
+        report["missing"] += [f"{collection_name}.{name}" for name in sorted(declared - present)]
+        report["undeclared"] += [f"{collection_name}.{name}" for name in sorted(present - declared)]
+        if present:
+            async for stat in db[collection_name].aggregate([{"$indexStats": {}}]):
+                if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0:
+                    report["unused"].append(f"{collection_name}.{stat['name']}")
+    return report
+
+
+async def _main(command: str):
+    from database import db, close_db
+
+    try:
+        if command == "ensure":
+            failed = await ensure_indexes(db)
+            print("All indexes created" if not failed else f"Failed: {', '.join(failed)}")
+        elif command == "verify":
+            problems = await verify_indexes(db)
+            print("All hot queries use their index" if not problems else f"{len(problems)} queries not indexed")
+        elif command == "report":
+            report = await index_report(db)
+            for section, names in report.items():
+                print(f"{section} ({len(names)}):")
+                for name in names:
+                    print(f"  {name}")
+        else:
+            print(__doc__)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ""))
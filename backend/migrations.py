@@ -0,0 +1,176 @@
+"""One-shot data migrations.
+
+merge_duplicate_quota_records() folds daily_communications documents that
+share a (user_id, date) into one. Older code created a day's record with
+find_one + insert_one, so concurrent first requests could insert it twice, and
+those duplicates keep the unique user_id_date_unique index from being built.
+It runs from startup_event before ensure_indexes() and does nothing once that
+index exists.
+
+migrate_datetimes() converts timestamps that older code stored as ISO strings
+into native BSON dates, so range queries and sorts compare dates instead of
+strings and read paths no longer parse them.
+
+The migration walks each collection in _id order in batches and records the
+last processed _id in the `migrations` collection, so an interrupted run
+resumes where it stopped. Converting is idempotent, so several workers running
+it at once is harmless. It runs from startup_event (a no-op once finished);
+on large databases run it ahead of a deploy instead:
+
+    python migrations.py   (from backend/, with MONGO_URL and DB_NAME set)
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = "datetimes_to_bson"
+BATCH_SIZE = 500
+
+# Timestamp fields per collection; names ending in "*" are prefixes.
+# daily_communications.date stays a "YYYY-MM-DD" string: it is a day key,
+# not a point in time.
+DATETIME_FIELDS = {
+    "users": ["created_at", "last_login", "subscription_expires_at", "subscription_activated_at"],
+    "filters": ["updated_at"],
+    "video_sessions": ["started_at", "ended_at"],
+    "matches": ["matched_at", "chat_expires_at", "last_read_*", "last_message.timestamp"],
+    "messages": ["timestamp"],
+    "complaints": ["created_at"],
+    "subscriptions_settings": ["updated_at"],
+    "user_subscriptions": ["activated_at", "expires_at"],
+    "subscription_history": ["purchase_date"],
+    "feedback": ["created_at"],
+}
+
+
+def parse_timestamp(value: str):
+    """ISO string -> aware UTC datetime truncated to BSON's millisecond precision"""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    parsed = parsed.astimezone(timezone.utc)
+    return parsed.replace(microsecond=parsed.microsecond // 1000 * 1000)
+
+
+def _converted_fields(doc: dict, fields: list) -> dict:
+    """$set document for every string timestamp found in doc"""
+    updates = {}
+    for field in fields:
+        if field.endswith("*"):
+            prefix = field[:-1]
+            candidates = [(name, doc[name]) for name in doc if name.startswith(prefix)]
+        elif "." in field:
+            parent, child = field.split(".", 1)
+            candidates = [(field, (doc.get(parent) or {}).get(child))]
+        else:
+            candidates = [(field, doc.get(field))]
+        for name, value in candidates:
+            if isinstance(value, str):
+                parsed = parse_timestamp(value)
+                if parsed is not None:
+                    updates[name] = parsed
+    return updates
+
+
+async def merge_duplicate_quota_records(db) -> int:
+    """Merge daily_communications duplicates; returns the number of documents removed"""
+    collection = db.daily_communications
+    # Once the unique index exists there can be no duplicates
+    if "user_id_date_unique" in await collection.index_information():
+        return 0
+
+    pipeline = [
+        {"$group": {
+            "_id": {"user_id": "$user_id", "date": "$date"},
+            "ids": {"$push": "$_id"},
+            # Every duplicate counted its own communications
+            "used_count": {"$sum": {"$ifNull": ["$used_count", 0]}},
+            "free_count": {"$max": "$free_count"},
+            "premium_count": {"$max": "$premium_count"},
+        }},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ]
+    removed = 0
+    async for group in collection.aggregate(pipeline, allowDiskUse=True):
+        keep, *duplicates = sorted(group["ids"])
+        merged = {field: group[field] for field in ("used_count", "free_count", "premium_count")
+                  if group[field] is not None}
+        await collection.update_one({"_id": keep}, {"$set": merged})
+        result = await collection.delete_many({"_id": {"$in": duplicates}})
+        removed += result.deleted_count
+
+    if removed:
+        logger.info(f"Merged {removed} duplicate daily_communications documents")
+    return removed
+
+
+async def _migrate_collection(db, collection_name: str, fields: list, state: dict) -> int:
+    collection = db[collection_name]
+    checkpoint_key = f"checkpoints.{collection_name}"
+    last_id = state.get("checkpoints", {}).get(collection_name)
+    converted = 0
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await collection.find(query).sort("_id", 1).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            updates = _converted_fields(doc, fields)
+            if updates:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": updates}))
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+            converted += len(ops)
+
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one({"id": MIGRATION_ID}, {"$set": {checkpoint_key: last_id}})
+
+    return converted
+
+
+async def migrate_datetimes(db):
+    """Run (or resume) the ISO string -> BSON date migration"""
+    state = await db.migrations.find_one({"id": MIGRATION_ID}) or {}
+    if state.get("done"):
+        return
+
+    await db.migrations.update_one(
+        {"id": MIGRATION_ID},
+        {"$setOnInsert": {"started_at": datetime.now(timezone.utc), "checkpoints": {}}},
+        upsert=True
+    )
+    for collection_name, fields in DATETIME_FIELDS.items():
+        converted = await _migrate_collection(db, collection_name, fields, state)
+        if converted:
+            logger.info(f"Converted timestamps in {converted} {collection_name} documents")
+
+    await db.migrations.update_one(
+        {"id": MIGRATION_ID},
+        {"$set": {"done": True, "finished_at": datetime.now(timezone.utc)}}
+    )
+    logger.info("Datetime migration finished")
+
+
+async def _main():
+    from database import db, close_db
+
+    try:
+        await merge_duplicate_quota_records(db)
+        await migrate_datetimes(db)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -1,8 +1,14 @@
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 from datetime import datetime, timezone
+from serialization import ResponseSchema
 import uuid
 
+def utc_now() -> datetime:
+    """Current UTC time truncated to milliseconds, the precision of BSON dates"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
 # User Models
 class UserBase(BaseModel):
     email: EmailStr
@@ -42,7 +48,7 @@ class User(BaseModel):
     city: Optional[str] = None
     description: Optional[str] = None
     photos: List[str] = Field(default_factory=list)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
     last_login: Optional[datetime] = None
     blocked: bool = False
     complaint_count: int = 0
@@ -69,6 +75,9 @@ class UserPublic(BaseModel):
     description: Optional[str] = None
     photos: List[str] = []
 
+# Mongo projection that loads just enough of a user document for UserPublic
+USER_PUBLIC_PROJECTION = {"_id": 0, **{field: 1 for field in UserPublic.model_fields}}
+
 # Filter Models
 class FiltersUpdate(BaseModel):
     age_range: str
@@ -84,7 +93,7 @@ class Filters(BaseModel):
     gender_preference: str
     city: str
     smoking_preference: str
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=utc_now)
 
 # Video Session Models
 class VideoSessionStart(BaseModel):
@@ -96,7 +105,7 @@ class VideoSession(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user1_id: str
     user2_id: str
-    started_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: datetime = Field(default_factory=utc_now)
     ended_at: Optional[datetime] = None
     duration: int = 0
     status: str = "active"
@@ -112,7 +121,7 @@ class Match(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user1_id: str
     user2_id: str
-    matched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    matched_at: datetime = Field(default_factory=utc_now)
     chat_expires_at: datetime
     active: bool = True
 
@@ -134,7 +143,7 @@ class Message(BaseModel):
     match_id: str
     sender_id: str
     text: str
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    timestamp: datetime = Field(default_factory=utc_now)
 
 # Complaint Models
 class ComplaintCreate(BaseModel):
@@ -148,7 +157,7 @@ class Complaint(BaseModel):
     complainant_id: str
     reported_user_id: str
     reason: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=utc_now)
 
 # Subscription Models
 class SubscriptionPlan(BaseModel):
@@ -165,7 +174,7 @@ class UserSubscription(BaseModel):
     user_id: str
     plan_name: str
     communications_per_day: int
-    activated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    activated_at: datetime = Field(default_factory=utc_now)
     expires_at: datetime
     is_active: bool = True
     activated_by: str = "user"  # "user" or "admin"
@@ -179,7 +188,7 @@ class SubscriptionHistory(BaseModel):
     plan_name: str
     price: int
     communications_per_day: int
-    purchase_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    purchase_date: datetime = Field(default_factory=utc_now)
     activated_by: str = "user"
 
 class Subscription(BaseModel):
@@ -188,7 +197,7 @@ class Subscription(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     plan_name: str
-    purchase_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    purchase_date: datetime = Field(default_factory=utc_now)
     communications_added: int
     active: bool = True
 
@@ -224,3 +233,11 @@ class PasswordReset(BaseModel):
 class PasswordResetConfirm(BaseModel):
     token: str
     new_password: str
+
+# Precompiled serializers for the hot read endpoints (see serialization.py)
+USER_RESPONSE = ResponseSchema(User)
+USERS_RESPONSE = ResponseSchema(User, many=True)
+USER_PUBLIC_RESPONSE = ResponseSchema(UserPublic)
+MESSAGES_RESPONSE = ResponseSchema(Message, many=True)
+COMPLAINTS_RESPONSE = ResponseSchema(Complaint, many=True)
+TOKEN_RESPONSE = ResponseSchema(TokenResponse)
@@ -0,0 +1,28 @@
+import os
+
+import socketio
+
+# Redis that connects the Socket.IO servers of several workers/pods, e.g.
+# redis://redis:6379/0. Without it events only reach sockets connected to
+# this process.
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE", "")
+
+def create_client_manager(url: str):
+    """python-socketio client manager for a message queue URL (None = single process)"""
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return socketio.AsyncRedisManager(url)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
+
+# Shared Socket.IO server: WebRTC signaling and chat push live on the same
+# instance so routers can emit events without importing server.py
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    client_manager=create_client_manager(SOCKETIO_MESSAGE_QUEUE)
+)
+
+def chat_room(match_id: str) -> str:
+    """Socket.IO room that receives new messages for a match"""
+    return f"chat:{match_id}"
@@ -1,23 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
-from models import User, Complaint, SubscriptionHistory
-from auth import get_current_user_id, get_password_hash
+from fastapi import APIRouter, HTTPException, Depends, Query
+from models import User, Complaint, SubscriptionHistory, USER_RESPONSE, USERS_RESPONSE, COMPLAINTS_RESPONSE
+from serialization import FastJSONResponse
+from auth import get_user_context, user_context_cache, UserContext
 from database import (
-    users_collection, complaints_collection, video_sessions_collection,
-    matches_collection, daily_communications_collection, subscriptions_settings_collection,
-    user_subscriptions_collection, subscription_history_collection, feedback_collection
+    users_collection, complaints_collection, subscriptions_settings_collection,
+    user_subscriptions_collection, subscription_history_collection, feedback_collection,
+    deletion_jobs_collection
 )
+from services.candidate_index import candidate_index
+from services import quota
+from services.image_pipeline import image_pipeline
+from services.password_hasher import password_hasher
+from services.email_service import mail_dispatcher
+from services.admin_stats import admin_stats
+from services.deletion import create_job, deletion_worker
+from services.plan_catalog import plan_catalog
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional
+import base64
+import json
+import re
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-SUBSCRIPTION_PLANS = {
-    "Серебро": {"price": 490, "communications": 5},
-    "Золото": {"price": 990, "communications": 10},
-    "VIP": {"price": 1900, "communications": 20}
-}
-
 # All available admin permissions
 ADMIN_PERMISSIONS = ['users', 'subscriptions', 'tariffs', 'complaints', 'feedback', 'stats']
 
@@ -33,61 +39,145 @@ class AdminPasswordChange(BaseModel):
     new_password: str
 
 # Simple admin check - in production, add proper role-based auth
-async def is_admin(user_id: str = Depends(get_current_user_id)):
-    user = await users_collection.find_one({"id": user_id}, {"_id": 0})
-    if not user:
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
+async def is_admin(user: UserContext = Depends(get_user_context)):
     # Check if user is super admin or has admin role
-    is_super = user.get("email", "").lower() == SUPER_ADMIN_EMAIL.lower()
-    has_admin_role = user.get("is_admin", False) or user.get("is_super_admin", False)
-    legacy_admin = "admin" in user.get("email", "").lower()
+    is_super = user.email.lower() == SUPER_ADMIN_EMAIL.lower()
+    has_admin_role = user.is_admin or user.is_super_admin
+    legacy_admin = "admin" in user.email.lower()
     
     if not (is_super or has_admin_role or legacy_admin):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    return user_id
+    return user.id
+
+# The accounts is_admin() lets in, as a users query (role filter of the user list)
+ADMIN_ACCOUNT_CONDITIONS = [
+    {"is_admin": True},
+    {"is_super_admin": True},
+    {"email": {"$regex": f"^{re.escape(SUPER_ADMIN_EMAIL)}$", "$options": "i"}},
+    {"email": {"$regex": "admin", "$options": "i"}},
+]
 
-async def is_super_admin(user_id: str = Depends(get_current_user_id)):
+async def is_super_admin(user: UserContext = Depends(get_user_context)):
     """Check if user is the super admin"""
-    user = await users_collection.find_one({"id": user_id}, {"_id": 0})
-    if not user:
-        raise HTTPException(status_code=403, detail="Super admin access required")
-    
-    is_super = user.get("email", "").lower() == SUPER_ADMIN_EMAIL.lower() or user.get("is_super_admin", False)
+    is_super = user.email.lower() == SUPER_ADMIN_EMAIL.lower() or user.is_super_admin
     if not is_super:
         raise HTTPException(status_code=403, detail="Super admin access required")
     
-    return user_id
+    return user.id
 
 def is_protected_admin(user_email: str) -> bool:
     """Check if user is the protected super admin"""
     return user_email.lower() == SUPER_ADMIN_EMAIL.lower()
 
+# Only the fields needed for the admin table
+ADMIN_USER_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "email": 1,
+    "name": 1,
+    "age": 1,
+    "city": 1,
+    "blocked": 1,
+    "complaint_count": 1,
+    "created_at": 1,
+    "last_login": 1,
+    "active_subscription": 1,
+    "subscription_expires_at": 1,
+    "is_admin": 1,
+    "is_super_admin": 1,
+    "admin_permissions": 1
+}
+
+ADMIN_USERS_PAGE_SIZE = 50
+ADMIN_USERS_MAX_PAGE_SIZE = 200
+
+def encode_user_cursor(value, user_id: str) -> str:
+    """Opaque cursor for the (sort key value, id) of the last user on a page"""
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    raw = json.dumps([value, user_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_user_cursor(cursor: str):
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, user_id
+
+def user_search_query(search: str) -> dict:
+    """Email or name starting with search; served by the email_unique and name indexes"""
+    prefix = re.escape(search.strip())
+    return {"$or": [
+        {"email": {"$regex": f"^{prefix.lower()}"}},
+        {"name": {"$regex": f"^{prefix}", "$options": "i"}},
+    ]}
+
+def users_after(key: str, value, user_id: str, direction: int) -> dict:
+    """Keyset condition for users after (value, id); null or missing values sort lowest"""
+    if direction == -1:
+        if value is None:
+            return {key: None, "id": {"$lt": user_id}}
+        return {"$or": [{key: {"$lt": value}}, {key: value, "id": {"$lt": user_id}}, {key: None}]}
+    if value is None:
+        return {"$or": [{key: None, "id": {"$gt": user_id}}, {key: {"$ne": None}}]}
+    return {"$or": [{key: {"$gt": value}}, {key: value, "id": {"$gt": user_id}}]}
+
 @router.get("/users")
-async def get_all_users(admin_id: str = Depends(is_admin)):
-    """Get all users with minimal data for admin list"""
-    # Only fetch fields needed for admin table
-    projection = {
-        "_id": 0,
-        "id": 1,
-        "email": 1,
-        "name": 1,
-        "age": 1,
-        "city": 1,
-        "blocked": 1,
-        "complaint_count": 1,
-        "created_at": 1,
-        "last_login": 1,
-        "active_subscription": 1,
-        "subscription_expires_at": 1,
-        "is_admin": 1,
-        "is_super_admin": 1,
-        "admin_permissions": 1
-    }
+async def get_all_users(
+    sort: str = Query("created_at", pattern="^(created_at|last_login|complaint_count)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    blocked: Optional[bool] = None,
+    subscription: Optional[str] = Query(None, pattern="^(active|none)$"),
+    role: Optional[str] = Query(None, pattern="^(admin|user)$"),
+    search: Optional[str] = Query(None, max_length=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(ADMIN_USERS_PAGE_SIZE, ge=1, le=ADMIN_USERS_MAX_PAGE_SIZE),
+    admin_id: str = Depends(is_admin)
+):
+    """One page of users, keyset-paginated by (sort, id).
+
+    Pass the X-Next-Cursor header of a response as `cursor` to get the next
+    page; it is absent on the last page. Every sort/filter combination is
+    served by an index declared in indexes.py. `search` matches the start of
+    the email or the name.
+    """
+    direction = -1 if order == "desc" else 1
+    now = datetime.now(timezone.utc)
     
-    users = await users_collection.find({}, projection).to_list(1000)
-    return users
+    # Users being deleted disappear from the list immediately
+    conditions = [{"deleted": {"$ne": True}}]
+    if blocked is not None:
+        conditions.append({"blocked": True} if blocked else {"blocked": {"$ne": True}})
+    if subscription == "active":
+        conditions.append({"active_subscription": {"$type": "string"}, "subscription_expires_at": {"$gt": now}})
+    elif subscription == "none":
+        conditions.append({"$or": [
+            {"active_subscription": None},
+            {"subscription_expires_at": {"$not": {"$gt": now}}}
+        ]})
+    if role == "admin":
+        conditions.append({"$or": ADMIN_ACCOUNT_CONDITIONS})
+    elif role == "user":
+        conditions.append({"$nor": ADMIN_ACCOUNT_CONDITIONS})
+    if search and search.strip():
+        conditions.append(user_search_query(search))
+    if cursor:
+        conditions.append(users_after(sort, *decode_user_cursor(cursor), direction))
+    query = {"$and": conditions}
+    
+    users = await users_collection.find(query, ADMIN_USER_PROJECTION).sort(
+        [(sort, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    headers = {}
+    if len(users) > limit:
+        users = users[:limit]
+        headers["X-Next-Cursor"] = encode_user_cursor(users[-1].get(sort), users[-1]["id"])
+    return FastJSONResponse(users, headers=headers)
 
 @router.get("/user/{user_id}", response_model=User)
 async def get_user_details(user_id: str, admin_id: str = Depends(is_admin)):
@@ -95,12 +185,7 @@ async def get_user_details(user_id: str, admin_id: str = Depends(is_admin)):
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user_dict.get("created_at"), str):
-        user_dict["created_at"] = datetime.fromisoformat(user_dict["created_at"])
-    if isinstance(user_dict.get("last_login"), str):
-        user_dict["last_login"] = datetime.fromisoformat(user_dict["last_login"])
-    
-    return User(**user_dict)
+    return USER_RESPONSE.response(user_dict)
 
 @router.put("/user/{user_id}/block")
 async def block_user(user_id: str, blocked: bool, admin_id: str = Depends(is_admin)):
@@ -117,6 +202,12 @@ async def block_user(user_id: str, blocked: bool, admin_id: str = Depends(is_adm
         {"$set": {"blocked": blocked}}
     )
     
+    if bool(user.get("blocked", False)) != blocked:
+        admin_stats.incr("blocked_users", 1 if blocked else -1)
+    user["blocked"] = blocked
+    candidate_index.upsert(user)
+    user_context_cache.invalidate(user_id)
+    
     return {"message": f"User {'blocked' if blocked else 'unblocked'} successfully"}
 
 @router.delete("/user/{user_id}")
@@ -129,48 +220,53 @@ async def delete_user(user_id: str, admin_id: str = Depends(is_admin)):
     if is_protected_admin(user.get("email", "")):
         raise HTTPException(status_code=403, detail="Невозможно удалить супер-администратора")
     
-    # Delete user and related data
-    await users_collection.delete_one({"id": user_id})
-    await complaints_collection.delete_many({"$or": [{"complainant_id": user_id}, {"reported_user_id": user_id}]})
-    await video_sessions_collection.delete_many({"$or": [{"user1_id": user_id}, {"user2_id": user_id}]})
-    await matches_collection.delete_many({"$or": [{"user1_id": user_id}, {"user2_id": user_id}]})
-    await daily_communications_collection.delete_many({"user_id": user_id})
-    await subscription_history_collection.delete_many({"user_id": user_id})
+    if user.get("deleted"):
+        raise HTTPException(status_code=409, detail="User is already being deleted")
     
-    return {"message": "User deleted successfully"}
+    # Hide the user right away; related data is removed in the background
+    job = await create_job(user)
+    candidate_index.remove(user_id)
+    user_context_cache.invalidate(user_id)
+    admin_stats.subscription_ended(user_id)
+    deletion_worker.enqueue(job)
+    
+    return {"message": "User deletion started", "job_id": job["id"]}
+
+@router.get("/deletion-jobs/{job_id}")
+async def get_deletion_job(job_id: str, admin_id: str = Depends(is_admin)):
+    """Status and per-collection progress of a user deletion"""
+    job = await deletion_jobs_collection.find_one({"id": job_id}, {"_id": 0, "match_ids": 0, "photos": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
 
 @router.get("/complaints", response_model=List[Complaint])
 async def get_all_complaints(admin_id: str = Depends(is_admin)):
     complaints = await complaints_collection.find({}, {"_id": 0}).to_list(1000)
     
-    for complaint in complaints:
-        if isinstance(complaint.get("created_at"), str):
-            complaint["created_at"] = datetime.fromisoformat(complaint["created_at"])
-    
-    return [Complaint(**c) for c in complaints]
+    return COMPLAINTS_RESPONSE.response(complaints)
 
 @router.get("/stats")
 async def get_stats(admin_id: str = Depends(is_admin)):
-    total_users = await users_collection.count_documents({})
-    blocked_users = await users_collection.count_documents({"blocked": True})
-    total_matches = await matches_collection.count_documents({})
-    active_matches = await matches_collection.count_documents({"active": True})
-    total_sessions = await video_sessions_collection.count_documents({})
-    total_complaints = await complaints_collection.count_documents({})
-    active_subscriptions = await users_collection.count_documents({
-        "active_subscription": {"$ne": None},
-        "subscription_expires_at": {"$gt": datetime.now(timezone.utc).isoformat()}
-    })
-    
-    return {
-        "total_users": total_users,
-        "blocked_users": blocked_users,
-        "total_matches": total_matches,
-        "active_matches": active_matches,
-        "total_video_sessions": total_sessions,
-        "total_complaints": total_complaints,
-        "active_subscriptions": active_subscriptions
-    }
+    """Dashboard counters, served from memory (see services/admin_stats.py)"""
+    if admin_stats.reconciled_at is None:
+        await admin_stats.reconcile()
+    return admin_stats.snapshot()
+
+@router.get("/metrics/image-pipeline")
+async def get_image_pipeline_metrics(admin_id: str = Depends(is_admin)):
+    """Queue depth and counters of the photo processing pool"""
+    return image_pipeline.stats()
+
+@router.get("/metrics/password-hasher")
+async def get_password_hasher_metrics(admin_id: str = Depends(is_admin)):
+    """Queue depth and counters of the password hashing pool"""
+    return password_hasher.stats()
+
+@router.get("/metrics/email")
+async def get_email_metrics(admin_id: str = Depends(is_admin)):
+    """Queue depth and delivery counters of outgoing email"""
+    return mail_dispatcher.stats()
 
 @router.post("/subscription/activate")
 async def activate_subscription_for_user(user_id: str, plan_name: str, admin_id: str = Depends(is_admin)):
@@ -179,10 +275,10 @@ async def activate_subscription_for_user(user_id: str, plan_name: str, admin_id:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if plan_name not in SUBSCRIPTION_PLANS:
+    plan = plan_catalog.get(plan_name)
+    if not plan:
         raise HTTPException(status_code=400, detail="Invalid plan name")
     
-    plan = SUBSCRIPTION_PLANS[plan_name]
     now = datetime.now(timezone.utc)
     expires_at = now + timedelta(days=30)
     
@@ -191,30 +287,27 @@ async def activate_subscription_for_user(user_id: str, plan_name: str, admin_id:
         {"id": user_id},
         {"$set": {
             "active_subscription": plan_name,
-            "subscription_activated_at": now.isoformat(),
-            "subscription_expires_at": expires_at.isoformat()
+            "subscription_activated_at": now,
+            "subscription_expires_at": expires_at
         }}
     )
+    user_context_cache.invalidate(user_id)
+    admin_stats.subscription_activated(user_id, expires_at)
     
     # Add to subscription history
     history_entry = {
         "id": str(datetime.now().timestamp()),
         "user_id": user_id,
         "plan_name": plan_name,
-        "price": plan["price"],
-        "communications_per_day": plan["communications"],
-        "purchase_date": now.isoformat(),
+        "price": plan.price,
+        "communications_per_day": plan.communications,
+        "purchase_date": now,
         "activated_by": "admin"
     }
     await subscription_history_collection.insert_one(history_entry)
     
     # Set daily communications
-    today = now.date().isoformat()
-    await daily_communications_collection.update_one(
-        {"user_id": user_id, "date": today},
-        {"$set": {"premium_count": plan["communications"], "free_count": 5, "used_count": 0}},
-        upsert=True
-    )
+    await quota.reset_for_plan(user_id, plan.communications, now)
     
     return {"message": f"Тариф {plan_name} активирован на 1 месяц", "expires_at": expires_at.isoformat()}
 
@@ -231,35 +324,29 @@ async def get_user_subscription_history(user_id: str, admin_id: str = Depends(is
 @router.get("/subscription/active-users")
 async def get_active_subscription_users(admin_id: str = Depends(is_admin)):
     """Get all users with active subscriptions"""
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     users = await users_collection.find(
         {
-            "active_subscription": {"$ne": None},
+            "active_subscription": {"$type": "string"},
             "subscription_expires_at": {"$gt": now}
         },
         {"_id": 0}
     ).to_list(1000)
     
-    result = []
-    for user in users:
-        if isinstance(user.get("created_at"), str):
-            user["created_at"] = datetime.fromisoformat(user["created_at"])
-        if isinstance(user.get("subscription_activated_at"), str):
-            user["subscription_activated_at"] = datetime.fromisoformat(user["subscription_activated_at"])
-        if isinstance(user.get("subscription_expires_at"), str):
-            user["subscription_expires_at"] = datetime.fromisoformat(user["subscription_expires_at"])
-        result.append(User(**user))
-    
-    return result
+    return USERS_RESPONSE.response(users)
 
 @router.put("/subscription/toggle")
 async def toggle_subscription_plan(plan_name: str, enabled: bool, admin_id: str = Depends(is_admin)):
     """Toggle a subscription plan on or off"""
+    if not plan_catalog.get(plan_name):
+        raise HTTPException(status_code=404, detail="Plan not found")
+    
     await subscriptions_settings_collection.update_one(
         {"plan_name": plan_name},
-        {"$set": {"enabled": enabled, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        {"$set": {"enabled": enabled, "updated_at": datetime.now(timezone.utc)}},
         upsert=True
     )
+    plan_catalog.set_enabled(plan_name, enabled)
     
     return {"message": f"Plan {plan_name} {'enabled' if enabled else 'disabled'}"}
 
@@ -307,6 +394,7 @@ async def set_admin_role(user_id: str, role_data: AdminRoleUpdate, super_admin_i
             "admin_permissions": valid_permissions if role_data.is_admin else []
         }}
     )
+    user_context_cache.invalidate(user_id)
     
     return {
         "message": f"Роль администратора {'назначена' if role_data.is_admin else 'снята'}",
@@ -321,7 +409,7 @@ async def admin_change_user_password(data: AdminPasswordChange, admin_id: str =
         raise HTTPException(status_code=404, detail="User not found")
     
     # Hash new password
-    new_hash = get_password_hash(data.new_password)
+    new_hash = await password_hasher.hash(data.new_password)
     
     await users_collection.update_one(
         {"id": data.user_id},
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from models import UserCreate, UserLogin, TokenResponse, User, PasswordChange, PasswordReset
-from auth import get_password_hash, verify_password, create_access_token, get_current_user_id
+from models import (
+    UserCreate, UserLogin, TokenResponse, User, PasswordChange, PasswordReset, utc_now,
+    USER_RESPONSE, TOKEN_RESPONSE
+)
+from auth import create_access_token, get_current_user_id
 from database import users_collection
-from datetime import datetime, timezone
+from services.admin_stats import admin_stats
+from services.password_hasher import password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -23,10 +27,10 @@ async def register(user_data: UserCreate):
     )
     
     user_dict = user.model_dump()
-    user_dict["password_hash"] = get_password_hash(user_data.password)
-    user_dict["created_at"] = user_dict["created_at"].isoformat()
+    user_dict["password_hash"] = await password_hasher.hash(user_data.password)
     
     await users_collection.insert_one(user_dict)
+    admin_stats.incr("total_users")
     
     # Create token
     access_token = create_access_token(data={"sub": user.id})
@@ -39,28 +43,23 @@ async def login(credentials: UserLogin):
     if not user_dict:
         raise HTTPException(status_code=400, detail="Неверный email или пароль")
     
-    if not verify_password(credentials.password, user_dict["password_hash"]):
+    valid, new_hash = await password_hasher.verify_and_update(credentials.password, user_dict["password_hash"])
+    if not valid:
         raise HTTPException(status_code=400, detail="Неверный email или пароль")
     
     if user_dict.get("blocked", False):
         raise HTTPException(status_code=403, detail="Your account has been blocked")
     
-    # Update last login
-    await users_collection.update_one(
-        {"id": user_dict["id"]},
-        {"$set": {"last_login": datetime.now(timezone.utc).isoformat()}}
-    )
-    
-    # Parse dates
-    if isinstance(user_dict.get("created_at"), str):
-        user_dict["created_at"] = datetime.fromisoformat(user_dict["created_at"])
-    if isinstance(user_dict.get("last_login"), str):
-        user_dict["last_login"] = datetime.fromisoformat(user_dict["last_login"])
+    # Update last login, and the hash if BCRYPT_ROUNDS changed since it was made
+    user_dict["last_login"] = utc_now()
+    update = {"last_login": user_dict["last_login"]}
+    if new_hash:
+        update["password_hash"] = new_hash
+    await users_collection.update_one({"id": user_dict["id"]}, {"$set": update})
     
-    user = User(**user_dict)
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data={"sub": user_dict["id"]})
     
-    return TokenResponse(access_token=access_token, user=user)
+    return TOKEN_RESPONSE.response({"access_token": access_token, "user": USER_RESPONSE.trusted(user_dict)})
 
 @router.post("/forgot-password")
 async def forgot_password(data: PasswordReset):
@@ -78,10 +77,10 @@ async def change_password(data: PasswordChange, user_id: str = Depends(get_curre
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not verify_password(data.current_password, user_dict["password_hash"]):
+    if not await password_hasher.verify(data.current_password, user_dict["password_hash"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
-    new_hash = get_password_hash(data.new_password)
+    new_hash = await password_hasher.hash(data.new_password)
     await users_collection.update_one(
         {"id": user_id},
         {"$set": {"password_hash": new_hash}}
@@ -95,9 +94,4 @@ async def get_current_user(user_id: str = Depends(get_current_user_id)):
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user_dict.get("created_at"), str):
-        user_dict["created_at"] = datetime.fromisoformat(user_dict["created_at"])
-    if isinstance(user_dict.get("last_login"), str):
-        user_dict["last_login"] = datetime.fromisoformat(user_dict["last_login"])
-    
-    return User(**user_dict)
+    return USER_RESPONSE.response(user_dict)
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
-from models import MatchInfo, Message, MessageCreate, UserPublic
+from fastapi import APIRouter, HTTPException, Depends, Query
+from models import (
+    MatchInfo, Message, MessageCreate, UserPublic, USER_PUBLIC_PROJECTION,
+    USER_PUBLIC_RESPONSE, MESSAGES_RESPONSE
+)
+from serialization import FastJSONResponse
 from auth import get_current_user_id
 from database import matches_collection, messages_collection, users_collection
+from realtime import sio, chat_room
+from services.read_state import read_state
+from services.admin_stats import admin_stats
 from datetime import datetime, timezone
 from typing import List, Optional
 from pydantic import BaseModel
@@ -22,8 +29,18 @@ class MatchInfoExtended(BaseModel):
     unread_count: int = 0
     last_message: Optional[LastMessage] = None
 
+def last_message_summary(message: dict) -> dict:
+    """Denormalized copy of a chat's latest message, stored on the match"""
+    text = message["text"]
+    return {
+        "text": text[:50] + ("..." if len(text) > 50 else ""),
+        "timestamp": message["timestamp"],
+        "sender_id": message["sender_id"]
+    }
+
 @router.get("/matches")
 async def get_matches(user_id: str = Depends(get_current_user_id)):
+    """List the user's chats with a constant number of queries (no per-match lookups)"""
     matches = await matches_collection.find(
         {
             "$or": [{"user1_id": user_id}, {"user2_id": user_id}],
@@ -31,94 +48,153 @@ async def get_matches(user_id: str = Depends(get_current_user_id)):
         },
         {"_id": 0}
     ).to_list(100)
+    if not matches:
+        return []
     
-    result = []
+    # Partners: one $in lookup with only the public fields
+    partner_ids = [m["user2_id"] if m["user1_id"] == user_id else m["user1_id"] for m in matches]
+    partners = await users_collection.find(
+        {"id": {"$in": partner_ids}}, USER_PUBLIC_PROJECTION
+    ).to_list(len(partner_ids))
+    partners_by_id = {p["id"]: p for p in partners}
+    
+    # Unread counts: one aggregation over unread messages only
+    unread_branches = []
     for match in matches:
-        partner_id = match["user2_id"] if match["user1_id"] == user_id else match["user1_id"]
-        partner_dict = await users_collection.find_one({"id": partner_id}, {"_id": 0})
+        branch = {"match_id": match["id"]}
+        last_read = read_state.last_read(match["id"], user_id, match.get(f"last_read_{user_id}"))
+        if last_read:
+            branch["timestamp"] = {"$gt": last_read}
+        unread_branches.append(branch)
+    unread_counts = {
+        row["_id"]: row["count"]
+        async for row in messages_collection.aggregate([
+            {"$match": {"$or": unread_branches, "sender_id": {"$ne": user_id}}},
+            {"$group": {"_id": "$match_id", "count": {"$sum": 1}}}
+        ])
+    }
+    
+    # Last messages are denormalized on the match by send_message; chats from
+    # before that was added are filled in with one grouped query
+    last_messages = {m["id"]: m["last_message"] for m in matches if m.get("last_message")}
+    missing = [m["id"] for m in matches if m["id"] not in last_messages]
+    if missing:
+        async for row in messages_collection.aggregate([
+            {"$match": {"match_id": {"$in": missing}}},
+            {"$sort": {"match_id": 1, "timestamp": -1}},
+            {"$group": {"_id": "$match_id", "last": {"$first": "$$ROOT"}}}
+        ]):
+            last_messages[row["_id"]] = last_message_summary(row["last"])
+    
+    result = []
+    now = datetime.now(timezone.utc)
+    for match, partner_id in zip(matches, partner_ids):
+        partner_dict = partners_by_id.get(partner_id)
+        if not partner_dict:
+            continue
+        
+        days_remaining = (match["chat_expires_at"] - now).days
         
-        if partner_dict:
-            if isinstance(match["matched_at"], str):
-                match["matched_at"] = datetime.fromisoformat(match["matched_at"])
-            if isinstance(match["chat_expires_at"], str):
-                match["chat_expires_at"] = datetime.fromisoformat(match["chat_expires_at"])
-            
-            days_remaining = (match["chat_expires_at"] - datetime.now(timezone.utc)).days
-            
-            # Get unread count
-            last_read_key = f"last_read_{user_id}"
-            last_read = match.get(last_read_key)
-            
-            unread_query = {"match_id": match["id"], "sender_id": {"$ne": user_id}}
-            if last_read:
-                unread_query["timestamp"] = {"$gt": last_read}
-            
-            unread_count = await messages_collection.count_documents(unread_query)
-            
-            # Get last message
-            last_msg = await messages_collection.find_one(
-                {"match_id": match["id"]},
-                {"_id": 0},
-                sort=[("timestamp", -1)]
+        last_message = None
+        last_msg = last_messages.get(match["id"])
+        if last_msg:
+            last_message = LastMessage(
+                text=last_msg["text"],
+                timestamp=last_msg["timestamp"],
+                is_own=last_msg["sender_id"] == user_id
             )
-            
-            last_message = None
-            if last_msg:
-                if isinstance(last_msg.get("timestamp"), str):
-                    last_msg["timestamp"] = datetime.fromisoformat(last_msg["timestamp"])
-                last_message = LastMessage(
-                    text=last_msg["text"][:50] + ("..." if len(last_msg["text"]) > 50 else ""),
-                    timestamp=last_msg["timestamp"],
-                    is_own=last_msg["sender_id"] == user_id
-                )
-            
-            match_info = {
-                "id": match["id"],
-                "partner": UserPublic(**partner_dict).model_dump(),
-                "matched_at": match["matched_at"].isoformat(),
-                "expires_in_days": max(0, days_remaining),
-                "active": match["active"],
-                "unread_count": unread_count,
-                "last_message": last_message.model_dump() if last_message else None
-            }
-            result.append(match_info)
-    
-    # Sort by last message time (most recent first)
-    def get_sort_key(x):
-        if x.get("last_message") and x["last_message"].get("timestamp"):
-            ts = x["last_message"]["timestamp"]
-            if isinstance(ts, str):
-                return ts
-            return ts.isoformat() if hasattr(ts, 'isoformat') else str(ts)
-        return ""
-    
-    result.sort(key=get_sort_key, reverse=True)
-    
-    return result
+        
+        result.append({
+            "id": match["id"],
+            "partner": USER_PUBLIC_RESPONSE.dump(partner_dict),
+            "matched_at": match["matched_at"].isoformat(),
+            "expires_in_days": max(0, days_remaining),
+            "active": match["active"],
+            "unread_count": unread_counts.get(match["id"], 0),
+            "last_message": last_message.model_dump() if last_message else None
+        })
+    
+    # Sort by last message time (most recent first), chats without messages last
+    result.sort(
+        key=lambda x: x["last_message"]["timestamp"].isoformat() if x["last_message"] else "",
+        reverse=True
+    )
+    
+    return FastJSONResponse(result)
+
+MESSAGES_PAGE_SIZE = 100
+MESSAGES_MAX_PAGE_SIZE = 500
+
+def parse_message_cursor(cursor: str):
+    """Split a "<timestamp>_<id>" cursor into a datetime and a message id"""
+    try:
+        # An unencoded "+00:00" arrives as " 00:00"
+        timestamp, message_id = cursor.replace(" ", "+").rsplit("_", 1)
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return timestamp, message_id
 
 @router.get("/{match_id}/messages", response_model=List[Message])
-async def get_messages(match_id: str, user_id: str = Depends(get_current_user_id)):
+async def get_messages(
+    match_id: str,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Page through a chat ordered by (timestamp, id).
+
+    - no cursor: the latest `limit` messages
+    - after=<cursor>: messages newer than the cursor (the delta since the last seen one)
+    - before=<cursor>: the `limit` messages preceding the cursor (older history)
+
+    Cursors are built from a message as "<timestamp>_<id>". X-Has-More tells
+    whether another page exists in the requested direction.
+    """
+    if after and before:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before'")
+    
     # Verify user is part of match
-    match = await matches_collection.find_one({"id": match_id}, {"_id": 0})
+    match = await matches_collection.find_one({"id": match_id}, {"_id": 0, "user1_id": 1, "user2_id": 1})
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     
     if match["user1_id"] != user_id and match["user2_id"] != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    messages = await messages_collection.find({"match_id": match_id}, {"_id": 0}).to_list(1000)
+    # Served by the (match_id, timestamp, id) index
+    query = {"match_id": match_id}
+    if after:
+        timestamp, message_id = parse_message_cursor(after)
+        query["$or"] = [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "id": {"$gt": message_id}}
+        ]
+        direction = 1
+    else:
+        if before:
+            timestamp, message_id = parse_message_cursor(before)
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "id": {"$lt": message_id}}
+            ]
+        direction = -1
     
-    for msg in messages:
-        if isinstance(msg.get("timestamp"), str):
-            msg["timestamp"] = datetime.fromisoformat(msg["timestamp"])
+    messages = await messages_collection.find(query, {"_id": 0}).sort(
+        [("timestamp", direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
     
-    # Mark messages as read
-    await matches_collection.update_one(
-        {"id": match_id},
-        {"$set": {f"last_read_{user_id}": datetime.now(timezone.utc).isoformat()}}
-    )
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if direction == -1:
+        messages.reverse()
     
-    return [Message(**msg) for msg in messages]
+    # Mark messages as read (written to Mongo in batches)
+    if not before:
+        read_state.mark_read(match_id, user_id)
+    
+    return MESSAGES_RESPONSE.response(messages, headers={"X-Has-More": "true" if has_more else "false"})
 
 @router.post("/{match_id}/message", response_model=Message)
 async def send_message(match_id: str, message_data: MessageCreate, user_id: str = Depends(get_current_user_id)):
@@ -134,11 +210,10 @@ async def send_message(match_id: str, message_data: MessageCreate, user_id: str
         raise HTTPException(status_code=400, detail="Chat is no longer active")
     
     # Check if chat expired
-    if isinstance(match["chat_expires_at"], str):
-        match["chat_expires_at"] = datetime.fromisoformat(match["chat_expires_at"])
-    
     if datetime.now(timezone.utc) > match["chat_expires_at"]:
-        await matches_collection.update_one({"id": match_id}, {"$set": {"active": False}})
+        result = await matches_collection.update_one({"id": match_id, "active": True}, {"$set": {"active": False}})
+        if result.modified_count:
+            admin_stats.incr("active_matches", -1)
         raise HTTPException(status_code=400, detail="Chat has expired")
     
     message = Message(
@@ -148,9 +223,15 @@ async def send_message(match_id: str, message_data: MessageCreate, user_id: str
     )
     
     message_dict = message.model_dump()
-    message_dict["timestamp"] = message_dict["timestamp"].isoformat()
     
     await messages_collection.insert_one(message_dict)
+    await matches_collection.update_one(
+        {"id": match_id},
+        {"$set": {"last_message": last_message_summary(message_dict)}}
+    )
+    
+    # Push to everyone who has this chat open
+    await sio.emit('chat_message', message.model_dump(mode="json"), room=chat_room(match_id))
     
     return message
 
@@ -164,21 +245,16 @@ async def get_match_info(match_id: str, user_id: str = Depends(get_current_user_
         raise HTTPException(status_code=403, detail="Not authorized")
     
     partner_id = match["user2_id"] if match["user1_id"] == user_id else match["user1_id"]
-    partner_dict = await users_collection.find_one({"id": partner_id}, {"_id": 0})
+    partner_dict = await users_collection.find_one({"id": partner_id}, USER_PUBLIC_PROJECTION)
     
     if not partner_dict:
         raise HTTPException(status_code=404, detail="Partner not found")
     
-    if isinstance(match["matched_at"], str):
-        match["matched_at"] = datetime.fromisoformat(match["matched_at"])
-    if isinstance(match["chat_expires_at"], str):
-        match["chat_expires_at"] = datetime.fromisoformat(match["chat_expires_at"])
-    
     days_remaining = (match["chat_expires_at"] - datetime.now(timezone.utc)).days
     
     return {
         "id": match["id"],
-        "partner": UserPublic(**partner_dict).model_dump(),
+        "partner": USER_PUBLIC_RESPONSE.dump(partner_dict),
         "matched_at": match["matched_at"].isoformat(),
         "expires_in_days": max(0, days_remaining),
         "active": match["active"]
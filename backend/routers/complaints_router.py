@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from models import ComplaintCreate, Complaint
 from auth import get_current_user_id
 from database import complaints_collection, users_collection
+from services.admin_stats import admin_stats
 
 router = APIRouter(prefix="/complaints", tags=["complaints"])
 
@@ -19,9 +20,9 @@ async def create_complaint(complaint_data: ComplaintCreate, user_id: str = Depen
     )
     
     complaint_dict = complaint.model_dump()
-    complaint_dict["created_at"] = complaint_dict["created_at"].isoformat()
     
     await complaints_collection.insert_one(complaint_dict)
+    admin_stats.incr("total_complaints")
     
     # Increment complaint count for reported user
     await users_collection.update_one(
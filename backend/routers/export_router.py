@@ -0,0 +1,127 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from database import (
+    users_collection, complaints_collection, subscription_history_collection, feedback_collection
+)
+from routers.admin_router import is_admin, ADMIN_USER_PROJECTION
+from datetime import datetime, timezone
+from typing import Optional
+import csv
+import io
+import json
+
+router = APIRouter(prefix="/admin/export", tags=["admin"])
+
+EXPORT_BATCH_SIZE = 1000
+
+# First column of every row: the row's _id, to resume after it with after=
+CURSOR_FIELD = "_cursor"
+
+# dataset -> (collection, exportable fields); exports never include password hashes
+EXPORT_DATASETS = {
+    "users": (users_collection, [f for f in ADMIN_USER_PROJECTION if f != "_id"] + [
+        "gender", "height", "weight", "education", "smoking", "profile_completed",
+        "subscription_activated_at"
+    ]),
+    "complaints": (complaints_collection, ["id", "complainant_id", "reported_user_id", "reason", "created_at"]),
+    "subscription_history": (subscription_history_collection, [
+        "id", "user_id", "plan_name", "price", "communications_per_day", "purchase_date", "activated_by"
+    ]),
+    "feedback": (feedback_collection, ["id", "user_id", "type", "message", "page", "created_at", "status"]),
+}
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def encode_export_cursor(doc_id) -> str:
+    return str(doc_id)
+
+def decode_export_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(cursor)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def export_query(after: Optional[ObjectId]) -> dict:
+    """Rows after the resume cursor; served by the _id index at any depth"""
+    return {"_id": {"$gt": after}} if after is not None else {}
+
+def export_row(row: dict, fields: list) -> dict:
+    return {CURSOR_FIELD: encode_export_cursor(row["_id"]), **{f: export_value(row.get(f)) for f in fields}}
+
+def ndjson_chunk(rows: list, fields: list) -> str:
+    return "".join(json.dumps(export_row(row, fields), ensure_ascii=False) + "\n" for row in rows)
+
+def csv_value(value):
+    value = export_value(value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return "" if value is None else value
+
+def csv_chunk(rows: list, fields: list, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow([CURSOR_FIELD, *fields])
+    for row in rows:
+        writer.writerow([csv_value(value) for value in export_row(row, fields).values()])
+    return buffer.getvalue()
+
+async def export_rows(collection, fields: list, after: Optional[ObjectId], fmt: str):
+    """Yield one encoded chunk per cursor batch, so memory stays at one batch"""
+    projection = {"_id": 1, **{f: 1 for f in fields}}
+    # _id order is stable while new documents are appended, so a client can
+    # resume an interrupted download with after=<_cursor of the last row>
+    cursor = collection.find(export_query(after), projection).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+
+    # A resumed CSV download is appended to the first part, which has the header
+    if fmt == "csv" and after is None:
+        yield csv_chunk([], fields, header=True)
+    batch = []
+    async for row in cursor:
+        batch.append(row)
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield ndjson_chunk(batch, fields) if fmt == "ndjson" else csv_chunk(batch, fields)
+            batch = []
+    if batch:
+        yield ndjson_chunk(batch, fields) if fmt == "ndjson" else csv_chunk(batch, fields)
+
+@router.get("/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    fields: Optional[str] = None,
+    after: Optional[str] = None,
+    admin_id: str = Depends(is_admin)
+):
+    """Stream a whole collection as NDJSON or CSV.
+
+    Every row starts with `_cursor`, the row's position in the export.
+    - fields=a,b,c: export only these columns (in this order)
+    - after=<_cursor>: continue after that row, to resume an interrupted
+      download (CSV then comes without a header)
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    collection, allowed = EXPORT_DATASETS[dataset]
+
+    selected = allowed
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in allowed]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    resume_after = decode_export_cursor(after) if after else None
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8"
+    return StreamingResponse(
+        export_rows(collection, selected, resume_after, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}-{stamp}.{format}"'}
+    )
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 from auth import get_current_user_id
 from database import feedback_collection
-from datetime import datetime, timezone
+from models import utc_now
+from datetime import datetime
 from typing import Optional
 import uuid
 
@@ -19,7 +20,7 @@ class Feedback(BaseModel):
     type: str
     message: str
     page: Optional[str] = None
-    created_at: str
+    created_at: datetime
     status: str = "new"
 
 @router.post("")
@@ -31,7 +32,7 @@ async def submit_feedback(feedback: FeedbackCreate, user_id: str = Depends(get_c
         "type": feedback.type,
         "message": feedback.message,
         "page": feedback.page,
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": utc_now(),
         "status": "new"
     }
     
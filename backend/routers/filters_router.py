@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from models import Filters, FiltersUpdate
 from auth import get_current_user_id
 from database import filters_collection
-from datetime import datetime, timezone
+from services.candidate_index import candidate_index
 
 router = APIRouter(prefix="/filters", tags=["filters"])
 
@@ -19,9 +19,6 @@ async def get_filters(user_id: str = Depends(get_current_user_id)):
             smoking_preference="negative"
         )
     
-    if isinstance(filters_dict.get("updated_at"), str):
-        filters_dict["updated_at"] = datetime.fromisoformat(filters_dict["updated_at"])
-    
     return Filters(**filters_dict)
 
 @router.put("", response_model=Filters)
@@ -35,12 +32,12 @@ async def update_filters(filters_data: FiltersUpdate, user_id: str = Depends(get
     )
     
     filters_dict = filters.model_dump()
-    filters_dict["updated_at"] = filters_dict["updated_at"].isoformat()
     
     await filters_collection.update_one(
         {"user_id": user_id},
         {"$set": filters_dict},
         upsert=True
     )
+    candidate_index.set_filters(user_id, filters_dict)
     
     return filters
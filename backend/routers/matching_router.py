@@ -1,93 +1,69 @@
 from fastapi import APIRouter, HTTPException, Depends
-from models import VideoSession, MatchDecision, Match, UserPublic
-from auth import get_current_user_id
+from models import VideoSession, MatchDecision, Match, UserPublic, USER_PUBLIC_PROJECTION, USER_PUBLIC_RESPONSE
+from auth import get_current_user_id, get_user_context, UserContext
 from database import (
     users_collection, filters_collection, video_sessions_collection,
-    matches_collection, daily_communications_collection
+    matches_collection
 )
+from services.candidate_index import candidate_index
+from services.seen_filter import seen_filter
+from services.admin_stats import admin_stats
+from services import quota
+from routers.subscriptions_router import active_plan_communications
 from datetime import datetime, timedelta, timezone
-import random
 
 router = APIRouter(prefix="/matching", tags=["matching"])
 
 @router.post("/find-match", response_model=UserPublic)
-async def find_match(user_id: str = Depends(get_current_user_id)):
+async def find_match(user: UserContext = Depends(get_user_context)):
+    user_id = user.id
     # Get user's filters
     user_filters = await filters_collection.find_one({"user_id": user_id}, {"_id": 0})
     if not user_filters:
         raise HTTPException(status_code=400, detail="Please set your filters first")
     
-    # Get user info
-    user = await users_collection.find_one({"id": user_id}, {"_id": 0})
-    if not user.get("profile_completed"):
+    if not user.profile_completed:
         raise HTTPException(status_code=400, detail="Please complete your profile first")
     
-    # Check daily communications
-    today = datetime.now(timezone.utc).date().isoformat()
-    comm_status = await daily_communications_collection.find_one({"user_id": user_id, "date": today}, {"_id": 0})
-    
-    if not comm_status:
-        comm_status = {"user_id": user_id, "date": today, "free_count": 5, "premium_count": 0, "used_count": 0}
-        await daily_communications_collection.insert_one(comm_status)
-    
-    total_available = comm_status["free_count"] + comm_status["premium_count"] - comm_status["used_count"]
-    if total_available <= 0:
+    # Check daily communications (not used up until the video session starts)
+    now = datetime.now(timezone.utc)
+    comm_status = await quota.get_today(user_id, active_plan_communications(user, now), now)
+    if quota.summarize(comm_status)["total_available"] <= 0:
         raise HTTPException(status_code=403, detail="No communications remaining for today")
     
-    # Parse age range
-    age_range = user_filters["age_range"]
-    if age_range == "18-25":
-        min_age, max_age = 18, 25
-    elif age_range == "25-35":
-        min_age, max_age = 25, 35
-    elif age_range == "35-45":
-        min_age, max_age = 35, 45
-    elif age_range == "45-55":
-        min_age, max_age = 45, 55
-    else:  # "55+"
-        min_age, max_age = 55, 120
-    
-    # Build query for potential matches
-    match_query = {
-        "id": {"$ne": user_id},
-        "profile_completed": True,
-        "blocked": False,
-        "gender": user_filters["gender_preference"],
-        "city": user_filters["city"],
-        "age": {"$gte": min_age, "$lte": max_age}
-    }
-    
-    if user_filters["smoking_preference"] != "any":
-        match_query["smoking"] = user_filters["smoking_preference"]
-    
-    # Find potential matches
-    potential_matches = await users_collection.find(match_query, {"_id": 0}).to_list(100)
-    
-    if not potential_matches:
+    # Rank mutually eligible candidates in the in-memory index; Mongo is only
+    # read for the chosen profile, re-checking it is still eligible in case
+    # another worker changed it since the index was built.
+    if not candidate_index.loaded:
+        await candidate_index.load(users_collection, filters_collection)
+    
+    # Skip people the user met recently, unless nobody else is left
+    profile = {"age": user.age, "gender": user.gender, "city": user.city, "smoking": user.smoking}
+    candidate_ids = candidate_index.rank(user_id, profile, user_filters, limit=3, seen=seen_filter.matcher(user_id))
+    if not candidate_ids:
+        candidate_ids = candidate_index.rank(user_id, profile, user_filters, limit=3)
+    
+    selected_match = None
+    for candidate_id in candidate_ids:
+        selected_match = await users_collection.find_one(
+            {"id": candidate_id, "profile_completed": True, "blocked": False},
+            USER_PUBLIC_PROJECTION
+        )
+        if selected_match:
+            break
+        candidate_index.deactivate(candidate_id)
+    
+    if not selected_match:
         raise HTTPException(status_code=404, detail="No matches found. Please change your filters.")
     
-    # For better user experience, just return any potential match
-    # In production, you can add mutual criteria back
-    if not potential_matches:
-        raise HTTPException(status_code=404, detail="No matches found. Please change your filters.")
-    
-    # Select random match
-    selected_match = random.choice(potential_matches)
-    
-    return UserPublic(**selected_match)
+    return USER_PUBLIC_RESPONSE.response(selected_match)
 
 @router.post("/video-session", response_model=VideoSession)
-async def start_video_session(match_user_id: str, user_id: str = Depends(get_current_user_id)):
-    # Check communications
-    today = datetime.now(timezone.utc).date().isoformat()
-    comm_status = await daily_communications_collection.find_one({"user_id": user_id, "date": today}, {"_id": 0})
-    
-    if not comm_status:
-        comm_status = {"user_id": user_id, "date": today, "free_count": 5, "premium_count": 0, "used_count": 0}
-        await daily_communications_collection.insert_one(comm_status)
-    
-    total_available = comm_status["free_count"] + comm_status["premium_count"] - comm_status["used_count"]
-    if total_available <= 0:
+async def start_video_session(match_user_id: str, user: UserContext = Depends(get_user_context)):
+    user_id = user.id
+    # Use one communication atomically; None means the quota is exhausted
+    now = datetime.now(timezone.utc)
+    if await quota.consume(user_id, active_plan_communications(user, now), now) is None:
         raise HTTPException(status_code=403, detail="No communications remaining")
     
     # Create video session
@@ -97,15 +73,10 @@ async def start_video_session(match_user_id: str, user_id: str = Depends(get_cur
     )
     
     session_dict = session.model_dump()
-    session_dict["started_at"] = session_dict["started_at"].isoformat()
     
     await video_sessions_collection.insert_one(session_dict)
-    
-    # Increment used count
-    await daily_communications_collection.update_one(
-        {"user_id": user_id, "date": today},
-        {"$inc": {"used_count": 1}}
-    )
+    seen_filter.record(user_id, match_user_id)
+    admin_stats.incr("total_video_sessions")
     
     return session
 
@@ -119,12 +90,11 @@ async def end_video_session(session_id: str, user_id: str = Depends(get_current_
         raise HTTPException(status_code=403, detail="Not authorized")
     
     ended_at = datetime.now(timezone.utc)
-    started_at = datetime.fromisoformat(session_dict["started_at"])
-    duration = int((ended_at - started_at).total_seconds())
+    duration = int((ended_at - session_dict["started_at"]).total_seconds())
     
     await video_sessions_collection.update_one(
         {"id": session_id},
-        {"$set": {"ended_at": ended_at.isoformat(), "duration": duration, "status": "ended"}}
+        {"$set": {"ended_at": ended_at, "duration": duration, "status": "ended"}}
     )
     
     return {"message": "Session ended", "duration": duration}
@@ -160,10 +130,10 @@ async def make_decision(decision: MatchDecision, user_id: str = Depends(get_curr
             )
             
             match_dict = match.model_dump()
-            match_dict["matched_at"] = match_dict["matched_at"].isoformat()
-            match_dict["chat_expires_at"] = match_dict["chat_expires_at"].isoformat()
             
             await matches_collection.insert_one(match_dict)
+            admin_stats.incr("total_matches")
+            admin_stats.incr("active_matches")
             
             return {"matched": True, "match_id": match.id}
         else:
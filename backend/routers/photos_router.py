@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from services.photo_storage import photo_store, is_photo_key, PHOTO_VARIANTS, DEFAULT_VARIANT
+
+router = APIRouter(prefix="/photos", tags=["photos"])
+
+# Keys are content hashes, so a given URL never changes and can be cached forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def photo_url(key: str, size: str = DEFAULT_VARIANT) -> str:
+    """Relative URL of a stored photo variant (legacy data: URLs pass through)"""
+    if not is_photo_key(key):
+        return key
+    url = f"/api/photos/{key}"
+    if size != DEFAULT_VARIANT:
+        url += f"?size={size}"
+    return url
+
+@router.get("/{key}")
+async def get_photo(key: str, request: Request, size: str = DEFAULT_VARIANT):
+    """Serve photo bytes (public endpoint, used directly in <img> tags)"""
+    if not is_photo_key(key) or size not in PHOTO_VARIANTS:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    etag = f'"{key}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    data = await photo_store.load(key, size)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    return Response(content=data, media_type="image/jpeg", headers=headers)
@@ -1,20 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from models import User, ProfileUpdate
-from auth import get_current_user_id
+from models import User, ProfileUpdate, USER_RESPONSE
+from auth import get_current_user_id, user_context_cache
 from database import users_collection
-from datetime import datetime
-import base64
-import uuid
-import io
-from PIL import Image
-
-# Register HEIF opener if available
-try:
-    import pillow_heif
-    pillow_heif.register_heif_opener()
-    HEIF_SUPPORTED = True
-except ImportError:
-    HEIF_SUPPORTED = False
+from services.candidate_index import candidate_index
+from services.photo_storage import store_photo, release_photo
+from services.image_pipeline import image_pipeline, ImagePipelineBusy
+from routers.photos_router import photo_url
+import asyncio
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
@@ -24,12 +16,7 @@ async def get_profile(user_id: str = Depends(get_current_user_id)):
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user_dict.get("created_at"), str):
-        user_dict["created_at"] = datetime.fromisoformat(user_dict["created_at"])
-    if isinstance(user_dict.get("last_login"), str):
-        user_dict["last_login"] = datetime.fromisoformat(user_dict["last_login"])
-    
-    return User(**user_dict)
+    return USER_RESPONSE.response(user_dict)
 
 @router.put("", response_model=User)
 async def update_profile(profile_data: ProfileUpdate, user_id: str = Depends(get_current_user_id)):
@@ -53,12 +40,10 @@ async def update_profile(profile_data: ProfileUpdate, user_id: str = Depends(get
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user_dict.get("created_at"), str):
-        user_dict["created_at"] = datetime.fromisoformat(user_dict["created_at"])
-    if isinstance(user_dict.get("last_login"), str):
-        user_dict["last_login"] = datetime.fromisoformat(user_dict["last_login"])
+    candidate_index.upsert(user_dict)
+    user_context_cache.invalidate(user_id)
     
-    return User(**user_dict)
+    return USER_RESPONSE.response(user_dict)
 
 @router.post("/upload-photo")
 async def upload_photo(file: UploadFile = File(...), user_id: str = Depends(get_current_user_id)):
@@ -76,59 +61,19 @@ async def upload_photo(file: UploadFile = File(...), user_id: str = Depends(get_
     if len(contents) > 10 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Файл слишком большой (макс 10МБ)")
     
+    # Decode/resize in the image process pool so the event loop stays free
     try:
-        # Process image with Pillow (handles HEIC if pillow-heif is installed)
-        img = Image.open(io.BytesIO(contents))
-        
-        # Convert to RGB if necessary (for HEIC, RGBA, etc.)
-        if img.mode in ('RGBA', 'LA', 'P'):
-            # Create white background for transparency
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize if too large (max 1200px on longest side)
-        max_size = 1200
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        
-        # Auto-rotate based on EXIF
-        try:
-            from PIL import ExifTags
-            for orientation in ExifTags.TAGS.keys():
-                if ExifTags.TAGS[orientation] == 'Orientation':
-                    break
-            exif = img._getexif()
-            if exif:
-                orientation_value = exif.get(orientation)
-                if orientation_value == 3:
-                    img = img.rotate(180, expand=True)
-                elif orientation_value == 6:
-                    img = img.rotate(270, expand=True)
-                elif orientation_value == 8:
-                    img = img.rotate(90, expand=True)
-        except (AttributeError, KeyError, IndexError):
-            pass
-        
-        # Save as JPEG with good quality
-        output = io.BytesIO()
-        img.save(output, format='JPEG', quality=85, optimize=True)
-        output.seek(0)
-        
-        # Convert to base64
-        base64_image = base64.b64encode(output.getvalue()).decode('utf-8')
-        photo_url = f"data:image/jpeg;base64,{base64_image}"
-        
+        variants = await image_pipeline.process(contents)
+    except ImagePipelineBusy:
+        raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте загрузить фото позже")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Обработка изображения заняла слишком много времени")
     except Exception as e:
         print(f"Image processing error: {e}")
         raise HTTPException(status_code=400, detail="Не удалось обработать изображение. Попробуйте другой файл.")
     
     # Get user
-    user_dict = await users_collection.find_one({"id": user_id}, {"_id": 0})
+    user_dict = await users_collection.find_one({"id": user_id}, {"_id": 0, "photos": 1})
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -137,18 +82,20 @@ async def upload_photo(file: UploadFile = File(...), user_id: str = Depends(get_
     if len(photos) >= 3:
         raise HTTPException(status_code=400, detail="Максимум 3 фотографии")
     
-    photos.append(photo_url)
+    # Only the content-hashed key is kept on the user, bytes go to the photo store
+    key = await store_photo(variants)
+    photos.append(key)
     
     await users_collection.update_one(
         {"id": user_id},
         {"$set": {"photos": photos}}
     )
     
-    return {"photo_url": photo_url, "photos": photos}
+    return {"photo_key": key, "photo_url": photo_url(key), "photos": photos}
 
 @router.delete("/photo/{photo_index}")
 async def delete_photo(photo_index: int, user_id: str = Depends(get_current_user_id)):
-    user_dict = await users_collection.find_one({"id": user_id}, {"_id": 0})
+    user_dict = await users_collection.find_one({"id": user_id}, {"_id": 0, "photos": 1})
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -156,18 +103,19 @@ async def delete_photo(photo_index: int, user_id: str = Depends(get_current_user
     if photo_index < 0 or photo_index >= len(photos):
         raise HTTPException(status_code=400, detail="Invalid photo index")
     
-    photos.pop(photo_index)
+    removed = photos.pop(photo_index)
     
     await users_collection.update_one(
         {"id": user_id},
         {"$set": {"photos": photos}}
     )
+    await release_photo(removed, users_collection)
     
     return {"photos": photos}
 
 @router.post("/set-main-photo")
 async def set_main_photo(photo_index: int, user_id: str = Depends(get_current_user_id)):
-    user_dict = await users_collection.find_one({"id": user_id}, {"_id": 0})
+    user_dict = await users_collection.find_one({"id": user_id}, {"_id": 0, "photos": 1})
     if not user_dict:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from models import VideoSession, Match
 from auth import get_current_user_id
 from database import users_collection, video_sessions_collection, matches_collection, get_db
+from services.admin_stats import admin_stats
 from datetime import datetime, timedelta, timezone
 import uuid
 
@@ -46,10 +47,11 @@ async def create_demo_match(user_id: str = Depends(get_current_user_id)):
             "profile_completed": True,
             "blocked": False,
             "complaint_count": 0,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "hashed_password": "demo"
         }
         await users_collection.insert_one(demo_user)
+        admin_stats.incr("total_users")
         test_user = demo_user
     
     # Check if match already exists
@@ -78,12 +80,11 @@ async def create_demo_match(user_id: str = Depends(get_current_user_id)):
     )
     
     session_dict = session.model_dump()
-    session_dict["started_at"] = session_dict["started_at"].isoformat()
-    session_dict["ended_at"] = session_dict["ended_at"].isoformat()
     session_dict["user1_decision"] = True
     session_dict["user2_decision"] = True
     
     await video_sessions_collection.insert_one(session_dict)
+    admin_stats.incr("total_video_sessions")
     
     # Create match
     match = Match(
@@ -93,10 +94,10 @@ async def create_demo_match(user_id: str = Depends(get_current_user_id)):
     )
     
     match_dict = match.model_dump()
-    match_dict["matched_at"] = match_dict["matched_at"].isoformat()
-    match_dict["chat_expires_at"] = match_dict["chat_expires_at"].isoformat()
     
     await matches_collection.insert_one(match_dict)
+    admin_stats.incr("total_matches")
+    admin_stats.incr("active_matches")
     
     return {
         "message": "Demo match created",
@@ -151,8 +151,8 @@ async def create_super_admin(db):
         "city": "Москва",
         "description": "Администратор системы",
         "photos": [],
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "last_login": datetime.now(timezone.utc).isoformat(),
+        "created_at": datetime.now(timezone.utc),
+        "last_login": datetime.now(timezone.utc),
         "blocked": False,
         "complaint_count": 0,
         "profile_completed": True,
@@ -0,0 +1,83 @@
+"""Fast response serialization.
+
+By default a handler that returns User(**doc) pays for validating the document
+into the model, then FastAPI validates it again against response_model,
+converts it with jsonable_encoder and finally json.dumps the result.
+
+Documents read back from our own collections were validated when they were
+written, so hot endpoints skip all of that:
+
+- ResponseSchema builds the models with model_construct() (no validation;
+  fields outside the model are dropped and defaults filled in) and encodes them
+  with a TypeAdapter compiled once at import, in pydantic-core
+- FastJSONResponse encodes plain dict/list responses with orjson
+
+A handler returns ResponseSchema.response(...) or FastJSONResponse(...) and
+keeps its response_model for the OpenAPI docs; FastAPI passes Response objects
+through untouched. The output is the same JSON the default path produced.
+"""
+from typing import Any, List
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+
+def _create_dumps():
+    try:
+        import orjson
+    except ImportError:
+        import json
+        from fastapi.encoders import jsonable_encoder
+
+        def dumps(content: Any) -> bytes:
+            return json.dumps(
+                jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+        return dumps
+
+    def default(value):
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json")
+        raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return dumps
+
+
+dumps = _create_dumps()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson (datetimes as ISO 8601, models dumped)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ResponseSchema:
+    """Precompiled serializer for a response model, or a list of them (many=True)"""
+
+    def __init__(self, model: type, many: bool = False):
+        self.model = model
+        self.many = many
+        self._adapter = TypeAdapter(List[model] if many else model)
+
+    def trusted(self, doc: dict):
+        """Model from a document we wrote ourselves, without validating it"""
+        return self.model.model_construct(**doc)
+
+    def dump(self, docs) -> Any:
+        """JSON-compatible Python value, for embedding in a larger response"""
+        value = [self.trusted(doc) for doc in docs] if self.many else self.trusted(docs)
+        return self._adapter.dump_python(value, mode="json", warnings=False)
+
+    def render(self, docs) -> bytes:
+        value = [self.trusted(doc) for doc in docs] if self.many else self.trusted(docs)
+        return self._adapter.dump_json(value, warnings=False)
+
+    def response(self, docs, status_code: int = 200, headers: dict = None) -> Response:
+        return Response(
+            content=self.render(docs), status_code=status_code,
+            headers=headers, media_type="application/json"
+        )
@@ -1,10 +1,10 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Request
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from pathlib import Path
 import os
 import logging
-import socketio
 
 # Load environment
 ROOT_DIR = Path(__file__).parent
@@ -13,11 +13,10 @@ load_dotenv(ROOT_DIR / '.env')
 # Create FastAPI app
 app = FastAPI()
 
-# Create Socket.IO server for WebRTC signaling
-sio = socketio.AsyncServer(
-    async_mode='asgi',
-    cors_allowed_origins='*'
-)
+# Socket.IO server for WebRTC signaling and chat push
+import socketio
+from realtime import sio, chat_room
+from services.signaling import signaling_registry
 socket_app = socketio.ASGIApp(sio, app)
 
 # Import routers
@@ -32,7 +31,11 @@ from routers.admin_router import router as admin_router
 from routers.testing_router import router as testing_router
 from routers.feedback_router import router as feedback_router
 from routers.documents_router import router as documents_router
+from routers.photos_router import router as photos_router
+from routers.export_router import router as export_router
 from database import close_db
+from services.password_hasher import PasswordHasherBusy
+from services.quota import QuotaUnavailable
 
 # Create API router with prefix
 api_router = APIRouter(prefix="/api")
@@ -54,9 +57,27 @@ api_router.include_router(admin_router)
 api_router.include_router(testing_router)
 api_router.include_router(feedback_router)
 api_router.include_router(documents_router)
+api_router.include_router(photos_router)
+api_router.include_router(export_router)
 
 app.include_router(api_router)
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Слишком много запросов, попробуйте через несколько секунд"},
+        headers={"Retry-After": "2"}
+    )
+
+@app.exception_handler(QuotaUnavailable)
+async def quota_unavailable(request: Request, exc: QuotaUnavailable):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Сервис временно недоступен, попробуйте позже"},
+        headers={"Retry-After": "30"}
+    )
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -64,6 +85,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Has-More", "X-Next-Cursor"],
 )
 
 # Configure logging
@@ -74,23 +96,23 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # WebRTC Signaling via WebSocket
-# Store active connections
-active_connections = {}
+# Connections are indexed by sid, room and user in signaling_registry, which
+# is shared through Redis when several workers serve Socket.IO
 
 @sio.event
 async def connect(sid, environ):
     logger.info(f"Client connected: {sid}")
-    active_connections[sid] = {}
+    await signaling_registry.connect(sid)
 
 @sio.event
 async def disconnect(sid):
     logger.info(f"Client disconnected: {sid}")
-    if sid in active_connections:
-        # Notify peer if exists
-        peer_sid = active_connections[sid].get('peer_sid')
-        if peer_sid and peer_sid in active_connections:
-            await sio.emit('peer_disconnected', room=peer_sid)
-        del active_connections[sid]
+    from services.lobby import lobby
+    lobby.leave_sid(sid)
+    peer_sid = await signaling_registry.disconnect(sid)
+    # Notify peer if exists (it may be connected to another worker)
+    if peer_sid:
+        await sio.emit('peer_disconnected', room=peer_sid)
 
 @sio.event
 async def join_room(sid, data):
@@ -100,50 +122,191 @@ async def join_room(sid, data):
     
     logger.info(f"User {user_id} joining room {room_id}")
     
-    await sio.enter_room(sid, room_id)
-    active_connections[sid]['room_id'] = room_id
-    active_connections[sid]['user_id'] = user_id
+    # Other users already in the room; the first one becomes our peer
+    previous_room, room_sids = await signaling_registry.join(sid, room_id, user_id)
     
-    # Get other users in room
-    room_sids = [s for s, conn in active_connections.items() 
-                 if conn.get('room_id') == room_id and s != sid]
+    if previous_room and previous_room != room_id:
+        await sio.leave_room(sid, previous_room)
+    await sio.enter_room(sid, room_id)
     
     if room_sids:
         # Notify existing user about new peer
-        peer_sid = room_sids[0]
-        active_connections[sid]['peer_sid'] = peer_sid
-        active_connections[peer_sid]['peer_sid'] = sid
-        
-        await sio.emit('peer_joined', {'peer_id': sid}, room=peer_sid)
+        await sio.emit('peer_joined', {'peer_id': sid}, room=room_sids[0])
     
     await sio.emit('room_joined', {'room_id': room_id, 'peers': room_sids}, room=sid)
 
 @sio.event
 async def offer(sid, data):
     """Forward WebRTC offer to peer"""
-    peer_sid = active_connections[sid].get('peer_sid')
+    peer_sid = await signaling_registry.peer_of(sid)
     if peer_sid:
         await sio.emit('offer', {'offer': data['offer'], 'from': sid}, room=peer_sid)
 
 @sio.event
 async def answer(sid, data):
     """Forward WebRTC answer to peer"""
-    peer_sid = active_connections[sid].get('peer_sid')
+    peer_sid = await signaling_registry.peer_of(sid)
     if peer_sid:
         await sio.emit('answer', {'answer': data['answer'], 'from': sid}, room=peer_sid)
 
 @sio.event
 async def ice_candidate(sid, data):
     """Forward ICE candidate to peer"""
-    peer_sid = active_connections[sid].get('peer_sid')
+    peer_sid = await signaling_registry.peer_of(sid)
     if peer_sid:
         await sio.emit('ice_candidate', {'candidate': data['candidate'], 'from': sid}, room=peer_sid)
 
+# Chat push: clients join a per-match room and receive 'chat_message' events
+# instead of polling GET /api/chat/{match_id}/messages
+async def _chat_user(sid, data):
+    """Authenticate a chat socket event and check the user belongs to the match"""
+    from auth import decode_token
+    from database import matches_collection
+    from fastapi import HTTPException
+    
+    match_id = data.get('match_id')
+    try:
+        user_id = decode_token(data.get('token', '')).get('sub')
+    except HTTPException:
+        user_id = None
+    if not user_id or not match_id:
+        await sio.emit('chat_error', {'match_id': match_id, 'detail': 'Invalid authentication credentials'}, room=sid)
+        return None
+    
+    match = await matches_collection.find_one(
+        {"id": match_id, "$or": [{"user1_id": user_id}, {"user2_id": user_id}]},
+        {"_id": 0, "id": 1}
+    )
+    if not match:
+        await sio.emit('chat_error', {'match_id': match_id, 'detail': 'Not authorized'}, room=sid)
+        return None
+    return user_id
+
+@sio.event
+async def join_chat(sid, data):
+    """User opens a chat: subscribe to new messages of this match"""
+    user_id = await _chat_user(sid, data)
+    if not user_id:
+        return
+    
+    from services.read_state import read_state
+    match_id = data['match_id']
+    await sio.enter_room(sid, chat_room(match_id))
+    async with sio.session(sid) as session:
+        session['chat_user_id'] = user_id
+        session.setdefault('chats', set()).add(match_id)
+    read_state.mark_read(match_id, user_id)
+    await sio.emit('chat_joined', {'match_id': match_id}, room=sid)
+
+@sio.event
+async def leave_chat(sid, data):
+    match_id = data.get('match_id')
+    await sio.leave_room(sid, chat_room(match_id))
+    async with sio.session(sid) as session:
+        session.get('chats', set()).discard(match_id)
+
+@sio.event
+async def chat_read(sid, data):
+    """Client has seen the latest messages; persisted by the debounced writer"""
+    from services.read_state import read_state
+    session = await sio.get_session(sid)
+    match_id = data.get('match_id')
+    if match_id in session.get('chats', ()):
+        read_state.mark_read(match_id, session['chat_user_id'])
+
+# Lobby: users waiting for a call are paired by services.lobby, which pushes
+# 'lobby_matched' with the session and room_id to both sides
+@sio.event
+async def lobby_join(sid, data):
+    """User presses "find": enter the waiting pool"""
+    from auth import decode_token, load_user_context
+    from database import users_collection, filters_collection
+    from fastapi import HTTPException
+    from models import UserPublic, USER_PUBLIC_PROJECTION
+    from routers.subscriptions_router import active_plan_communications
+    from services import quota
+    from services.lobby import lobby, WaitingUser
+    from datetime import datetime, timezone
+
+    try:
+        user_id = decode_token((data or {}).get('token', '')).get('sub')
+    except HTTPException:
+        user_id = None
+    user = await load_user_context(user_id) if user_id else None
+    if user is None or user.blocked:
+        await sio.emit('lobby_error', {'detail': 'Invalid authentication credentials'}, room=sid)
+        return
+    if not user.profile_completed:
+        await sio.emit('lobby_error', {'detail': 'Please complete your profile first'}, room=sid)
+        return
+
+    user_filters = await filters_collection.find_one({"user_id": user_id}, {"_id": 0})
+    if not user_filters:
+        await sio.emit('lobby_error', {'detail': 'Please set your filters first'}, room=sid)
+        return
+
+    now = datetime.now(timezone.utc)
+    premium_count = active_plan_communications(user, now)
+    try:
+        comm_status = await quota.get_today(user_id, premium_count, now)
+    except quota.QuotaUnavailable:
+        await sio.emit('lobby_error', {'detail': 'Service temporarily unavailable'}, room=sid)
+        return
+    if quota.summarize(comm_status)["total_available"] <= 0:
+        await sio.emit('lobby_error', {'detail': 'No communications remaining for today'}, room=sid)
+        return
+
+    profile = await users_collection.find_one({"id": user_id}, USER_PUBLIC_PROJECTION)
+    lobby.join(WaitingUser(sid, UserPublic(**profile).model_dump(), user_filters, premium_count))
+    await sio.emit('lobby_waiting', {'waiting': len(lobby)}, room=sid)
+
+@sio.event
+async def lobby_leave(sid, data=None):
+    from services.lobby import lobby
+    lobby.leave_sid(sid)
+
 @app.on_event("startup")
 async def startup_event():
     """Создает начальные данные при запуске сервера"""
     from seed_data import create_super_admin, create_documents
-    from database import get_db
+    from database import get_db, users_collection, filters_collection, matches_collection, video_sessions_collection
+    from indexes import ensure_indexes, verify_indexes
+    from migrations import merge_duplicate_quota_records, migrate_datetimes
+    from services.candidate_index import candidate_index
+    from services.seen_filter import seen_filter
+    from services.read_state import read_state
+    from services.lobby import lobby
+    from services.admin_stats import admin_stats
+    from services.deletion import deletion_worker
+    from services.plan_catalog import plan_catalog
+    from services.scheduler import scheduler
+    from services import scheduled_jobs, quota
+    from services.email_service import mail_dispatcher
+    from database import subscriptions_settings_collection
+    
+    try:
+        db = await get_db()
+        # Duplicates would keep the unique (user_id, date) quota index from building
+        await merge_duplicate_quota_records(db)
+    except Exception as e:
+        logger.error(f"Quota record merge failed: {e}")
+    
+    try:
+        db = await get_db()
+        failed = await ensure_indexes(db)
+        if f"daily_communications.{quota.QUOTA_INDEX}" in failed:
+            logger.error(
+                "The unique daily quota index is missing: find-match, video sessions "
+                "and the lobby answer 503 until it is built"
+            )
+        await verify_indexes(db)
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {e}")
+    
+    try:
+        await migrate_datetimes(db)
+    except Exception as e:
+        logger.error(f"Datetime migration failed: {e}")
     
     try:
         db = await get_db()
@@ -152,9 +315,59 @@ async def startup_event():
         logger.info("✓ Начальные данные проверены")
     except Exception as e:
         logger.error(f"Ошибка при создании начальных данных: {e}")
+    
+    try:
+        await candidate_index.load(users_collection, filters_collection)
+    except Exception as e:
+        logger.error(f"Failed to load candidate index: {e}")
+    
+    try:
+        await seen_filter.load(video_sessions_collection, matches_collection)
+    except Exception as e:
+        logger.error(f"Failed to load seen filter: {e}")
+    
+    try:
+        await plan_catalog.load(subscriptions_settings_collection)
+    except Exception as e:
+        logger.error(f"Failed to load plan catalog: {e}")
+    
+    read_state.start(matches_collection)
+    lobby.start()
+    admin_stats.start()
+    deletion_worker.start()
+    plan_catalog.start(subscriptions_settings_collection)
+    candidate_index.start(users_collection, filters_collection)
+    scheduled_jobs.register(scheduler)
+    scheduler.start()
+    mail_dispatcher.start()
+    try:
+        await deletion_worker.resume()
+    except Exception as e:
+        logger.error(f"Failed to resume deletion jobs: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    from database import matches_collection
+    from services.image_pipeline import image_pipeline
+    from services.password_hasher import password_hasher
+    from services.read_state import read_state
+    from services.lobby import lobby
+    from services.admin_stats import admin_stats
+    from services.deletion import deletion_worker
+    from services.plan_catalog import plan_catalog
+    from services.candidate_index import candidate_index
+    from services.scheduler import scheduler
+    from services.email_service import mail_dispatcher
+    await scheduler.stop()
+    await lobby.stop()
+    await admin_stats.stop()
+    await deletion_worker.stop()
+    await plan_catalog.stop()
+    await candidate_index.stop()
+    await mail_dispatcher.stop()
+    image_pipeline.shutdown()
+    password_hasher.shutdown()
+    await read_state.stop(matches_collection)
     await close_db()
 
 # Export socket_app as the main ASGI application
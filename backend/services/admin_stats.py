@@ -0,0 +1,160 @@
+"""Materialized counters for the admin dashboard.
+
+The routers that create or change users, matches, sessions, complaints and
+subscriptions update these counters in memory, so GET /admin/stats answers
+without querying Mongo. Active subscriptions are kept as a map of expiry times
+with a heap, so they drop out of the count as soon as they expire.
+
+Every worker keeps its own counters and only sees its own writes in between
+reconciliations. A background task recounts everything from the database every
+STATS_RECONCILE_INTERVAL seconds, or sooner after request_reconcile() (used
+after bulk deletes). The response carries both timestamps so the dashboard can
+show how fresh the numbers are.
+"""
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timezone
+
+from database import (
+    users_collection, matches_collection, video_sessions_collection, complaints_collection
+)
+
+logger = logging.getLogger(__name__)
+
+STATS_RECONCILE_INTERVAL = float(os.environ.get("STATS_RECONCILE_INTERVAL", 300))
+
+COUNTERS = (
+    "total_users",
+    "blocked_users",
+    "total_matches",
+    "active_matches",
+    "total_video_sessions",
+    "total_complaints",
+)
+
+
+class AdminStats:
+    def __init__(self, reconcile_interval: float):
+        self.reconcile_interval = reconcile_interval
+        self._counts = dict.fromkeys(COUNTERS, 0)
+        # user_id -> subscription_expires_at, plus a heap of (expires_at, user_id)
+        self._subscriptions = {}
+        self._expiry_heap = []
+        self.updated_at = None
+        self.reconciled_at = None
+        # Changes made while a reconcile is counting, applied on top of its
+        # result: counter deltas and (user_id, expires_at or None) events
+        self._pending_counts = None
+        self._pending_subscriptions = None
+        self._reconcile_soon = asyncio.Event()
+        self._task = None
+
+    def incr(self, name: str, delta: int = 1):
+        self._counts[name] += delta
+        if self._pending_counts is not None:
+            self._pending_counts[name] += delta
+        self.updated_at = datetime.now(timezone.utc)
+
+    def subscription_activated(self, user_id: str, expires_at: datetime):
+        if self._pending_subscriptions is not None:
+            self._pending_subscriptions.append((user_id, expires_at))
+        self._subscriptions[user_id] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, user_id))
+        self.updated_at = datetime.now(timezone.utc)
+
+    def subscription_ended(self, user_id: str):
+        # Its heap entry no longer matches the map and is skipped when popped
+        if self._pending_subscriptions is not None:
+            self._pending_subscriptions.append((user_id, None))
+        if self._subscriptions.pop(user_id, None) is not None:
+            self.updated_at = datetime.now(timezone.utc)
+
+    def _expire_subscriptions(self, now: datetime):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(heap)
+            if self._subscriptions.get(user_id) == expires_at:
+                del self._subscriptions[user_id]
+
+    def request_reconcile(self):
+        self._reconcile_soon.set()
+
+    def snapshot(self) -> dict:
+        now = datetime.now(timezone.utc)
+        self._expire_subscriptions(now)
+        return {
+            **self._counts,
+            "active_subscriptions": len(self._subscriptions),
+            "updated_at": (self.updated_at or now).isoformat(),
+            "reconciled_at": self.reconciled_at.isoformat() if self.reconciled_at else None,
+        }
+
+    async def reconcile(self):
+        """Recount everything from the database.
+
+        Counters and subscriptions changed while the queries run are recorded
+        and applied on top of the fresh numbers, so they are not lost.
+        """
+        started = datetime.now(timezone.utc)
+        self._pending_counts = dict.fromkeys(COUNTERS, 0)
+        self._pending_subscriptions = []
+        try:
+            # Soft-deleted users stay in the collection (blocked) until their
+            # deletion job removes them; the user list already hides them
+            live_users = {"deleted": {"$ne": True}}
+            counts = await asyncio.gather(
+                users_collection.count_documents(live_users),
+                users_collection.count_documents({**live_users, "blocked": True}),
+                matches_collection.count_documents({}),
+                matches_collection.count_documents({"active": True}),
+                video_sessions_collection.estimated_document_count(),
+                complaints_collection.estimated_document_count(),
+            )
+            subscriptions = {
+                user["id"]: user["subscription_expires_at"]
+                async for user in users_collection.find(
+                    {"active_subscription": {"$ne": None}, "subscription_expires_at": {"$gt": started}},
+                    {"_id": 0, "id": 1, "subscription_expires_at": 1}
+                )
+            }
+            pending_counts, pending_subscriptions = self._pending_counts, self._pending_subscriptions
+        finally:
+            self._pending_counts = self._pending_subscriptions = None
+        self._counts = {name: count + pending_counts[name] for name, count in zip(COUNTERS, counts)}
+        for user_id, expires_at in pending_subscriptions:
+            if expires_at is None:
+                subscriptions.pop(user_id, None)
+            else:
+                subscriptions[user_id] = expires_at
+        self._subscriptions = subscriptions
+        self._expiry_heap = [(expires_at, user_id) for user_id, expires_at in subscriptions.items()]
+        heapq.heapify(self._expiry_heap)
+        self.reconciled_at = started
+        if self.updated_at is None or self.updated_at < started:
+            self.updated_at = started
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Admin stats reconcile failed: {e}")
+            self._reconcile_soon.clear()
+            try:
+                await asyncio.wait_for(self._reconcile_soon.wait(), self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+admin_stats = AdminStats(STATS_RECONCILE_INTERVAL)
@@ -0,0 +1,316 @@
+"""In-memory candidate index for find-match.
+
+Every user with a completed profile gets a row in a set of NumPy columns: their
+own age, gender, city and smoking, plus the filters they set for themselves.
+rank() evaluates both directions of eligibility (the candidate fits the
+seeker's filters and the seeker fits the candidate's) and scores the result in
+one vectorized pass, so picking candidates never touches Mongo and stays in
+the low milliseconds even for a million rows.
+
+The index lives in each worker. The profile, filters and admin routers update
+the copy of the worker that handled the write right away; every worker also
+rebuilds its copy from Mongo every CANDIDATE_INDEX_REFRESH_INTERVAL seconds,
+so new users, edits, blocks and deletions made through other workers show up
+within that time. A rebuild happens beside the index in use, which keeps
+serving rank() until the new one is swapped in.
+"""
+import asyncio
+import logging
+import os
+
+import numpy as np
+
+from services.seen_filter import id_hash
+
+logger = logging.getLogger(__name__)
+
+CANDIDATE_INDEX_REFRESH_INTERVAL = float(os.environ.get("CANDIDATE_INDEX_REFRESH_INTERVAL", 60))
+
+# Age ranges offered by the filters page. Bands overlap at the edges (25 is in
+# both "18-25" and "25-35").
+AGE_RANGES = {
+    "18-25": (18, 25),
+    "25-35": (25, 35),
+    "35-45": (35, 45),
+    "45-55": (45, 55),
+    "55+": (55, 120),
+}
+
+INDEX_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "city": 1,
+    "gender": 1,
+    "age": 1,
+    "smoking": 1,
+    "profile_completed": 1,
+    "blocked": 1,
+}
+
+FILTERS_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "city": 1,
+    "gender_preference": 1,
+    "age_range": 1,
+    "smoking_preference": 1,
+}
+
+# Weight of the random part of the score; keeps results varied between equally
+# good candidates
+SCORE_JITTER = 0.5
+
+# (column, dtype); string attributes are stored as codes, 0 means unknown
+_COLUMNS = (
+    ("active", np.bool_),
+    ("age", np.int16),
+    ("gender", np.int32),
+    ("city", np.int32),
+    ("smoking", np.int32),
+    ("has_filters", np.bool_),
+    ("pref_gender", np.int32),
+    ("pref_city", np.int32),
+    ("pref_age_low", np.int16),
+    ("pref_age_high", np.int16),
+    ("pref_smoking", np.int32),  # 0 = any
+    ("hash", np.uint64),  # id_hash(user_id), for the seen filter
+)
+
+
+def age_bounds(age_range):
+    return AGE_RANGES.get(age_range, AGE_RANGES["55+"])
+
+
+class _Codes:
+    """Interns strings as small ints; 0 is reserved for None/unknown"""
+
+    __slots__ = ("_codes",)
+
+    def __init__(self):
+        self._codes = {}
+
+    def encode(self, value) -> int:
+        if value is None:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._codes) + 1
+        return code
+
+    def lookup(self, value):
+        """Code of a known value, None if it was never seen"""
+        return self._codes.get(value)
+
+
+class CandidateIndex:
+    def __init__(self, capacity: int = 1024, refresh_interval: float = CANDIDATE_INDEX_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._rng = np.random.default_rng()
+        self._reset(capacity)
+        self._load_lock = asyncio.Lock()
+        # Changes made while a rebuild runs, replayed onto the new index
+        self._journal = None
+        self._task = None
+        self.loaded = False
+
+    def _reset(self, capacity: int):
+        self._codes = _Codes()
+        self._rows = {}
+        self._free = []
+        self._ids = np.empty(capacity, dtype=object)
+        self._size = 0
+        self._cols = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _COLUMNS}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row_for(self, user_id: str) -> int:
+        row = self._rows.get(user_id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+        self._rows[user_id] = row
+        self._ids[row] = user_id
+        self._cols["hash"][row] = id_hash(user_id)
+        return row
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        ids = np.empty(capacity, dtype=object)
+        ids[:self._size] = self._ids[:self._size]
+        self._ids = ids
+        for name, column in self._cols.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._cols[name] = grown
+
+    def upsert(self, user: dict):
+        """Insert or refresh a user's own attributes from a user document"""
+        user_id = user.get("id")
+        if not user_id:
+            return
+        self._record("upsert", user)
+        if not user.get("profile_completed") or user.get("blocked", False):
+            self.deactivate(user_id)
+            return
+        row = self._row_for(user_id)
+        cols = self._cols
+        cols["active"][row] = True
+        cols["age"][row] = user.get("age") or 0
+        cols["gender"][row] = self._codes.encode(user.get("gender"))
+        cols["city"][row] = self._codes.encode(user.get("city"))
+        cols["smoking"][row] = self._codes.encode(user.get("smoking"))
+
+    def set_filters(self, user_id: str, filters: dict):
+        """Record the user's own filters, used for the reverse eligibility check"""
+        self._record("set_filters", user_id, filters)
+        row = self._row_for(user_id)
+        cols = self._cols
+        low, high = age_bounds(filters.get("age_range"))
+        smoking = filters.get("smoking_preference")
+        cols["has_filters"][row] = True
+        cols["pref_gender"][row] = self._codes.encode(filters.get("gender_preference"))
+        cols["pref_city"][row] = self._codes.encode(filters.get("city"))
+        cols["pref_age_low"][row] = low
+        cols["pref_age_high"][row] = high
+        cols["pref_smoking"][row] = 0 if smoking in (None, "any") else self._codes.encode(smoking)
+
+    def deactivate(self, user_id: str):
+        """Stop offering a user but keep their row (and filters)"""
+        self._record("deactivate", user_id)
+        row = self._rows.get(user_id)
+        if row is not None:
+            self._cols["active"][row] = False
+
+    def remove(self, user_id: str):
+        """Forget a deleted user entirely"""
+        self._record("remove", user_id)
+        row = self._rows.pop(user_id, None)
+        if row is None:
+            return
+        for column in self._cols.values():
+            column[row] = 0
+        self._ids[row] = None
+        self._free.append(row)
+
+    def _record(self, method: str, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def rank(self, seeker_id: str, profile: dict, filters: dict, limit: int = 5, exclude=(), seen=None) -> list:
+        """Ids of the best mutually eligible candidates for the seeker, best first.
+
+        profile holds the seeker's own age, gender, city and smoking; it is
+        passed in rather than read from the index so the reverse check also
+        holds for seekers who have no row yet. seen is an optional seen_filter
+        matcher; candidates it reports are skipped.
+        """
+        n = self._size
+        cols = {name: column[:n] for name, column in self._cols.items()}
+        code = self._codes.lookup
+
+        # Seeker's filters against candidates. City is the most selective
+        # column, so it narrows the pool before the other comparisons.
+        pref_city = code(filters.get("city"))
+        if pref_city is None:
+            return []
+        rows = np.flatnonzero(cols["city"] == pref_city)
+
+        low, high = age_bounds(filters.get("age_range"))
+        ages = cols["age"][rows]
+        mask = (
+            cols["active"][rows]
+            & (cols["gender"][rows] == (code(filters.get("gender_preference")) or -1))
+            & (ages >= low) & (ages <= high)
+        )
+        smoking_preference = filters.get("smoking_preference")
+        if smoking_preference not in (None, "any"):
+            mask &= cols["smoking"][rows] == (code(smoking_preference) or -1)
+
+        # Candidates' filters against the seeker; users who never set filters
+        # accept anyone. Attributes no candidate ever chose encode as -1, which
+        # matches no preference.
+        seeker_age = profile.get("age") or 0
+        seeker_smoking = code(profile.get("smoking")) or -1
+        mask &= ~cols["has_filters"][rows] | (
+            (cols["pref_city"][rows] == (code(profile.get("city")) or -1))
+            & (cols["pref_gender"][rows] == (code(profile.get("gender")) or -1))
+            & (cols["pref_age_low"][rows] <= seeker_age)
+            & (cols["pref_age_high"][rows] >= seeker_age)
+            & ((cols["pref_smoking"][rows] == 0) | (cols["pref_smoking"][rows] == seeker_smoking))
+        )
+
+        excluded = [self._rows[uid] for uid in (*exclude, seeker_id) if uid in self._rows]
+        if excluded:
+            mask &= ~np.isin(rows, excluded)
+
+        rows = rows[mask]
+        if seen is not None and len(rows):
+            rows = rows[~seen(cols["hash"][rows])]
+        if not len(rows):
+            return []
+
+        # Score: how central each side's age is in the other's range, plus a
+        # random part so the same candidates are not always on top
+        mid, span = (low + high) / 2, max(high - low, 1)
+        score = 1 - np.abs(cols["age"][rows] - mid) / span
+        their_low = cols["pref_age_low"][rows].astype(np.float32)
+        their_high = cols["pref_age_high"][rows].astype(np.float32)
+        their_span = np.maximum(their_high - their_low, 1)
+        fit = 1 - np.abs(seeker_age - (their_low + their_high) / 2) / their_span
+        score += np.where(cols["has_filters"][rows], fit, 0.5)
+        score += self._rng.random(len(rows)) * SCORE_JITTER
+
+        if len(rows) > limit:
+            top = np.argpartition(score, -limit)[-limit:]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(score[top])[::-1]]
+        return list(self._ids[rows[top]])
+
+    async def load(self, users_collection, filters_collection):
+        """(Re)build the whole index from the users and filters collections"""
+        async with self._load_lock:
+            fresh = CandidateIndex(max(1024, len(self)), self.refresh_interval)
+            self._journal = []
+            try:
+                async for user in users_collection.find({"profile_completed": True, "blocked": False}, INDEX_PROJECTION):
+                    fresh.upsert(user)
+                async for filters in filters_collection.find({}, FILTERS_PROJECTION):
+                    fresh.set_filters(filters["user_id"], filters)
+                # The scan may have read a document before this worker changed
+                # it; apply those changes again (no await until the swap)
+                for method, args in self._journal:
+                    getattr(fresh, method)(*args)
+            finally:
+                self._journal = None
+            self._codes, self._rows, self._free = fresh._codes, fresh._rows, fresh._free
+            self._ids, self._size, self._cols = fresh._ids, fresh._size, fresh._cols
+            self.loaded = True
+        logger.info(f"Candidate index loaded: {len(self)} users")
+
+    async def _run(self, users_collection, filters_collection):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load(users_collection, filters_collection)
+            except Exception as e:
+                logger.error(f"Candidate index refresh failed: {e}")
+
+    def start(self, users_collection, filters_collection):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(users_collection, filters_collection))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+candidate_index = CandidateIndex()
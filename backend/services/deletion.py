@@ -0,0 +1,180 @@
+"""Background cascading deletion of users.
+
+DELETE /admin/user/{id} only marks the user deleted (and blocked, so their
+token stops working), records a job in `deletion_jobs` and returns. The
+DeletionWorker then removes everything that references the user:
+
+1. the ids of the user's matches are saved on the job (messages are found
+   through them)
+2. every dependent collection is cleaned in parallel, each in batches of
+   DELETION_BATCH_SIZE documents, with per-step progress on the job
+3. the user document itself, then photos nobody else references
+
+A failed step is retried with backoff up to DELETION_MAX_ATTEMPTS times.
+Unfinished jobs are picked up again at startup; every step is idempotent, so
+running a job twice is harmless.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+
+from database import (
+    users_collection, filters_collection, video_sessions_collection, matches_collection,
+    messages_collection, complaints_collection, daily_communications_collection,
+    user_subscriptions_collection, subscription_history_collection, feedback_collection,
+    deletion_jobs_collection
+)
+from services.photo_storage import release_photo
+
+logger = logging.getLogger(__name__)
+
+DELETION_BATCH_SIZE = int(os.environ.get("DELETION_BATCH_SIZE", 500))
+DELETION_MAX_ATTEMPTS = int(os.environ.get("DELETION_MAX_ATTEMPTS", 5))
+
+
+def _cascade_steps(user_id: str, match_ids: list) -> dict:
+    """step name -> (collection, filter) of documents referencing the user"""
+    either_side = {"$or": [{"user1_id": user_id}, {"user2_id": user_id}]}
+    return {
+        "messages": (messages_collection, {"match_id": {"$in": match_ids}}),
+        "matches": (matches_collection, either_side),
+        "video_sessions": (video_sessions_collection, either_side),
+        "complaints": (complaints_collection, {"$or": [{"complainant_id": user_id}, {"reported_user_id": user_id}]}),
+        "filters": (filters_collection, {"user_id": user_id}),
+        "daily_communications": (daily_communications_collection, {"user_id": user_id}),
+        "user_subscriptions": (user_subscriptions_collection, {"user_id": user_id}),
+        "subscription_history": (subscription_history_collection, {"user_id": user_id}),
+        "feedback": (feedback_collection, {"user_id": user_id}),
+    }
+
+
+async def create_job(user: dict) -> dict:
+    """Mark the user deleted and record the cascade to run"""
+    now = datetime.now(timezone.utc)
+    await users_collection.update_one(
+        {"id": user["id"]},
+        {"$set": {"deleted": True, "blocked": True, "deleted_at": now}}
+    )
+    job = {
+        "id": str(uuid.uuid4()),
+        "user_id": user["id"],
+        "photos": user.get("photos", []),
+        "status": "pending",
+        "attempts": 0,
+        "progress": {},
+        "created_at": now,
+    }
+    await deletion_jobs_collection.insert_one(dict(job))
+    return job
+
+
+async def _delete_in_batches(job_id: str, step: str, collection, query: dict) -> int:
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in await collection.find(query, {"_id": 1}).limit(DELETION_BATCH_SIZE).to_list(DELETION_BATCH_SIZE)]
+        if not ids:
+            break
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        deleted += result.deleted_count
+        await deletion_jobs_collection.update_one(
+            {"id": job_id}, {"$inc": {f"progress.{step}": result.deleted_count}}
+        )
+    return deleted
+
+
+async def run_job(job: dict):
+    job_id, user_id = job["id"], job["user_id"]
+    await deletion_jobs_collection.update_one(
+        {"id": job_id},
+        {"$set": {"status": "running", "started_at": datetime.now(timezone.utc)}, "$inc": {"attempts": 1}}
+    )
+
+    match_ids = job.get("match_ids")
+    if match_ids is None:
+        match_ids = [m["id"] async for m in matches_collection.find(
+            {"$or": [{"user1_id": user_id}, {"user2_id": user_id}]}, {"_id": 0, "id": 1}
+        )]
+        await deletion_jobs_collection.update_one({"id": job_id}, {"$set": {"match_ids": match_ids}})
+
+    steps = _cascade_steps(user_id, match_ids)
+    # Let every step finish before failing, so a retry never overlaps a step
+    # that is still running
+    results = await asyncio.gather(*(
+        _delete_in_batches(job_id, step, collection, query)
+        for step, (collection, query) in steps.items()
+    ), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    await users_collection.delete_one({"id": user_id})
+    for key in job.get("photos", []):
+        await release_photo(key, users_collection)
+
+    await deletion_jobs_collection.update_one(
+        {"id": job_id},
+        {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}, "$unset": {"error": ""}}
+    )
+
+
+class DeletionWorker:
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def enqueue(self, job: dict):
+        self._queue.put_nowait(job)
+
+    async def _process(self, job: dict):
+        from services.admin_stats import admin_stats
+
+        attempt = job.get("attempts", 0)
+        while True:
+            try:
+                await run_job(job)
+                logger.info(f"Deleted user {job['user_id']} (job {job['id']})")
+                admin_stats.request_reconcile()
+                return
+            except Exception as e:
+                attempt += 1
+                logger.error(f"Deletion job {job['id']} failed (attempt {attempt}): {e}")
+                if attempt >= self.max_attempts:
+                    await deletion_jobs_collection.update_one(
+                        {"id": job["id"]}, {"$set": {"status": "failed", "error": str(e)}}
+                    )
+                    return
+                await deletion_jobs_collection.update_one(
+                    {"id": job["id"]}, {"$set": {"status": "retrying", "error": str(e)}}
+                )
+                await asyncio.sleep(min(2 ** attempt, 60))
+                job = await deletion_jobs_collection.find_one({"id": job["id"]}, {"_id": 0}) or job
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            finally:
+                self._queue.task_done()
+
+    async def resume(self):
+        """Queue jobs left unfinished by a restart"""
+        async for job in deletion_jobs_collection.find(
+            {"status": {"$in": ["pending", "running", "retrying"]}}, {"_id": 0}
+        ):
+            self.enqueue(job)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+deletion_worker = DeletionWorker(DELETION_MAX_ATTEMPTS)
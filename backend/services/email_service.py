@@ -1,45 +1,277 @@
+"""Outgoing email.
+
+send_email() only puts the message on the MailDispatcher queue and returns, so
+request handlers never wait for the mail server. EMAIL_WORKERS background
+tasks each keep one authenticated SMTP session open and send whatever is
+queued in batches of up to EMAIL_BATCH_SIZE messages over it; smtplib is
+blocking, so every send runs in a thread. A session is reconnected when the
+server drops it and closed after EMAIL_IDLE_TIMEOUT seconds without mail.
+Failed messages are retried with exponential backoff up to EMAIL_MAX_ATTEMPTS
+times. Only messages actually handed to the server count as attempts: when a
+session drops or cannot be opened, the rest of the batch goes back to the
+queue untouched, and a worker that cannot connect backs off before its next
+batch.
+
+For a local SMTP stand-in (no TLS, no login), set SMTP_HOST=localhost,
+SMTP_PORT=1025, SMTP_SSL=false and SMTP_AUTH=false.
+"""
+import asyncio
+import logging
 import smtplib
 import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 
+logger = logging.getLogger(__name__)
+
 SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.yandex.ru')
 SMTP_PORT = int(os.environ.get('SMTP_PORT', 465))
 SMTP_USER = os.environ.get('SMTP_USER', '')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
 SMTP_FROM = os.environ.get('SMTP_FROM', '')
+SMTP_SSL = os.environ.get('SMTP_SSL', 'true').lower() == 'true'
+SMTP_AUTH = os.environ.get('SMTP_AUTH', 'true').lower() == 'true'
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 30))
 
-async def send_email(to_email: str, subject: str, html_content: str) -> bool:
-    """Send email via Yandex SMTP"""
-    if not SMTP_USER or not SMTP_PASSWORD:
-        print("Email not configured")
-        return False
-    
-    try:
+EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', 2))
+EMAIL_QUEUE_LIMIT = int(os.environ.get('EMAIL_QUEUE_LIMIT', 1000))
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 20))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+EMAIL_IDLE_TIMEOUT = float(os.environ.get('EMAIL_IDLE_TIMEOUT', 60))
+
+
+class OutgoingEmail:
+    __slots__ = ("to", "subject", "html", "attempts", "queued_at")
+
+    def __init__(self, to: str, subject: str, html: str):
+        self.to = to
+        self.subject = subject
+        self.html = html
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+    def render(self) -> str:
         message = MIMEMultipart("alternative")
-        message["Subject"] = subject
+        message["Subject"] = self.subject
         message["From"] = f"Speed Date <{SMTP_FROM}>"
-        message["To"] = to_email
-        
-        # Add HTML content
-        html_part = MIMEText(html_content, "html", "utf-8")
-        message.attach(html_part)
-        
-        # Create SSL context
-        context = ssl.create_default_context()
-        
-        # Connect and send
-        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context) as server:
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(SMTP_FROM, to_email, message.as_string())
-        
-        print(f"Email sent to {to_email}")
+        message["To"] = self.to
+        message.attach(MIMEText(self.html, "html", "utf-8"))
+        return message.as_string()
+
+
+class SmtpSession:
+    """One SMTP connection; used by a single dispatcher worker at a time"""
+
+    def __init__(self):
+        self._server = None
+        self.connects = 0
+        # Consecutive failed connects; the worker backs off while it is non-zero
+        self.connect_failures = 0
+
+    def _connect(self):
+        if SMTP_SSL:
+            server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=ssl.create_default_context(), timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_AUTH:
+            try:
+                server.login(SMTP_USER, SMTP_PASSWORD)
+            except Exception:
+                server.close()
+                raise
+        self._server = server
+        self.connects += 1
+        self.connect_failures = 0
+
+    def send_batch(self, emails: list) -> tuple:
+        """Send over the open session.
+
+        Returns (failures, untried): (email, error, permanent) for messages
+        that were attempted and failed, and the messages never attempted
+        because the session was lost or could not be opened first.
+        """
+        failures = []
+        if self._server is not None:
+            # The server may have dropped an idle session
+            try:
+                self._server.noop()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        for index, email in enumerate(emails):
+            if self._server is None:
+                try:
+                    self._connect()
+                except (smtplib.SMTPException, OSError) as e:
+                    # Bad credentials or an unreachable server fail the same way
+                    # for every message: charge the attempt to this one and
+                    # stop instead of reconnecting for each of the others
+                    self.close()
+                    self.connect_failures += 1
+                    failures.append((email, e, False))
+                    return failures, emails[index + 1:]
+            try:
+                self._server.sendmail(SMTP_FROM, email.to, email.render())
+            except smtplib.SMTPRecipientsRefused as e:
+                failures.append((email, e, True))
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                # The session is gone mid-send; the rest of the batch was never
+                # tried and goes back to the queue as is
+                self.close()
+                failures.append((email, e, False))
+                return failures, emails[index + 1:]
+            except smtplib.SMTPException as e:
+                failures.append((email, e, False))
+        return failures, []
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class MailDispatcher:
+    def __init__(self, workers: int, queue_limit: int, batch_size: int, max_attempts: int, idle_timeout: float):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.idle_timeout = idle_timeout
+        self._queue = None
+        self._executor = None
+        self._sessions = []
+        self._tasks = []
+        self._retry_handles = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.requeued = 0
+        self.batches = 0
+        self.last_error = None
+
+    @property
+    def configured(self) -> bool:
+        return not SMTP_AUTH or bool(SMTP_USER and SMTP_PASSWORD)
+
+    def enqueue(self, email: OutgoingEmail) -> bool:
+        if self._queue is None:
+            logger.warning(f"Mail dispatcher is not running, dropping email to {email.to}")
+            return False
+        if self._queue.qsize() >= self.queue_limit:
+            self.rejected += 1
+            logger.warning(f"Mail queue full, dropping email to {email.to}")
+            return False
+        self._queue.put_nowait(email)
         return True
-        
-    except Exception as e:
-        print(f"Email error: {e}")
-        return False
+
+    def _retry(self, email: OutgoingEmail, error: Exception, permanent: bool):
+        email.attempts += 1
+        self.last_error = str(error)
+        if permanent or email.attempts >= self.max_attempts:
+            self.failed += 1
+            logger.error(f"Email to {email.to} failed after {email.attempts} attempts: {error}")
+            return
+        self.retried += 1
+        delay = min(2 ** email.attempts, 300)
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            self._queue.put_nowait(email)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retry_handles.add(handle)
+
+    async def _worker(self, session: SmtpSession):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                email = await asyncio.wait_for(self._queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                await loop.run_in_executor(self._executor, session.close)
+                continue
+            batch = [email]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                failures, untried = await loop.run_in_executor(self._executor, session.send_batch, batch)
+            except Exception as e:
+                failures, untried = [(email, e, False) for email in batch], []
+            self.batches += 1
+            self.sent += len(batch) - len(failures) - len(untried)
+            for email, error, permanent in failures:
+                self._retry(email, error, permanent)
+            # Never handed to the server, so no attempt is counted
+            self.requeued += len(untried)
+            for email in untried:
+                self._queue.put_nowait(email)
+            for _ in batch:
+                self._queue.task_done()
+            if session.connect_failures:
+                # Do not hammer a server we cannot connect to
+                await asyncio.sleep(min(2 ** session.connect_failures, 300))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "retry_pending": len(self._retry_handles),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "requeued": self.requeued,
+            "batches": self.batches,
+            "connections_opened": sum(session.connects for session in self._sessions),
+            "last_error": self.last_error,
+        }
+
+    def start(self):
+        if self._tasks:
+            return
+        if not self.configured:
+            logger.warning("Email not configured, outgoing mail is disabled")
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="smtp")
+        self._sessions = [SmtpSession() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(session)) for session in self._sessions]
+
+    async def stop(self, drain_timeout: float = 5):
+        """Give queued mail a moment to go out, then close the sessions"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Mail dispatcher stopped with {self._queue.qsize()} emails queued")
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, session.close) for session in self._sessions
+        ))
+        self._executor.shutdown(wait=False)
+        self._queue = None
+
+
+mail_dispatcher = MailDispatcher(
+    EMAIL_WORKERS, EMAIL_QUEUE_LIMIT, EMAIL_BATCH_SIZE, EMAIL_MAX_ATTEMPTS, EMAIL_IDLE_TIMEOUT
+)
+
+
+async def send_email(to_email: str, subject: str, html_content: str) -> bool:
+    """Queue an email for delivery; False if mail is disabled or the queue is full"""
+    return mail_dispatcher.enqueue(OutgoingEmail(to_email, subject, html_content))
 
 async def send_registration_email(to_email: str, name: str, confirmation_code: str) -> bool:
     """Send registration confirmation email"""
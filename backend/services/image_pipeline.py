@@ -0,0 +1,179 @@
+"""Photo decoding and resizing off the event loop.
+
+Pillow work (HEIF decode, flattening, LANCZOS resize, JPEG encode) is CPU-bound
+and takes hundreds of milliseconds per upload, so it runs in a small process
+pool. The pipeline bounds the number of queued jobs and rejects new uploads when
+full instead of letting them pile up, and gives up on a job after a timeout.
+
+A job holds its queue slot until the worker process is actually done with it:
+a request that stops waiting after the timeout does not stop the worker, so
+the slot is released from the executor future's done callback, not when the
+request returns.
+"""
+import asyncio
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from services.photo_storage import PHOTO_VARIANTS, render_variants
+
+# Register HEIF opener if available (also runs in every worker process)
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+    HEIF_SUPPORTED = True
+except ImportError:
+    HEIF_SUPPORTED = False
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+IMAGE_QUEUE_LIMIT = int(os.environ.get("IMAGE_QUEUE_LIMIT", 16))
+IMAGE_JOB_TIMEOUT = float(os.environ.get("IMAGE_JOB_TIMEOUT", 20))
+
+
+class ImagePipelineBusy(Exception):
+    """Too many images are already queued"""
+
+
+def process_image(contents: bytes) -> dict:
+    """Decode an uploaded image and encode every stored JPEG variant.
+
+    Runs inside a worker process, so it must stay a plain top-level function.
+    """
+    img = Image.open(io.BytesIO(contents))
+
+    # Convert to RGB if necessary (for HEIC, RGBA, etc.)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Create white background for transparency
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # Resize if too large (max 1200px on longest side)
+    max_size = PHOTO_VARIANTS["full"]
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    # Auto-rotate based on EXIF
+    try:
+        from PIL import ExifTags
+        for orientation in ExifTags.TAGS.keys():
+            if ExifTags.TAGS[orientation] == 'Orientation':
+                break
+        exif = img._getexif()
+        if exif:
+            orientation_value = exif.get(orientation)
+            if orientation_value == 3:
+                img = img.rotate(180, expand=True)
+            elif orientation_value == 6:
+                img = img.rotate(270, expand=True)
+            elif orientation_value == 8:
+                img = img.rotate(90, expand=True)
+    except (AttributeError, KeyError, IndexError):
+        pass
+
+    # Encode the full-size JPEG and its thumbnails
+    return render_variants(img, quality=85)
+
+
+class ImagePipeline:
+    def __init__(self, workers: int, queue_limit: int, job_timeout: float):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.job_timeout = job_timeout
+        self._executor = None
+        # Done callbacks run in the executor's management thread
+        self._lock = threading.Lock()
+        self._abandoned = set()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # Created lazily so importing the module never forks
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            self._abandoned.discard(future)
+
+    async def process(self, contents: bytes) -> dict:
+        """Run process_image in the pool; raises ImagePipelineBusy or asyncio.TimeoutError"""
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                self.rejected += 1
+                raise ImagePipelineBusy()
+            self.pending += 1
+
+        try:
+            future = self._get_executor().submit(process_image, contents)
+        except Exception as e:
+            # Never reached the pool, so no done callback will free the slot
+            with self._lock:
+                self.pending -= 1
+            self.failed += 1
+            if isinstance(e, BrokenProcessPool):
+                self._executor = None
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            # shield: on timeout only stop waiting; cancelling would not stop a
+            # job that is already running anyway
+            variants = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=self.job_timeout)
+        except asyncio.TimeoutError:
+            # Still running in its worker; the slot stays taken until it ends
+            self.timed_out += 1
+            with self._lock:
+                if not future.done():
+                    self._abandoned.add(future)
+            logger.warning(f"Image job timed out after {self.job_timeout}s")
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image); start a fresh pool next time
+            self.failed += 1
+            self._executor = None
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+        self.completed += 1
+        return variants
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, abandoned = self.pending, len(self._abandoned)
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "queue_depth": pending,
+            "timed_out_running": abandoned,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_pipeline = ImagePipeline(IMAGE_WORKERS, IMAGE_QUEUE_LIMIT, IMAGE_JOB_TIMEOUT)
@@ -0,0 +1,204 @@
+"""Live speed-dating lobby.
+
+Users who press "find" join a waiting pool over Socket.IO (see the lobby_*
+events in server.py). A background matchmaker wakes up when someone joins,
+waits LOBBY_BATCH_INTERVAL seconds to collect a batch, and pairs waiting users
+whose filters accept each other. Both sides of a pair use one communication,
+a video session is created and both sockets receive 'lobby_matched' with the
+room_id to join for signaling, so calls are only set up between people who
+are online right now.
+
+The pool lives in the worker process, so users are paired with others
+connected to the same worker.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from database import video_sessions_collection
+from models import VideoSession
+from realtime import sio
+from services import quota
+from services.candidate_index import AGE_RANGES
+from services.seen_filter import seen_filter
+from services.admin_stats import admin_stats
+
+logger = logging.getLogger(__name__)
+
+LOBBY_BATCH_INTERVAL = float(os.environ.get("LOBBY_BATCH_INTERVAL", 0.5))
+# Waiting users get 'lobby_no_match' and leave the pool after this long
+LOBBY_MAX_WAIT = float(os.environ.get("LOBBY_MAX_WAIT", 60))
+
+
+class WaitingUser:
+    __slots__ = (
+        "user_id", "sid", "city", "gender", "age", "smoking",
+        "filter_city", "gender_preference", "age_range", "smoking_preference",
+        "premium_count", "profile", "joined_at",
+    )
+
+    def __init__(self, sid: str, profile: dict, filters: dict, premium_count: int = 0):
+        self.user_id = profile["id"]
+        self.sid = sid
+        self.city = profile.get("city")
+        self.gender = profile.get("gender")
+        self.age = profile.get("age")
+        self.smoking = profile.get("smoking")
+        self.filter_city = filters["city"]
+        self.gender_preference = filters["gender_preference"]
+        self.age_range = filters["age_range"] if filters["age_range"] in AGE_RANGES else "55+"
+        self.smoking_preference = filters["smoking_preference"]
+        self.premium_count = premium_count
+        self.profile = profile
+        self.joined_at = time.monotonic()
+
+    def accepts(self, other: "WaitingUser") -> bool:
+        """Whether other matches this user's filters"""
+        low, high = AGE_RANGES[self.age_range]
+        return (
+            other.city == self.filter_city
+            and other.gender == self.gender_preference
+            and other.age is not None and low <= other.age <= high
+            and (self.smoking_preference == "any" or other.smoking == self.smoking_preference)
+        )
+
+
+def pair_batch(waiting: list, can_meet=None) -> list:
+    """Greedily pair mutually eligible users, longest-waiting first.
+
+    Candidates are bucketed by (city, filter city) so each user only looks at
+    people whose city they want and who want theirs. can_meet(a, b) is an
+    extra veto, e.g. for users who just talked to each other.
+    """
+    buckets = {}
+    for user in waiting:
+        buckets.setdefault((user.city, user.filter_city), []).append(user)
+
+    taken = set()
+    pairs = []
+    for user in waiting:
+        if user.user_id in taken:
+            continue
+        for other in buckets.get((user.filter_city, user.city), ()):
+            if other.user_id in taken or other.user_id == user.user_id:
+                continue
+            if user.accepts(other) and other.accepts(user) and (can_meet is None or can_meet(user, other)):
+                taken.add(user.user_id)
+                taken.add(other.user_id)
+                pairs.append((user, other))
+                break
+    return pairs
+
+
+class Lobby:
+    def __init__(self, batch_interval: float, max_wait: float):
+        self.batch_interval = batch_interval
+        self.max_wait = max_wait
+        # user_id -> WaitingUser, in join order
+        self._waiting = {}
+        self._by_sid = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def join(self, user: WaitingUser):
+        # A second tab replaces the first one
+        self.leave(user.user_id)
+        self._waiting[user.user_id] = user
+        self._by_sid[user.sid] = user.user_id
+        self._wakeup.set()
+
+    def leave(self, user_id: str):
+        user = self._waiting.pop(user_id, None)
+        if user is not None:
+            self._by_sid.pop(user.sid, None)
+        return user
+
+    def leave_sid(self, sid: str):
+        user_id = self._by_sid.get(sid)
+        return self.leave(user_id) if user_id else None
+
+    def can_meet(self, a: WaitingUser, b: WaitingUser) -> bool:
+        # The filter is symmetric: record() adds both directions
+        return not seen_filter.seen(a.user_id, b.user_id)
+
+    async def run_batch(self) -> int:
+        """Pair everyone currently waiting; returns the number of calls started"""
+        await self._expire()
+        waiting = sorted(self._waiting.values(), key=lambda u: u.joined_at)
+        pairs = pair_batch(waiting, self.can_meet)
+        for a, b in pairs:
+            self.leave(a.user_id)
+            self.leave(b.user_id)
+        started = 0
+        for a, b in pairs:
+            try:
+                started += await self._start_call(a, b)
+            except Exception as e:
+                logger.error(f"Failed to start lobby call {a.user_id} / {b.user_id}: {e}")
+                for user in (a, b):
+                    await sio.emit('lobby_error', {'detail': 'Could not start the call'}, room=user.sid)
+        return started
+
+    async def _expire(self):
+        deadline = time.monotonic() - self.max_wait
+        for user in [u for u in self._waiting.values() if u.joined_at < deadline]:
+            self.leave(user.user_id)
+            await sio.emit('lobby_no_match', {}, room=user.sid)
+
+    async def _start_call(self, a: WaitingUser, b: WaitingUser) -> int:
+        # Both sides pay one communication; if the second cannot, the first
+        # gets it back and stays in the pool
+        if await quota.consume(a.user_id, a.premium_count) is None:
+            await sio.emit('lobby_error', {'detail': 'No communications remaining'}, room=a.sid)
+            self._requeue(b)
+            return 0
+        if await quota.consume(b.user_id, b.premium_count) is None:
+            await quota.refund(a.user_id)
+            await sio.emit('lobby_error', {'detail': 'No communications remaining'}, room=b.sid)
+            self._requeue(a)
+            return 0
+
+        session = VideoSession(user1_id=a.user_id, user2_id=b.user_id)
+        await video_sessions_collection.insert_one(session.model_dump())
+        seen_filter.record(a.user_id, b.user_id)
+        admin_stats.incr("total_video_sessions")
+
+        session_json = session.model_dump(mode="json")
+        room_id = f"session_{session.id}"
+        await sio.emit('lobby_matched', {'session': session_json, 'room_id': room_id, 'partner': b.profile}, room=a.sid)
+        await sio.emit('lobby_matched', {'session': session_json, 'room_id': room_id, 'partner': a.profile}, room=b.sid)
+        return 1
+
+    def _requeue(self, user: WaitingUser):
+        # Keep the original join time so they stay first in line
+        if user.user_id not in self._waiting:
+            self._waiting[user.user_id] = user
+            self._by_sid[user.sid] = user.user_id
+
+    async def _run(self):
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # Give a batch time to form, then pair it
+            await asyncio.sleep(self.batch_interval)
+            try:
+                await self.run_batch()
+            except Exception as e:
+                logger.error(f"Lobby batch failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+lobby = Lobby(LOBBY_BATCH_INTERVAL, LOBBY_MAX_WAIT)
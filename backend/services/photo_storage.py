@@ -0,0 +1,202 @@
+"""Blob storage for profile photos.
+
+Photos are stored outside the users collection under a content-hashed key
+(sha256 of the full-size JPEG). The user document keeps only the key in
+`photos`, and the bytes are served by routers/photos_router.py. Every photo is
+stored in several pre-sized variants so list views can fetch small thumbnails.
+
+The backend is picked with PHOTO_STORAGE ("local" by default, or "gridfs").
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import uuid
+from pathlib import Path
+
+import aiofiles
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels for each stored variant
+PHOTO_VARIANTS = {
+    "full": 1200,
+    "medium": 480,
+    "thumb": 160,
+}
+DEFAULT_VARIANT = "full"
+
+PHOTO_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+PHOTO_STORAGE = os.environ.get("PHOTO_STORAGE", "local")
+PHOTO_STORAGE_DIR = Path(os.environ.get(
+    "PHOTO_STORAGE_DIR",
+    Path(__file__).resolve().parent.parent / "uploads" / "photos"
+))
+
+
+def photo_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_photo_key(value: str) -> bool:
+    """Legacy photos are inline data: URLs, new ones are bare keys"""
+    return bool(PHOTO_KEY_RE.match(value or ""))
+
+
+def render_variants(img: Image.Image, quality: int = 85) -> dict:
+    """Encode an RGB image (already limited to the full size) into every variant"""
+    variants = {}
+    for variant, max_size in PHOTO_VARIANTS.items():
+        resized = img
+        if img.width > max_size or img.height > max_size:
+            resized = img.copy()
+            resized.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        resized.save(output, format="JPEG", quality=quality, optimize=True)
+        variants[variant] = output.getvalue()
+    return variants
+
+
+class LocalPhotoStore:
+    """Stores variants as files: <root>/<key[:2]>/<key>_<variant>.jpg"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, key: str, variant: str) -> Path:
+        return self.root / key[:2] / f"{key}_{variant}.jpg"
+
+    async def exists(self, key: str) -> bool:
+        return self._path(key, DEFAULT_VARIANT).exists()
+
+    async def save(self, key: str, variants: dict):
+        for variant, data in variants.items():
+            path = self._path(key, variant)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial image
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            async with aiofiles.open(tmp_path, "wb") as f:
+                await f.write(data)
+            os.replace(tmp_path, path)
+
+    async def load(self, key: str, variant: str):
+        path = self._path(key, variant)
+        if not path.exists():
+            return None
+        async with aiofiles.open(path, "rb") as f:
+            return await f.read()
+
+    async def delete(self, key: str):
+        for variant in PHOTO_VARIANTS:
+            try:
+                self._path(key, variant).unlink()
+            except FileNotFoundError:
+                pass
+
+
+class GridFSPhotoStore:
+    """Stores variants in a GridFS bucket named "photos", one file per variant"""
+
+    def __init__(self, db):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name="photos")
+
+    @staticmethod
+    def _filename(key: str, variant: str) -> str:
+        return f"{key}_{variant}.jpg"
+
+    async def _file_ids(self, filename: str):
+        cursor = self.bucket.find({"filename": filename})
+        return [f._id async for f in cursor]
+
+    async def exists(self, key: str) -> bool:
+        return bool(await self._file_ids(self._filename(key, DEFAULT_VARIANT)))
+
+    async def save(self, key: str, variants: dict):
+        for variant, data in variants.items():
+            filename = self._filename(key, variant)
+            if await self._file_ids(filename):
+                continue
+            await self.bucket.upload_from_stream(
+                filename, data, metadata={"contentType": "image/jpeg", "key": key, "variant": variant}
+            )
+
+    async def load(self, key: str, variant: str):
+        from gridfs.errors import NoFile
+        try:
+            stream = await self.bucket.open_download_stream_by_name(self._filename(key, variant))
+        except NoFile:
+            return None
+        return await stream.read()
+
+    async def delete(self, key: str):
+        for variant in PHOTO_VARIANTS:
+            for file_id in await self._file_ids(self._filename(key, variant)):
+                await self.bucket.delete(file_id)
+
+
+def _create_store():
+    if PHOTO_STORAGE == "gridfs":
+        from database import db
+        return GridFSPhotoStore(db)
+    return LocalPhotoStore(PHOTO_STORAGE_DIR)
+
+
+photo_store = _create_store()
+
+
+async def store_photo(variants: dict) -> str:
+    """Persist all variants of a processed photo and return its key.
+
+    Identical uploads share one blob, so saving an existing key is a no-op.
+    """
+    key = photo_key(variants[DEFAULT_VARIANT])
+    if not await photo_store.exists(key):
+        await photo_store.save(key, variants)
+    return key
+
+
+async def release_photo(key: str, users_collection):
+    """Delete the blob once no user references the key any more"""
+    if not is_photo_key(key):
+        return
+    if await users_collection.count_documents({"photos": key}, limit=1) == 0:
+        await photo_store.delete(key)
+
+
+async def migrate_inline_photos(users_collection, batch_size: int = 100):
+    """Move legacy base64 data: URLs from users.photos into the blob store"""
+    import base64
+
+    migrated = 0
+    cursor = users_collection.find(
+        {"photos": {"$regex": "^data:"}},
+        {"_id": 0, "id": 1, "photos": 1},
+        batch_size=batch_size
+    )
+    async for user in cursor:
+        keys = []
+        for photo in user.get("photos", []):
+            if not photo.startswith("data:"):
+                keys.append(photo)
+                continue
+            raw = base64.b64decode(photo.split(",", 1)[1])
+            img = Image.open(io.BytesIO(raw)).convert("RGB")
+            keys.append(await store_photo(render_variants(img)))
+        await users_collection.update_one({"id": user["id"]}, {"$set": {"photos": keys}})
+        migrated += 1
+    logger.info(f"Migrated inline photos for {migrated} users")
+    return migrated
+
+
+if __name__ == "__main__":
+    # MONGO_URL=... DB_NAME=... python -m services.photo_storage  (from backend/)
+    import asyncio
+
+    logging.basicConfig(level=logging.INFO)
+
+    from database import users_collection
+    asyncio.run(migrate_inline_photos(users_collection))
@@ -0,0 +1,89 @@
+"""Subscription plan catalog.
+
+The single definition of the plans on sale. Their enabled/disabled settings
+(subscriptions_settings) are loaded once at startup and kept in memory, with
+the serialized /subscriptions/plans response and its ETag, so the public plans
+page never touches Mongo.
+
+toggle_subscription_plan updates the catalog of the worker that handled it.
+Every worker also reloads the settings every PLAN_CATALOG_REFRESH_INTERVAL
+seconds, so a toggle reaches the other workers within that time.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from models import SubscriptionPlan
+
+logger = logging.getLogger(__name__)
+
+PLAN_CATALOG_REFRESH_INTERVAL = float(os.environ.get("PLAN_CATALOG_REFRESH_INTERVAL", 60))
+
+PLANS = (
+    SubscriptionPlan(name="Серебро", price=490, communications=5),
+    SubscriptionPlan(name="Золото", price=990, communications=10),
+    SubscriptionPlan(name="VIP", price=1900, communications=20),
+)
+
+
+class PlanCatalog:
+    def __init__(self, plans, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._plans = {plan.name: plan for plan in plans}
+        self.loaded = False
+        self._task = None
+        self._render()
+
+    def _render(self):
+        self.body = json.dumps(
+            [plan.model_dump() for plan in self._plans.values()], ensure_ascii=False
+        ).encode()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:16] + '"'
+
+    def get(self, name: str):
+        """The plan with this name, None if there is no such plan"""
+        return self._plans.get(name)
+
+    def plans(self) -> list:
+        return list(self._plans.values())
+
+    def set_enabled(self, name: str, enabled: bool):
+        plan = self._plans[name]
+        if plan.enabled != enabled:
+            self._plans[name] = plan.model_copy(update={"enabled": enabled})
+            self._render()
+
+    async def load(self, settings_collection):
+        """Apply the stored enabled/disabled settings"""
+        settings = {
+            setting["plan_name"]: setting.get("enabled", True)
+            async for setting in settings_collection.find({}, {"_id": 0, "plan_name": 1, "enabled": 1})
+        }
+        self._plans = {
+            name: plan.model_copy(update={"enabled": settings.get(name, True)})
+            for name, plan in self._plans.items()
+        }
+        self._render()
+        self.loaded = True
+
+    async def _run(self, settings_collection):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load(settings_collection)
+            except Exception as e:
+                logger.error(f"Plan catalog refresh failed: {e}")
+
+    def start(self, settings_collection):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(settings_collection))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+plan_catalog = PlanCatalog(PLANS, PLAN_CATALOG_REFRESH_INTERVAL)
@@ -0,0 +1,204 @@
+"""Daily communications quota.
+
+Every user gets FREE_DAILY communications per UTC day plus the allowance of
+their active plan. A day's usage lives in one daily_communications document
+keyed by (user_id, date), which the unique index from indexes.py protects.
+
+Reads go through a single find_one_and_update with upsert. consume() first
+increments the existing record under a guard on used_count, which makes it
+impossible to go over the limit under concurrent requests; only when the day
+has no record yet does it insert one.
+
+Both rely on the unique index: without it concurrent upserts can create a
+second record for the day and usage would be split across the two. Every
+function that may create a record therefore raises QuotaUnavailable (a 503)
+while user_id_date_unique is missing, rechecking for it every
+QUOTA_INDEX_RECHECK seconds. migrations.merge_duplicate_quota_records()
+removes the duplicates older code left behind, which would keep the index
+from being built.
+
+Shortly before midnight the scheduler pre-creates the next day's records of
+recently active users (precreate()), so the first requests after the rollover
+update existing documents instead of all inserting at once.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database import daily_communications_collection
+
+logger = logging.getLogger(__name__)
+
+FREE_DAILY = 5
+
+QUOTA_INDEX = "user_id_date_unique"
+QUOTA_INDEX_RECHECK = float(os.environ.get("QUOTA_INDEX_RECHECK", 30))
+
+
+class QuotaUnavailable(Exception):
+    """The unique (user_id, date) index is missing, so the quota cannot be enforced"""
+
+
+_index_ready = False
+_index_checked_at = None
+
+
+async def require_index():
+    """Raise QuotaUnavailable unless the unique quota index exists"""
+    global _index_ready, _index_checked_at
+    if _index_ready:
+        return
+    now = time.monotonic()
+    if _index_checked_at is None or now - _index_checked_at >= QUOTA_INDEX_RECHECK:
+        _index_checked_at = now
+        _index_ready = QUOTA_INDEX in await daily_communications_collection.index_information()
+        if not _index_ready:
+            logger.error(f"daily_communications.{QUOTA_INDEX} is missing, quota is unavailable")
+    if not _index_ready:
+        raise QuotaUnavailable()
+
+QUOTA_PROJECTION = {"_id": 0, "free_count": 1, "premium_count": 1, "used_count": 1}
+
+
+def day_key(now: datetime) -> str:
+    return now.date().isoformat()
+
+
+def next_reset(now: datetime) -> datetime:
+    """Next midnight UTC"""
+    tomorrow = now.date() + timedelta(days=1)
+    return datetime.combine(tomorrow, datetime.min.time()).replace(tzinfo=timezone.utc)
+
+
+def summarize(record: dict) -> dict:
+    """Split what is left of a day's quota into free and premium parts"""
+    used = record.get("used_count", 0)
+    free_available = record.get("free_count", FREE_DAILY)
+    premium_available = record.get("premium_count", 0)
+
+    # Free communications are used first
+    remaining_free = max(0, free_available - used)
+    # Premium is used only after free is exhausted
+    remaining_premium = premium_available if used < free_available else max(0, premium_available - (used - free_available))
+
+    return {
+        "remaining_free": remaining_free,
+        "premium_available": remaining_premium,
+        "total_available": remaining_free + remaining_premium,
+    }
+
+
+async def get_today(user_id: str, premium_count: int = 0, now: datetime = None) -> dict:
+    """Today's record, created on first use; raises premium_count to the plan's allowance"""
+    await require_index()
+    now = now or datetime.now(timezone.utc)
+    query = {"user_id": user_id, "date": day_key(now)}
+    update = {
+        "$setOnInsert": {"free_count": FREE_DAILY, "used_count": 0},
+        "$max": {"premium_count": premium_count},
+    }
+    try:
+        return await daily_communications_collection.find_one_and_update(
+            query, update, projection=QUOTA_PROJECTION, upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent request created the record first; it exists now
+        return await daily_communications_collection.find_one_and_update(
+            query, update, projection=QUOTA_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+
+
+async def consume(user_id: str, premium_count: int = 0, now: datetime = None):
+    """Atomically use one communication; returns the updated record or None when exhausted"""
+    await require_index()
+    now = now or datetime.now(timezone.utc)
+    day = day_key(now)
+    # Match only while used_count is below the limit
+    guarded = {
+        "user_id": user_id,
+        "date": day,
+        "$expr": {"$lt": [
+            "$used_count",
+            {"$add": ["$free_count", {"$max": ["$premium_count", premium_count]}]}
+        ]},
+    }
+    update = {"$max": {"premium_count": premium_count}, "$inc": {"used_count": 1}}
+    record = await daily_communications_collection.find_one_and_update(
+        guarded, update, projection=QUOTA_PROJECTION, return_document=ReturnDocument.AFTER
+    )
+    if record is not None:
+        return record
+
+    # Either the quota is exhausted or today's record does not exist yet. The
+    # upsert only inserts when there is no record for the day at all; an
+    # existing (exhausted) record is left untouched.
+    first = {"free_count": FREE_DAILY, "premium_count": premium_count, "used_count": 1}
+    try:
+        result = await daily_communications_collection.update_one(
+            {"user_id": user_id, "date": day}, {"$setOnInsert": first}, upsert=True
+        )
+    except DuplicateKeyError:
+        result = None
+    if result is not None and result.upserted_id is not None:
+        return first
+
+    # A concurrent first request of the day may have created the record
+    # between the two calls; try the guarded update once more against it
+    return await daily_communications_collection.find_one_and_update(
+        guarded, update, projection=QUOTA_PROJECTION, return_document=ReturnDocument.AFTER
+    )
+
+
+async def reset_for_plan(user_id: str, premium_count: int, now: datetime = None):
+    """A newly activated plan restarts today's counter with its allowance.
+
+    A day without a record needs nothing: get_today() and consume() create it
+    with the plan's allowance.
+    """
+    now = now or datetime.now(timezone.utc)
+    await daily_communications_collection.update_one(
+        {"user_id": user_id, "date": day_key(now)},
+        {"$set": {"premium_count": premium_count, "free_count": FREE_DAILY, "used_count": 0}}
+    )
+
+
+async def refund(user_id: str, now: datetime = None):
+    """Give back a communication consumed for a call that never started"""
+    now = now or datetime.now(timezone.utc)
+    await daily_communications_collection.update_one(
+        {"user_id": user_id, "date": day_key(now), "used_count": {"$gt": 0}},
+        {"$inc": {"used_count": -1}}
+    )
+
+
+async def precreate(allowances: list, day: str) -> int:
+    """Create day's records for [(user_id, premium_count)]; existing ones are kept.
+
+    Each record is an upsert with $setOnInsert, so running twice (an overrun
+    scheduler lease) never duplicates a record, with or without the index.
+    """
+    if not allowances:
+        return 0
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "date": day},
+            {"$setOnInsert": {"free_count": FREE_DAILY, "premium_count": premium_count, "used_count": 0}},
+            upsert=True
+        )
+        for user_id, premium_count in allowances
+    ]
+    try:
+        result = await daily_communications_collection.bulk_write(ops, ordered=False)
+        return result.upserted_count
+    except BulkWriteError as e:
+        # A concurrent upsert of the same record loses on the unique index;
+        # the record exists either way. Anything else is an error.
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nUpserted", 0)
@@ -0,0 +1,66 @@
+"""Debounced chat read-state writes.
+
+Every message fetch and every pushed message used to rewrite
+`last_read_<user_id>` on the match document. Read marks are now kept in memory
+and flushed to Mongo in one bulk write every READ_STATE_FLUSH_INTERVAL seconds.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+READ_STATE_FLUSH_INTERVAL = float(os.environ.get("READ_STATE_FLUSH_INTERVAL", 5))
+
+
+class ReadStateWriter:
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._task = None
+
+    def mark_read(self, match_id: str, user_id: str, at: datetime = None):
+        self._pending[(match_id, user_id)] = at or datetime.now(timezone.utc)
+
+    def last_read(self, match_id: str, user_id: str, stored=None):
+        """Read mark that is not flushed yet, falling back to the stored one"""
+        return self._pending.get((match_id, user_id), stored)
+
+    async def flush(self, matches_collection):
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        ops = [
+            UpdateOne({"id": match_id}, {"$max": {f"last_read_{user_id}": at}})
+            for (match_id, user_id), at in pending.items()
+        ]
+        try:
+            await matches_collection.bulk_write(ops, ordered=False)
+        except Exception as e:
+            # Put the marks back unless a newer one arrived meanwhile
+            for key, at in pending.items():
+                self._pending.setdefault(key, at)
+            logger.error(f"Read state flush failed: {e}")
+            return 0
+        return len(ops)
+
+    async def _run(self, matches_collection):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(matches_collection)
+
+    def start(self, matches_collection):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(matches_collection))
+
+    async def stop(self, matches_collection):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush(matches_collection)
+
+
+read_state = ReadStateWriter(READ_STATE_FLUSH_INTERVAL)
@@ -0,0 +1,78 @@
+"""Periodic maintenance jobs run by services/scheduler.py.
+
+- expire_subscriptions: clears active_subscription of users whose plan has
+  expired, in batches served by the subscription_expiry index, every
+  SUBSCRIPTION_EXPIRY_INTERVAL seconds
+- precreate_daily_quota: QUOTA_PRECREATE_LEAD seconds before midnight UTC,
+  creates tomorrow's daily_communications records of users who logged in
+  during the last QUOTA_PRECREATE_ACTIVE_DAYS days
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from auth import user_context_cache
+from database import users_collection
+from services import quota
+from services.admin_stats import admin_stats
+from services.plan_catalog import plan_catalog
+from services.scheduler import every, daily_before_midnight
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_EXPIRY_INTERVAL = float(os.environ.get("SUBSCRIPTION_EXPIRY_INTERVAL", 300))
+SUBSCRIPTION_EXPIRY_BATCH = int(os.environ.get("SUBSCRIPTION_EXPIRY_BATCH", 500))
+QUOTA_PRECREATE_LEAD = float(os.environ.get("QUOTA_PRECREATE_LEAD", 900))
+QUOTA_PRECREATE_ACTIVE_DAYS = int(os.environ.get("QUOTA_PRECREATE_ACTIVE_DAYS", 7))
+QUOTA_PRECREATE_BATCH = 1000
+
+
+async def expire_subscriptions():
+    now = datetime.now(timezone.utc)
+    expired_query = {"active_subscription": {"$type": "string"}, "subscription_expires_at": {"$lte": now}}
+    expired = 0
+    while True:
+        users = await users_collection.find(expired_query, {"_id": 0, "id": 1}).limit(
+            SUBSCRIPTION_EXPIRY_BATCH
+        ).to_list(SUBSCRIPTION_EXPIRY_BATCH)
+        if not users:
+            break
+        user_ids = [user["id"] for user in users]
+        await users_collection.update_many(
+            {"id": {"$in": user_ids}, **expired_query},
+            {"$set": {"active_subscription": None}}
+        )
+        for user_id in user_ids:
+            user_context_cache.invalidate(user_id)
+            admin_stats.subscription_ended(user_id)
+        expired += len(user_ids)
+    if expired:
+        logger.info(f"Expired {expired} subscriptions")
+
+
+async def precreate_daily_quota():
+    now = datetime.now(timezone.utc)
+    midnight = quota.next_reset(now)
+    day = quota.day_key(midnight)
+    cursor = users_collection.find(
+        {"last_login": {"$gte": now - timedelta(days=QUOTA_PRECREATE_ACTIVE_DAYS)}, "blocked": {"$ne": True}},
+        {"_id": 0, "id": 1, "active_subscription": 1, "subscription_expires_at": 1}
+    ).batch_size(QUOTA_PRECREATE_BATCH)
+
+    created = 0
+    batch = []
+    async for user in cursor:
+        plan = plan_catalog.get(user.get("active_subscription"))
+        expires_at = user.get("subscription_expires_at")
+        premium = plan.communications if plan and expires_at and expires_at > midnight else 0
+        batch.append((user["id"], premium))
+        if len(batch) == QUOTA_PRECREATE_BATCH:
+            created += await quota.precreate(batch, day)
+            batch = []
+    created += await quota.precreate(batch, day)
+    logger.info(f"Pre-created {created} daily communication records for {day}")
+
+
+def register(scheduler):
+    scheduler.add("expire_subscriptions", expire_subscriptions, every(SUBSCRIPTION_EXPIRY_INTERVAL))
+    scheduler.add("precreate_daily_quota", precreate_daily_quota, daily_before_midnight(QUOTA_PRECREATE_LEAD))
@@ -0,0 +1,133 @@
+"""In-process job scheduler with a Mongo lease.
+
+Every worker runs the same Scheduler, but each job is executed by only one of
+them at a time. A job's state lives in one scheduler_jobs document:
+
+    {_id: name, next_run_at, lease_until, owner, last_run_at, last_error}
+
+A worker runs a job after claiming it with a single find_one_and_update that
+matches only when the job is due and nobody holds the lease. The lease lasts
+SCHEDULER_LEASE_SECONDS, so a job whose worker died is picked up again after
+that. When the job finishes, its owner releases the lease and stores the next
+run time. Jobs must be idempotent; a job that overruns its lease may run twice.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import scheduler_jobs_collection
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_POLL_INTERVAL = float(os.environ.get("SCHEDULER_POLL_INTERVAL", 15))
+SCHEDULER_LEASE_SECONDS = float(os.environ.get("SCHEDULER_LEASE_SECONDS", 300))
+
+
+def every(seconds: float):
+    """Schedule: run again `seconds` after the previous run"""
+    def next_run(now: datetime) -> datetime:
+        return now + timedelta(seconds=seconds)
+    return next_run
+
+
+def daily_before_midnight(seconds: float):
+    """Schedule: run once a day, `seconds` before midnight UTC"""
+    def next_run(now: datetime) -> datetime:
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()).replace(tzinfo=timezone.utc)
+        at = midnight - timedelta(seconds=seconds)
+        return at if at > now else at + timedelta(days=1)
+    return next_run
+
+
+class Job:
+    __slots__ = ("name", "func", "next_run")
+
+    def __init__(self, name: str, func, next_run):
+        self.name = name
+        self.func = func
+        self.next_run = next_run
+
+
+class Scheduler:
+    def __init__(self, poll_interval: float, lease_seconds: float):
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self._jobs = {}
+        self._task = None
+
+    def add(self, name: str, func, next_run):
+        """Register an async func() run on the next_run(now) schedule"""
+        self._jobs[name] = Job(name, func, next_run)
+
+    async def _ensure(self, job: Job, now: datetime):
+        try:
+            await scheduler_jobs_collection.update_one(
+                {"_id": job.name},
+                {"$setOnInsert": {"next_run_at": job.next_run(now), "lease_until": now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass
+
+    async def _claim(self, job: Job, now: datetime) -> bool:
+        claimed = await scheduler_jobs_collection.find_one_and_update(
+            {"_id": job.name, "next_run_at": {"$lte": now}, "lease_until": {"$lte": now}},
+            {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=self.lease_seconds)}},
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return claimed is not None
+
+    async def run_job(self, job: Job):
+        started = datetime.now(timezone.utc)
+        error = None
+        try:
+            await job.func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+        finished = datetime.now(timezone.utc)
+        await scheduler_jobs_collection.update_one(
+            {"_id": job.name, "owner": self.owner},
+            {"$set": {
+                "next_run_at": job.next_run(finished),
+                "lease_until": finished,
+                "last_run_at": started,
+                "last_duration": (finished - started).total_seconds(),
+                "last_error": error,
+            }}
+        )
+
+    async def _run(self):
+        now = datetime.now(timezone.utc)
+        for job in self._jobs.values():
+            await self._ensure(job, now)
+        while True:
+            now = datetime.now(timezone.utc)
+            for job in self._jobs.values():
+                try:
+                    if await self._claim(job, now):
+                        await self.run_job(job)
+                except Exception as e:
+                    logger.error(f"Scheduler could not run {job.name}: {e}")
+            # Jitter keeps the workers from polling in lockstep
+            await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+scheduler = Scheduler(SCHEDULER_POLL_INTERVAL, SCHEDULER_LEASE_SECONDS)
@@ -0,0 +1,158 @@
+"""Per-user "recently seen" filter.
+
+Remembers, for every user, who they had a video session or a match with during
+the last SEEN_WINDOW_DAYS, so find-match and the lobby stop offering the same
+people again.
+
+Each user gets two small Bloom filters of SEEN_FILTER_BITS bits: one for the
+current half of the window and one for the previous half. When a new half
+starts the older filter is dropped, so entries are remembered for between half
+the window and the whole window, and memory per user is fixed
+(2 * SEEN_FILTER_BITS / 8 bytes). False positives only mean that a candidate
+is skipped.
+
+Membership tests are vectorized: candidate_index keeps id_hash() of every user
+in a column, and matcher() returns a function that tests a whole array of
+hashes at once.
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEEN_WINDOW_DAYS = float(os.environ.get("SEEN_WINDOW_DAYS", 7))
+SEEN_FILTER_BITS = int(os.environ.get("SEEN_FILTER_BITS", 4096))
+SEEN_FILTER_HASHES = 4
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def id_hash(user_id: str) -> int:
+    """Stable 64-bit hash of a user id (Python's hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(user_id.encode(), digest_size=8).digest(), "little")
+
+
+def _positions(hashes: np.ndarray, bits: int) -> np.ndarray:
+    """Bit positions of each hash, shape (SEEN_FILTER_HASHES, len(hashes))"""
+    hashes = hashes.astype(np.uint64)
+    h1 = hashes & _MASK32
+    h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+    rounds = np.arange(SEEN_FILTER_HASHES, dtype=np.uint64)[:, None]
+    return (h1 + rounds * h2) % np.uint64(bits)
+
+
+class _Window:
+    __slots__ = ("generation", "current", "previous")
+
+    def __init__(self, generation: int, nbytes: int):
+        self.generation = generation
+        self.current = np.zeros(nbytes, dtype=np.uint8)
+        self.previous = None
+
+
+class SeenFilter:
+    def __init__(self, window_days: float, bits: int):
+        self.half_window = window_days * 86400 / 2
+        self.bits = bits
+        self._windows = {}
+        self._records = 0
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _generation(self, at: datetime = None) -> int:
+        at = at or datetime.now(timezone.utc)
+        return int(at.timestamp() // self.half_window)
+
+    def _window(self, user_id: str, generation: int, create: bool):
+        """The user's filters rotated to generation, or None"""
+        window = self._windows.get(user_id)
+        if window is not None and window.generation < generation:
+            if window.generation == generation - 1:
+                window.previous = window.current
+                window.current = np.zeros(self.bits // 8, dtype=np.uint8)
+            else:
+                window.previous = None
+                window.current[:] = 0
+            window.generation = generation
+            if not create and window.previous is None:
+                del self._windows[user_id]
+                return None
+        if window is None and create:
+            window = self._windows[user_id] = _Window(generation, self.bits // 8)
+        return window
+
+    def _add(self, user_id: str, other_id: str, generation: int):
+        now_generation = self._generation()
+        if generation < now_generation - 1:
+            return
+        window = self._window(user_id, now_generation, create=True)
+        if generation == now_generation:
+            target = window.current
+        else:
+            if window.previous is None:
+                window.previous = np.zeros(self.bits // 8, dtype=np.uint8)
+            target = window.previous
+        positions = _positions(np.array([id_hash(other_id)], dtype=np.uint64), self.bits).ravel()
+        np.bitwise_or.at(target, (positions >> np.uint64(3)).astype(np.intp),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+
+    def record(self, user1_id: str, user2_id: str, at: datetime = None):
+        """Both users have now seen each other"""
+        generation = self._generation(at)
+        self._add(user1_id, user2_id, generation)
+        self._add(user2_id, user1_id, generation)
+        self._records += 1
+        if self._records % 10000 == 0:
+            self.prune()
+
+    def matcher(self, user_id: str):
+        """Function testing an array of id_hash() values, or None if the user saw nobody"""
+        window = self._window(user_id, self._generation(), create=False)
+        if window is None:
+            return None
+        filters = [window.current] if window.previous is None else [window.current, window.previous]
+        bits = self.bits
+
+        def seen(hashes: np.ndarray) -> np.ndarray:
+            positions = _positions(hashes, bits)
+            byte_index = (positions >> np.uint64(3)).astype(np.intp)
+            bit = (positions & np.uint64(7)).astype(np.uint8)
+            result = np.zeros(len(hashes), dtype=bool)
+            for bloom in filters:
+                result |= ((bloom[byte_index] >> bit) & 1).astype(bool).all(axis=0)
+            return result
+
+        return seen
+
+    def seen(self, user_id: str, other_id: str) -> bool:
+        seen = self.matcher(user_id)
+        return bool(seen(np.array([id_hash(other_id)], dtype=np.uint64))[0]) if seen else False
+
+    def prune(self):
+        """Drop users whose whole window has passed"""
+        generation = self._generation()
+        stale = [uid for uid, window in self._windows.items() if window.generation < generation - 1]
+        for user_id in stale:
+            del self._windows[user_id]
+
+    async def load(self, video_sessions_collection, matches_collection):
+        """Rebuild from the sessions and matches of the current window"""
+        self._windows = {}
+        since = datetime.now(timezone.utc) - timedelta(seconds=2 * self.half_window)
+        async for session in video_sessions_collection.find(
+            {"started_at": {"$gte": since}}, {"_id": 0, "user1_id": 1, "user2_id": 1, "started_at": 1}
+        ):
+            self.record(session["user1_id"], session["user2_id"], session["started_at"])
+        async for match in matches_collection.find(
+            {"matched_at": {"$gte": since}}, {"_id": 0, "user1_id": 1, "user2_id": 1, "matched_at": 1}
+        ):
+            self.record(match["user1_id"], match["user2_id"], match["matched_at"])
+        logger.info(f"Seen filter loaded for {len(self)} users")
+
+
+seen_filter = SeenFilter(SEEN_WINDOW_DAYS, SEEN_FILTER_BITS)
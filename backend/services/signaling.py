@@ -0,0 +1,244 @@
+"""Registry of Socket.IO connections used for WebRTC signaling.
+
+Connections are indexed by sid, by room and by user_id so that joining a room,
+finding the peer and cleaning up on disconnect are O(1) instead of a scan over
+every connected client.
+
+Two interchangeable backends share the same async interface:
+
+- SignalingRegistry keeps the indexes in this process. It is the default and
+  is enough for a single uvicorn worker.
+- RedisSignalingRegistry keeps them in Redis, so peers connected to different
+  workers or pods find each other. Joins and disconnects run as Lua scripts,
+  which makes pairing atomic across processes. Events between workers travel
+  through the python-socketio client manager configured in realtime.py.
+
+The Redis backend is selected with SIGNALING_STATE_URL (which defaults to a
+redis:// SOCKETIO_MESSAGE_QUEUE). It accepts any redis.asyncio compatible
+client, so a local redis-server or fakeredis.aioredis.FakeRedis can stand in
+for the shared broker.
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SIGNALING_STATE_URL = os.environ.get("SIGNALING_STATE_URL") or (
+    os.environ.get("SOCKETIO_MESSAGE_QUEUE", "")
+    if os.environ.get("SOCKETIO_MESSAGE_QUEUE", "").startswith(("redis://", "rediss://"))
+    else ""
+)
+# Entries of a worker that died without cleaning up expire after this long
+SIGNALING_STATE_TTL = int(os.environ.get("SIGNALING_STATE_TTL", 6 * 3600))
+
+
+class Connection:
+    __slots__ = ("sid", "user_id", "room_id", "peer_sid")
+
+    def __init__(self, sid: str):
+        self.sid = sid
+        self.user_id = None
+        self.room_id = None
+        self.peer_sid = None
+
+
+class SignalingRegistry:
+    """In-process registry; only sees the sockets of this worker"""
+
+    def __init__(self):
+        self._by_sid = {}
+        # room_id -> {sid: None}; a dict keeps join order for peer pairing
+        self._rooms = {}
+        self._by_user = {}
+
+    def __len__(self):
+        return len(self._by_sid)
+
+    async def connect(self, sid: str):
+        if sid not in self._by_sid:
+            self._by_sid[sid] = Connection(sid)
+
+    async def join(self, sid: str, room_id: str, user_id: str):
+        """Put sid in a room and pair it with the first peer already there.
+
+        Returns (previous room of sid or None, sids already in the room).
+        """
+        conn = self._by_sid.get(sid)
+        if conn is None:
+            conn = self._by_sid[sid] = Connection(sid)
+        previous_room = conn.room_id
+        self._leave_room(conn)
+        self._set_user(conn, user_id)
+
+        room = self._rooms.setdefault(room_id, {})
+        others = list(room)
+        room[sid] = None
+        conn.room_id = room_id
+
+        if others:
+            peer = self._by_sid[others[0]]
+            conn.peer_sid = peer.sid
+            peer.peer_sid = sid
+        return previous_room, others
+
+    async def peer_of(self, sid: str):
+        conn = self._by_sid.get(sid)
+        return conn.peer_sid if conn else None
+
+    async def room_sids(self, room_id: str) -> list:
+        return list(self._rooms.get(room_id, ()))
+
+    async def user_sids(self, user_id: str) -> list:
+        return list(self._by_user.get(user_id, ()))
+
+    async def disconnect(self, sid: str):
+        """Drop a connection from every index; returns its peer's sid if still connected"""
+        conn = self._by_sid.pop(sid, None)
+        if conn is None:
+            return None
+        peer_sid = conn.peer_sid
+        self._leave_room(conn)
+        self._set_user(conn, None)
+        return peer_sid if peer_sid in self._by_sid else None
+
+    def _leave_room(self, conn: Connection):
+        if conn.room_id is not None:
+            room = self._rooms.get(conn.room_id)
+            if room is not None:
+                room.pop(conn.sid, None)
+                if not room:
+                    del self._rooms[conn.room_id]
+            conn.room_id = None
+        if conn.peer_sid is not None:
+            peer = self._by_sid.get(conn.peer_sid)
+            if peer is not None and peer.peer_sid == conn.sid:
+                peer.peer_sid = None
+            conn.peer_sid = None
+
+    def _set_user(self, conn: Connection, user_id):
+        if conn.user_id is not None:
+            sids = self._by_user.get(conn.user_id)
+            if sids is not None:
+                sids.discard(conn.sid)
+                if not sids:
+                    del self._by_user[conn.user_id]
+        conn.user_id = user_id
+        if user_id is not None:
+            self._by_user.setdefault(user_id, set()).add(conn.sid)
+
+
+# Keys: <prefix>conn:<sid> (hash: room_id, user_id, peer_sid),
+# <prefix>room:<room_id> (zset of sids by join order), <prefix>user:<user_id> (set).
+# The scripts build key names themselves, so they need a single Redis node
+# (not Redis Cluster).
+_LEAVE_LUA = """
+local function leave(p, sid, keep_user)
+    local ck = p .. 'conn:' .. sid
+    local room = redis.call('HGET', ck, 'room_id')
+    local user = redis.call('HGET', ck, 'user_id')
+    local peer = redis.call('HGET', ck, 'peer_sid')
+    if room then
+        local rk = p .. 'room:' .. room
+        redis.call('ZREM', rk, sid)
+        if redis.call('ZCARD', rk) == 0 then redis.call('DEL', rk) end
+    end
+    if user and user ~= keep_user then
+        local uk = p .. 'user:' .. user
+        redis.call('SREM', uk, sid)
+        if redis.call('SCARD', uk) == 0 then redis.call('DEL', uk) end
+    end
+    if peer then
+        local pk = p .. 'conn:' .. peer
+        if redis.call('HGET', pk, 'peer_sid') == sid then redis.call('HDEL', pk, 'peer_sid') end
+        if redis.call('EXISTS', pk) == 0 then peer = false end
+    end
+    redis.call('HDEL', ck, 'room_id', 'peer_sid')
+    return {room, peer}
+end
+"""
+
+_JOIN_LUA = _LEAVE_LUA + """
+local p, sid, room, user, ttl = ARGV[1], ARGV[2], ARGV[3], ARGV[4], tonumber(ARGV[5])
+local ck = p .. 'conn:' .. sid
+local previous = leave(p, sid, user)
+local rk = p .. 'room:' .. room
+local others = redis.call('ZRANGE', rk, 0, -1)
+redis.call('ZADD', rk, redis.call('INCR', p .. 'seq'), sid)
+redis.call('EXPIRE', rk, ttl)
+redis.call('HSET', ck, 'room_id', room)
+if user ~= '' then
+    local uk = p .. 'user:' .. user
+    redis.call('HSET', ck, 'user_id', user)
+    redis.call('SADD', uk, sid)
+    redis.call('EXPIRE', uk, ttl)
+else
+    redis.call('HDEL', ck, 'user_id')
+end
+if #others > 0 then
+    redis.call('HSET', ck, 'peer_sid', others[1])
+    redis.call('HSET', p .. 'conn:' .. others[1], 'peer_sid', sid)
+end
+redis.call('EXPIRE', ck, ttl)
+return {previous[1], others}
+"""
+
+_DISCONNECT_LUA = _LEAVE_LUA + """
+local p, sid = ARGV[1], ARGV[2]
+local previous = leave(p, sid, false)
+redis.call('DEL', p .. 'conn:' .. sid)
+return previous[2]
+"""
+
+
+class RedisSignalingRegistry:
+    """Registry shared by every worker through Redis"""
+
+    def __init__(self, redis, prefix: str = "signaling:", ttl: int = SIGNALING_STATE_TTL):
+        # The client must be created with decode_responses=True
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+        self._join = redis.register_script(_JOIN_LUA)
+        self._disconnect = redis.register_script(_DISCONNECT_LUA)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis.asyncio
+
+        return cls(redis.asyncio.from_url(url, decode_responses=True), **kwargs)
+
+    async def connect(self, sid: str):
+        # Nothing is stored until the socket joins a room
+        pass
+
+    async def join(self, sid: str, room_id: str, user_id: str):
+        previous_room, others = await self._join(
+            args=[self.prefix, sid, room_id, user_id or "", self.ttl]
+        )
+        return previous_room, list(others)
+
+    async def peer_of(self, sid: str):
+        return await self.redis.hget(f"{self.prefix}conn:{sid}", "peer_sid")
+
+    async def room_sids(self, room_id: str) -> list:
+        return await self.redis.zrange(f"{self.prefix}room:{room_id}", 0, -1)
+
+    async def user_sids(self, user_id: str) -> list:
+        return list(await self.redis.smembers(f"{self.prefix}user:{user_id}"))
+
+    async def disconnect(self, sid: str):
+        return await self._disconnect(args=[self.prefix, sid])
+
+
+def _create_registry():
+    if SIGNALING_STATE_URL:
+        return RedisSignalingRegistry.from_url(SIGNALING_STATE_URL)
+    if os.environ.get("SOCKETIO_MESSAGE_QUEUE"):
+        logger.warning(
+            "SOCKETIO_MESSAGE_QUEUE is set but SIGNALING_STATE_URL is not: "
+            "peers connected to different workers will not be paired"
+        )
+    return SignalingRegistry()
+
+
+signaling_registry = _create_registry()
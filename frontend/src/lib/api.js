@@ -3,6 +3,13 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 export const API = `${BACKEND_URL}/api`;
 
+// Photos are stored as content-hashed keys; old profiles may still hold data: URLs
+export const photoUrl = (photo, size = 'full') => {
+  if (!photo || photo.startsWith('data:')) return photo;
+  const url = `${API}/photos/${photo}`;
+  return size === 'full' ? url : `${url}?size=${size}`;
+};
+
 const api = axios.create({
   baseURL: API,
 });
@@ -35,12 +35,19 @@ const AdminDashboard = () => {
   const [sortField, setSortField] = useState('created_at');
   const [sortDirection, setSortDirection] = useState('desc');
   
+  // Server-side user list: filters and the cursor of the next page
+  const [userFilters, setUserFilters] = useState({ blocked: '', subscription: '', role: '' });
+  const [usersCursor, setUsersCursor] = useState(null);
+  const [loadingUsers, setLoadingUsers] = useState(false);
+  
   // Modal states
   const [showDeleteModal, setShowDeleteModal] = useState(false);
   const [showActivateModal, setShowActivateModal] = useState(false);
   const [showHistoryModal, setShowHistoryModal] = useState(false);
   const [userToDelete, setUserToDelete] = useState(null);
   const [searchQuery, setSearchQuery] = useState('');
+  // Search box value sent to the server, once typing pauses
+  const [userSearch, setUserSearch] = useState('');
   const [selectedUserForSub, setSelectedUserForSub] = useState(null);
   const [selectedPlan, setSelectedPlan] = useState('Серебро');
   const [subscriptionHistory, setSubscriptionHistory] = useState([]);
@@ -101,7 +108,7 @@ const AdminDashboard = () => {
       
       // Load other data in background without blocking
       Promise.all([
-        api.get('/admin/users').then(res => setUsers(res.data)).catch(() => setUsers([])),
+        loadUsers(),
         api.get('/admin/complaints').then(res => setComplaints(res.data)).catch(() => setComplaints([])),
         api.get('/subscriptions/plans').then(res => setPlanSettings(res.data.map(p => ({ ...p, enabled: p.enabled !== false })))).catch(() => {}),
         api.get('/admin/subscription/active-users').then(res => setSubscriptionUsers(res.data)).catch(() => setSubscriptionUsers([])),
@@ -117,6 +124,41 @@ const AdminDashboard = () => {
     }
   };
 
+  const SERVER_SORT_FIELDS = ['created_at', 'last_login', 'complaint_count'];
+
+  // Pages of users come from the server sorted and filtered; other columns
+  // are sorted in the browser among the loaded users
+  const loadUsers = async (cursor = null) => {
+    setLoadingUsers(true);
+    try {
+      const params = {
+        sort: SERVER_SORT_FIELDS.includes(sortField) ? sortField : 'created_at',
+        order: SERVER_SORT_FIELDS.includes(sortField) ? sortDirection : 'desc',
+        ...Object.fromEntries(Object.entries(userFilters).filter(([, value]) => value !== ''))
+      };
+      if (userSearch) params.search = userSearch;
+      if (cursor) params.cursor = cursor;
+      const res = await api.get('/admin/users', { params });
+      setUsers(prev => (cursor ? [...prev, ...res.data] : res.data));
+      setUsersCursor(res.headers['x-next-cursor'] || null);
+    } catch (error) {
+      if (!cursor) setUsers([]);
+    } finally {
+      setLoadingUsers(false);
+    }
+  };
+
+  // Only a change of a server-side sort needs a new first page
+  const serverSort = SERVER_SORT_FIELDS.includes(sortField) ? `${sortField}:${sortDirection}` : '';
+  useEffect(() => {
+    if (!loading) loadUsers();
+  }, [userFilters, serverSort, userSearch]);
+
+  useEffect(() => {
+    const timer = setTimeout(() => setUserSearch(searchQuery.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
   const loadDocuments = async () => {
     try {
       const [reqRes, agrRes] = await Promise.all([
@@ -361,10 +403,8 @@ const AdminDashboard = () => {
     };
   };
 
-  const filteredUsers = users.filter(u => 
-    u.name?.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    u.email?.toLowerCase().includes(searchQuery.toLowerCase())
-  );
+  // Search and filters are applied by the server
+  const filteredUsers = users;
 
   const sortedUsers = sortUsers(filteredUsers);
   const totals = calculateTotals(sortedUsers);
@@ -435,6 +475,11 @@ const AdminDashboard = () => {
                 </div>
               );
             })}
+            {stats.updated_at && (
+              <p className="text-[#7A7A7A] text-xs md:col-span-2 lg:col-span-3" data-testid="stats-updated-at">
+                Обновлено: {new Date(stats.updated_at).toLocaleString('ru-RU')}
+              </p>
+            )}
           </div>
         )}
 
@@ -452,6 +497,38 @@ const AdminDashboard = () => {
                   className="pl-10"
                 />
               </div>
+              <div className="flex flex-wrap gap-2 mt-3 text-sm">
+                <select
+                  value={userFilters.blocked}
+                  onChange={(e) => setUserFilters(prev => ({ ...prev, blocked: e.target.value }))}
+                  className="border border-[#E5E5E5] rounded-lg px-2 py-1"
+                  data-testid="users-filter-blocked"
+                >
+                  <option value="">Все статусы</option>
+                  <option value="true">Заблокированы</option>
+                  <option value="false">Активные</option>
+                </select>
+                <select
+                  value={userFilters.subscription}
+                  onChange={(e) => setUserFilters(prev => ({ ...prev, subscription: e.target.value }))}
+                  className="border border-[#E5E5E5] rounded-lg px-2 py-1"
+                  data-testid="users-filter-subscription"
+                >
+                  <option value="">Все подписки</option>
+                  <option value="active">С подпиской</option>
+                  <option value="none">Без подписки</option>
+                </select>
+                <select
+                  value={userFilters.role}
+                  onChange={(e) => setUserFilters(prev => ({ ...prev, role: e.target.value }))}
+                  className="border border-[#E5E5E5] rounded-lg px-2 py-1"
+                  data-testid="users-filter-role"
+                >
+                  <option value="">Все роли</option>
+                  <option value="admin">Администраторы</option>
+                  <option value="user">Пользователи</option>
+                </select>
+              </div>
             </div>
             
             <div className="overflow-x-auto">
@@ -636,6 +713,19 @@ const AdminDashboard = () => {
                 </tfoot>
               </table>
             </div>
+            {usersCursor && (
+              <div className="p-4 flex justify-center border-t border-[#E5E5E5]">
+                <Button
+                  onClick={() => loadUsers(usersCursor)}
+                  disabled={loadingUsers}
+                  variant="outline"
+                  className="rounded-full"
+                  data-testid="users-load-more"
+                >
+                  {loadingUsers ? 'Загрузка...' : 'Загрузить ещё'}
+                </Button>
+              </div>
+            )}
           </div>
         )}
 
@@ -659,11 +749,17 @@ const AdminDashboard = () => {
                   </div>
                 </div>
                 <Button
-                  onClick={() => {
-                    const found = users.find(u => 
-                      u.email?.toLowerCase().includes(searchQuery.toLowerCase()) ||
-                      u.name?.toLowerCase().includes(searchQuery.toLowerCase())
-                    );
+                  onClick={async () => {
+                    const search = searchQuery.trim();
+                    let found = null;
+                    if (search) {
+                      try {
+                        const res = await api.get('/admin/users', { params: { search, limit: 1 } });
+                        found = res.data[0] || null;
+                      } catch (error) {
+                        found = null;
+                      }
+                    }
                     if (found) {
                       setSelectedUserForSub(found);
                       setShowActivateModal(true);
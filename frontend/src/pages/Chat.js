@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect, useLayoutEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import NavigationBar from '../components/NavigationBar';
@@ -7,7 +7,8 @@ import { Input } from '../components/ui/input';
 import { Send, ArrowLeft, Clock, HelpCircle } from 'lucide-react';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '../components/ui/dialog';
 import { toast } from 'sonner';
-import api from '../lib/api';
+import api, { photoUrl } from '../lib/api';
+import { getSocket } from '../lib/socket';
 
 const Chat = () => {
   const { matchId } = useParams();
@@ -24,14 +25,55 @@ const Chat = () => {
   const messagesContainerRef = useRef(null);
   const [userScrolled, setUserScrolled] = useState(false);
   const lastMessageCountRef = useRef(0);
+  const messagesRef = useRef([]);
+  const [hasOlder, setHasOlder] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+  const loadingOlderRef = useRef(false);
+  // Distance from the bottom to keep while older messages are prepended
+  const prependOffsetRef = useRef(null);
 
   useEffect(() => {
     loadChatData();
-    const interval = setInterval(loadMessages, 3000);
-    return () => clearInterval(interval);
+
+    // New messages are pushed over Socket.IO instead of polling
+    const socket = getSocket();
+    const joinChat = () => {
+      socket.emit('join_chat', { match_id: matchId, token: localStorage.getItem('token') });
+    };
+    const handleChatMessage = (message) => {
+      if (message.match_id !== matchId) return;
+      setMessages((prev) => (prev.some((m) => m.id === message.id) ? prev : [...prev, message]));
+      if (message.sender_id !== user?.id) {
+        socket.emit('chat_read', { match_id: matchId });
+      }
+    };
+    const handleReconnect = () => {
+      // Catch up on anything sent while the socket was down
+      joinChat();
+      loadMessages();
+    };
+
+    socket.on('chat_message', handleChatMessage);
+    socket.on('connect', handleReconnect);
+    if (socket.connected) joinChat();
+
+    return () => {
+      socket.emit('leave_chat', { match_id: matchId });
+      socket.off('chat_message', handleChatMessage);
+      socket.off('connect', handleReconnect);
+    };
   }, [matchId]);
 
+  useLayoutEffect(() => {
+    const container = messagesContainerRef.current;
+    if (prependOffsetRef.current !== null && container) {
+      container.scrollTop = container.scrollHeight - prependOffsetRef.current;
+      prependOffsetRef.current = null;
+    }
+  }, [messages]);
+
   useEffect(() => {
+    messagesRef.current = messages;
     if (messages.length > lastMessageCountRef.current && !userScrolled) {
       scrollToBottom();
     }
@@ -42,6 +84,9 @@ const Chat = () => {
     const container = e.target;
     const isAtBottom = container.scrollHeight - container.scrollTop - container.clientHeight < 50;
     setUserScrolled(!isAtBottom);
+    if (container.scrollTop < 100 && hasOlder) {
+      loadOlderMessages();
+    }
   };
 
   const scrollToBottom = () => {
@@ -59,6 +104,7 @@ const Chat = () => {
       
       setMatchInfo(infoResponse.data);
       setMessages(messagesResponse.data);
+      setHasOlder(messagesResponse.headers['x-has-more'] === 'true');
       lastMessageCountRef.current = messagesResponse.data.length;
       setTimeout(scrollToBottom, 100);
     } catch (error) {
@@ -69,15 +115,49 @@ const Chat = () => {
     }
   };
 
+  // Fetch only messages newer than the last one we have
   const loadMessages = async () => {
+    const last = messagesRef.current[messagesRef.current.length - 1];
+    const params = last ? { after: `${last.timestamp}_${last.id}` } : {};
     try {
-      const response = await api.get(`/chat/${matchId}/messages`);
-      setMessages(response.data);
+      const response = await api.get(`/chat/${matchId}/messages`, { params });
+      if (response.data.length === 0) return;
+      setMessages((prev) => {
+        const known = new Set(prev.map((m) => m.id));
+        return [...prev, ...response.data.filter((m) => !known.has(m.id))];
+      });
     } catch (error) {
       console.error('Error loading messages:', error);
     }
   };
 
+  // Fetch the page of history preceding the oldest message we have
+  const loadOlderMessages = async () => {
+    const oldest = messagesRef.current[0];
+    if (!oldest || loadingOlderRef.current) return;
+    loadingOlderRef.current = true;
+    setLoadingOlder(true);
+    try {
+      const response = await api.get(`/chat/${matchId}/messages`, {
+        params: { before: `${oldest.timestamp}_${oldest.id}` }
+      });
+      const container = messagesContainerRef.current;
+      if (container) {
+        prependOffsetRef.current = container.scrollHeight - container.scrollTop;
+      }
+      setHasOlder(response.headers['x-has-more'] === 'true');
+      setMessages((prev) => {
+        const known = new Set(prev.map((m) => m.id));
+        return [...response.data.filter((m) => !known.has(m.id)), ...prev];
+      });
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      loadingOlderRef.current = false;
+      setLoadingOlder(false);
+    }
+  };
+
   const handleSendMessage = async (e) => {
     e.preventDefault();
     if (!newMessage.trim() || sending) return;
@@ -89,7 +169,7 @@ const Chat = () => {
         text: newMessage
       });
       
-      setMessages([...messages, response.data]);
+      setMessages((prev) => (prev.some((m) => m.id === response.data.id) ? prev : [...prev, response.data]));
       setNewMessage('');
       setTimeout(scrollToBottom, 50);
     } catch (error) {
@@ -101,7 +181,7 @@ const Chat = () => {
 
   const getPartnerAvatar = () => {
     if (matchInfo?.partner?.photos?.length > 0) {
-      return matchInfo.partner.photos[0];
+      return photoUrl(matchInfo.partner.photos[0], 'thumb');
     }
     return null;
   };
@@ -195,6 +275,9 @@ const Chat = () => {
       >
         <div className="max-w-4xl mx-auto p-4 pb-2">
           <div className="space-y-3">
+            {loadingOlder && (
+              <div className="text-center py-2 text-xs text-[#7A7A7A]">Загрузка...</div>
+            )}
             {messages.length === 0 ? (
               <div className="text-center py-12 text-[#7A7A7A]">
                 <p>Начните переписку первым!</p>
@@ -382,7 +465,7 @@ const Chat = () => {
                   {partner.photos.map((photo, idx) => (
                     <img 
                       key={idx}
-                      src={photo}
+                      src={photoUrl(photo, 'thumb')}
                       alt=""
                       className="w-20 h-20 rounded-lg object-cover flex-shrink-0"
                     />
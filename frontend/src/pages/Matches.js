@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import NavigationBar from '../components/NavigationBar';
 import { MessageCircle, Clock } from 'lucide-react';
-import api from '../lib/api';
+import api, { photoUrl } from '../lib/api';
 
 const Matches = () => {
   const { user } = useAuth();
@@ -67,7 +67,7 @@ const Matches = () => {
             <div className="space-y-4">
               {matches.map((match) => {
                 const hasUnread = match.unread_count > 0;
-                const partnerPhoto = match.partner.photos?.[0];
+                const partnerPhoto = photoUrl(match.partner.photos?.[0], 'thumb');
                 
                 return (
                   <div
@@ -10,7 +10,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '.
 import { Textarea } from '../components/ui/textarea';
 import { Search } from 'lucide-react';
 import { toast } from 'sonner';
-import api from '../lib/api';
+import api, { photoUrl } from '../lib/api';
 import { RUSSIAN_CITIES } from '../data/russianCities';
 
 const Profile = () => {
@@ -184,7 +184,7 @@ const Profile = () => {
                 {user?.photos?.map((photo, index) => (
                   <div key={index} className="relative group">
                     <img
-                      src={photo}
+                      src={photoUrl(photo, 'medium')}
                       alt={`Photo ${index + 1}`}
                       className="w-full aspect-square object-cover rounded-xl border-2 border-[#1A73E8]/30 hover:border-[#1A73E8] transition-all"
                     />
@@ -10,6 +10,7 @@ import NoMatchModal from '../components/modals/NoMatchModal';
 import { Button } from '../components/ui/button';
 import { toast } from 'sonner';
 import api from '../lib/api';
+import { getSocket } from '../lib/socket';
 
 const VideoChat = () => {
   const { user } = useAuth();
@@ -50,32 +51,50 @@ const VideoChat = () => {
     };
   }, [session, timeLeft]);
 
-  const findMatch = async () => {
-    setSearching(true);
-    try {
-      const response = await api.post('/matching/find-match');
-      setMatchUser(response.data);
-      
-      // Start video session
-      const sessionResponse = await api.post('/matching/video-session', {
-        match_user_id: response.data.id
-      });
-      setSession(sessionResponse.data);
+  useEffect(() => {
+    // Lobby: the server pairs waiting users and pushes the ready session
+    const socket = getSocket();
+    const handleMatched = ({ session, partner }) => {
+      setSearching(false);
+      setMatchUser(partner);
+      setSession(session);
       setTimeLeft(60); // 1 минута для демонстрации
-      
       toast.success('Собеседник найден!');
-    } catch (error) {
-      if (error.response?.status === 404) {
-        setShowNoMatch(true);
-      } else if (error.response?.status === 403) {
+    };
+    const handleNoMatch = () => {
+      setSearching(false);
+      setShowNoMatch(true);
+    };
+    const handleLobbyError = ({ detail }) => {
+      setSearching(false);
+      if (detail?.startsWith('No communications remaining')) {
         toast.error('У вас закончились бесплатные общения на сегодня');
         navigate('/subscriptions');
       } else {
-        toast.error(error.response?.data?.detail || 'Ошибка поиска');
+        toast.error(detail || 'Ошибка поиска');
       }
-    } finally {
-      setSearching(false);
-    }
+    };
+
+    socket.on('lobby_matched', handleMatched);
+    socket.on('lobby_no_match', handleNoMatch);
+    socket.on('lobby_error', handleLobbyError);
+
+    return () => {
+      socket.emit('lobby_leave');
+      socket.off('lobby_matched', handleMatched);
+      socket.off('lobby_no_match', handleNoMatch);
+      socket.off('lobby_error', handleLobbyError);
+    };
+  }, [navigate]);
+
+  const findMatch = () => {
+    setSearching(true);
+    getSocket().emit('lobby_join', { token: localStorage.getItem('token') });
+  };
+
+  const cancelSearch = () => {
+    getSocket().emit('lobby_leave');
+    setSearching(false);
   };
 
   const createDemoMatch = async () => {
@@ -195,6 +214,16 @@ const VideoChat = () => {
               >
                 {searching ? 'Поиск...' : 'ЗНАКОМИТЬСЯ'}
               </Button>
+
+              {searching && (
+                <button
+                  onClick={cancelSearch}
+                  className="text-[#FF5757] font-medium hover:underline"
+                  data-testid="cancel-search-button"
+                >
+                  Отменить поиск
+                </button>
+              )}
               
               <Button
                 onClick={createDemoMatch}
@@ -0,0 +1,425 @@
+"""Load test for the Video Dating API.
+
+Simulates speed-dating traffic against a running backend (point it at a
+server with a local MongoDB, never at production):
+
+1. setup: registers --users synthetic users through /api/auth/register and
+   gives each a complete profile and filters (men and women in a few cities,
+   so find-match has candidates)
+2. load: for every --stages entry "concurrency:seconds", that many virtual
+   users run a weighted mix of scenarios until the stage ends:
+     find_match  find-match, video-session, both decisions, end session
+     chat        match list, message polling, occasionally sending a message
+     browse      /auth/me, /profile, plans, quota status
+     signaling   two Socket.IO clients join a room and exchange offer/answer
+3. report: p50/p95/p99 latency and status codes per endpoint, plus a
+   per-second throughput curve, printed and written as JSON (--output)
+
+--compare previous.json prints the p95 change per endpoint and exits 1 when
+any endpoint got slower than --max-regression (percent), so runs of two
+commits can be compared. Endpoints with fewer than --min-samples requests in
+either run are shown but never fail the comparison; their p95 is noise. Quota and no-candidate answers (403/404 from
+find-match and video-session) are counted per status, not as errors.
+
+Examples:
+    python load_test.py --base-url http://localhost:8001 --users 2000 \\
+        --stages 20:30,50:30,100:60 --output load-$(git rev-parse --short HEAD).json
+    python load_test.py --users 500 --mix find_match=1,chat=3,browse=2 --compare load-abc123.json
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+CITIES = ["Москва", "Санкт-Петербург", "Казань"]
+AGE_RANGES = ["18-25", "25-35", "35-45"]
+DEFAULT_MIX = "find_match=3,chat=4,browse=2,signaling=1"
+EXPECTED_STATUSES = {
+    "POST /matching/find-match": {200, 403, 404},
+    "POST /matching/video-session": {200, 403},
+}
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Thread-safe log of (seconds since start, endpoint, latency ms, status)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, latency_ms: float, status):
+        sample = (time.perf_counter() - self.started, endpoint, latency_ms, status)
+        with self._lock:
+            self._samples.append(sample)
+
+    def samples(self) -> list:
+        with self._lock:
+            return list(self._samples)
+
+    def summary(self) -> dict:
+        by_endpoint = defaultdict(list)
+        statuses = defaultdict(lambda: defaultdict(int))
+        for _, endpoint, latency, status in self.samples():
+            by_endpoint[endpoint].append(latency)
+            statuses[endpoint][str(status)] += 1
+        result = {}
+        for endpoint, latencies in sorted(by_endpoint.items()):
+            latencies.sort()
+            expected = EXPECTED_STATUSES.get(endpoint, {200})
+            errors = sum(n for status, n in statuses[endpoint].items()
+                         if not (status.isdigit() and int(status) in expected))
+            result[endpoint] = {
+                "count": len(latencies),
+                "errors": errors,
+                "statuses": dict(statuses[endpoint]),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "max_ms": round(latencies[-1], 2),
+            }
+        return result
+
+    def throughput(self, stages: list) -> list:
+        """Requests per second, with the stage concurrency active in that second"""
+        buckets = defaultdict(list)
+        for t, _, latency, _ in self.samples():
+            buckets[int(t)].append(latency)
+        boundaries, elapsed = [], 0
+        for concurrency, seconds in stages:
+            elapsed += seconds
+            boundaries.append((elapsed, concurrency))
+        curve = []
+        for second in range(max(buckets) + 1 if buckets else 0):
+            latencies = sorted(buckets.get(second, []))
+            concurrency = next((c for end, c in boundaries if second < end), boundaries[-1][1] if boundaries else 0)
+            curve.append({
+                "second": second,
+                "concurrency": concurrency,
+                "requests": len(latencies),
+                "p95_ms": round(percentile(latencies, 95), 2),
+            })
+        return curve
+
+
+class LoadTester:
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.api_url = f"{self.base_url}/api"
+        self.recorder = recorder
+        self.timeout = timeout
+        self.users = []
+        self.by_id = {}
+        self.matches = defaultdict(list)  # user id -> match ids
+        self._matches_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def call(self, method: str, path: str, name: str = None, token: str = None, **kwargs):
+        """One timed request; name groups paths with ids under one endpoint"""
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        endpoint = f"{method} {name or path}"
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f"{self.api_url}{path}", headers=headers, timeout=self.timeout, **kwargs
+            )
+            status = response.status_code
+        except requests.RequestException as e:
+            response, status = None, type(e).__name__
+        self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, status)
+        return response
+
+    # ---------- setup ----------
+
+    def create_user(self, index: int, run_id: str):
+        gender = "male" if index % 2 else "female"
+        age = random.randint(20, 44)
+        city = CITIES[index % len(CITIES)]
+        email = f"load-{run_id}-{index}@loadtest.example.com"
+        payload = {"email": email, "name": f"Load {index}", "password": "loadtest123", "age_confirmed": True}
+
+        response = None
+        for _ in range(10):
+            response = self.call("POST", "/auth/register", json=payload)
+            if response is None or response.status_code != 429:
+                break
+            time.sleep(float(response.headers.get("Retry-After", 1)))
+        if response is None or response.status_code != 200:
+            return None
+        body = response.json()
+        token = body["access_token"]
+
+        self.call("PUT", "/profile", token=token, json={
+            "age": age, "height": random.randint(155, 195), "weight": random.randint(50, 95),
+            "gender": gender, "education": "higher", "smoking": "negative", "city": city,
+            "description": "Synthetic load-test user",
+        })
+        self.call("PUT", "/filters", token=token, json={
+            "age_range": random.choice(AGE_RANGES),
+            "gender_preference": "female" if gender == "male" else "male",
+            "city": city, "smoking_preference": "any",
+        })
+        return {"id": body["user"]["id"], "email": email, "token": token}
+
+    def setup(self, count: int, concurrency: int, run_id: str):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            users = list(pool.map(lambda i: self.create_user(i, run_id), range(count)))
+        self.users = [user for user in users if user]
+        self.by_id = {user["id"]: user for user in self.users}
+
+    # ---------- scenarios ----------
+
+    def scenario_find_match(self):
+        user = random.choice(self.users)
+        response = self.call("POST", "/matching/find-match", token=user["token"])
+        if response is None or response.status_code != 200:
+            return
+        partner_id = response.json()["id"]
+        partner = self.by_id.get(partner_id)
+        response = self.call("POST", "/matching/video-session", token=user["token"],
+                             params={"match_user_id": partner_id})
+        if response is None or response.status_code != 200 or partner is None:
+            return
+        session_id = response.json()["id"]
+        matched = None
+        for side in (user, partner):
+            response = self.call("POST", "/matching/decision", token=side["token"],
+                                 json={"session_id": session_id, "accepted": random.random() < 0.6})
+            if response is not None and response.status_code == 200:
+                matched = response.json()
+        self.call("PUT", f"/matching/video-session/{session_id}/end",
+                  name="/matching/video-session/{id}/end", token=user["token"])
+        if matched and matched.get("matched"):
+            with self._matches_lock:
+                self.matches[user["id"]].append(matched["match_id"])
+                self.matches[partner["id"]].append(matched["match_id"])
+
+    def scenario_chat(self):
+        with self._matches_lock:
+            chatting = list(self.matches)
+        if not chatting:
+            return self.scenario_browse()
+        user = self.by_id[random.choice(chatting)]
+        self.call("GET", "/chat/matches", token=user["token"])
+        match_id = random.choice(self.matches[user["id"]])
+        response = self.call("GET", f"/chat/{match_id}/messages", name="/chat/{id}/messages",
+                             token=user["token"], params={"limit": 50})
+        if random.random() < 0.3:
+            self.call("POST", f"/chat/{match_id}/message", name="/chat/{id}/message",
+                      token=user["token"], json={"text": f"Привет! {uuid.uuid4().hex[:8]}"})
+        if response is not None and response.status_code == 200 and response.json():
+            last = response.json()[-1]
+            self.call("GET", f"/chat/{match_id}/messages", name="/chat/{id}/messages?after",
+                      token=user["token"], params={"after": f"{last['timestamp']}_{last['id']}"})
+
+    def scenario_browse(self):
+        user = random.choice(self.users)
+        self.call("GET", "/auth/me", token=user["token"])
+        self.call("GET", "/profile", token=user["token"])
+        self.call("GET", "/subscriptions/plans")
+        self.call("GET", "/subscriptions/my-status", token=user["token"])
+
+    def scenario_signaling(self):
+        import socketio
+
+        room_id = f"load_{uuid.uuid4().hex}"
+        received = {"peer_joined": threading.Event(), "answer": threading.Event()}
+        caller, callee = socketio.Client(reconnection=False), socketio.Client(reconnection=False)
+        caller.on("peer_joined", lambda data: received["peer_joined"].set())
+        caller.on("answer", lambda data: received["answer"].set())
+        callee.on("offer", lambda data: callee.emit("answer", {"answer": "sdp"}))
+
+        def timed(endpoint: str, action, event=None):
+            started = time.perf_counter()
+            try:
+                action()
+                ok = event.wait(self.timeout) if event else True
+                status = "ok" if ok else "timeout"
+            except Exception as e:
+                status = type(e).__name__
+            self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, status)
+            return status == "ok"
+
+        try:
+            if not (timed("WS connect", lambda: caller.connect(self.base_url, wait_timeout=self.timeout))
+                    and timed("WS connect", lambda: callee.connect(self.base_url, wait_timeout=self.timeout))):
+                return
+            caller.emit("join_room", {"room_id": room_id, "user_id": "caller"})
+            time.sleep(0.05)
+            if not timed("WS join_room -> peer_joined",
+                         lambda: callee.emit("join_room", {"room_id": room_id, "user_id": "callee"}),
+                         received["peer_joined"]):
+                return
+            timed("WS offer -> answer", lambda: caller.emit("offer", {"offer": "sdp"}), received["answer"])
+        finally:
+            for client in (caller, callee):
+                if client.connected:
+                    client.disconnect()
+
+    # ---------- driver ----------
+
+    def run_stage(self, concurrency: int, seconds: float, mix: dict):
+        scenarios = [getattr(self, f"scenario_{name}") for name in mix]
+        weights = list(mix.values())
+        deadline = time.perf_counter() + seconds
+
+        def virtual_user():
+            while time.perf_counter() < deadline:
+                scenario = random.choices(scenarios, weights)[0]
+                try:
+                    scenario()
+                except Exception as e:
+                    self.recorder.add(f"scenario {scenario.__name__}", 0, type(e).__name__)
+
+        threads = [threading.Thread(target=virtual_user, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def parse_stages(value: str) -> list:
+    stages = []
+    for part in value.split(","):
+        concurrency, seconds = part.split(":")
+        stages.append((int(concurrency), float(seconds)))
+    return stages
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if not hasattr(LoadTester, f"scenario_{name}"):
+            raise SystemExit(f"Unknown scenario: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(title: str, summary: dict):
+    print(f"\n📊 {title}")
+    print(f"{'endpoint':<42} {'count':>7} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, stats in summary.items():
+        print(f"{endpoint:<42} {stats['count']:>7} {stats['errors']:>5} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+
+
+def compare(report: dict, baseline_path: str, max_regression: float, min_samples: int) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n🔍 p95 against {baseline_path} (commit {(baseline.get('commit') or '?')[:10]})")
+    regressed = False
+    for endpoint, stats in report["load"].items():
+        before = baseline.get("load", {}).get(endpoint)
+        if not before or not before["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        samples = min(stats["count"], before["count"])
+        if samples < min_samples:
+            print(f"   {endpoint:<42} {before['p95_ms']:>8.1f} -> {stats['p95_ms']:>8.1f} ms "
+                  f"({change:+.0f}%, only {samples} samples, not gated)")
+            continue
+        flag = "❌" if change > max_regression else "  "
+        regressed |= change > max_regression
+        print(f"{flag} {endpoint:<42} {before['p95_ms']:>8.1f} -> {stats['p95_ms']:>8.1f} ms ({change:+.0f}%)")
+    return not regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--users", type=int, default=1000, help="synthetic users to register")
+    parser.add_argument("--setup-concurrency", type=int, default=16)
+    parser.add_argument("--stages", default="10:30,50:30,100:30", help="concurrency:seconds,...")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="previous JSON report to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=20, help="allowed p95 increase, percent")
+    parser.add_argument("--min-samples", type=int, default=20,
+                        help="endpoints with fewer requests in either run are not compared")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    stages, mix = parse_stages(args.stages), parse_mix(args.mix)
+    run_id = uuid.uuid4().hex[:8]
+    started_at = datetime.now(timezone.utc)
+    print(f"🚀 Load test {run_id} against {args.base_url}")
+
+    setup_recorder = Recorder()
+    tester = LoadTester(args.base_url, setup_recorder, args.timeout)
+    tester.setup(args.users, args.setup_concurrency, run_id)
+    setup_seconds = time.perf_counter() - setup_recorder.started
+    print(f"   {len(tester.users)}/{args.users} users ready in {setup_seconds:.1f}s")
+    if not tester.users:
+        print("❌ No users could be created")
+        return 1
+
+    load_recorder = Recorder()
+    tester.recorder = load_recorder
+    for concurrency, seconds in stages:
+        print(f"   stage: {concurrency} virtual users for {seconds:.0f}s")
+        tester.run_stage(concurrency, seconds, mix)
+
+    report = {
+        "run_id": run_id,
+        "commit": git_commit(),
+        "started_at": started_at.isoformat(),
+        "config": {
+            "base_url": args.base_url, "users": args.users, "users_created": len(tester.users),
+            "stages": stages, "mix": mix, "seed": args.seed,
+        },
+        "setup": setup_recorder.summary(),
+        "setup_seconds": round(setup_seconds, 2),
+        "load": load_recorder.summary(),
+        "throughput": load_recorder.throughput(stages),
+    }
+    print_summary("Setup", report["setup"])
+    print_summary("Load", report["load"])
+    total = sum(stats["count"] for stats in report["load"].values())
+    load_seconds = sum(seconds for _, seconds in stages)
+    print(f"\n🎯 {total} requests in {load_seconds:.0f}s ({total / load_seconds:.0f} req/s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"   report written to {args.output}")
+
+    if args.compare and not compare(report, args.compare, args.max_regression, args.min_samples):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
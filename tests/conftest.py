@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Backend modules import each other as top-level modules (run from backend/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+# database.py builds its Motor client at import; the client connects lazily and
+# the tests replace the collections they touch
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
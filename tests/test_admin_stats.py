@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from services import admin_stats as admin_stats_module
+from services.admin_stats import AdminStats
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self._docs:
+            yield doc
+
+
+class FakeCollection:
+    """Counts documents matching plain equality / $ne filters"""
+
+    def __init__(self, docs, during_count=None):
+        self.docs = docs
+        self.during_count = during_count
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, cond in query.items():
+            if isinstance(cond, dict) and "$ne" in cond:
+                if doc.get(key) == cond["$ne"]:
+                    return False
+            elif doc.get(key) != cond:
+                return False
+        return True
+
+    async def count_documents(self, query):
+        await asyncio.sleep(0)
+        if self.during_count is not None:
+            self.during_count()
+            self.during_count = None
+        return sum(self._matches(doc, query) for doc in self.docs)
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query, projection=None):
+        return FakeCursor([])
+
+
+def use_collections(monkeypatch, users, matches=()):
+    monkeypatch.setattr(admin_stats_module, "users_collection", users)
+    monkeypatch.setattr(admin_stats_module, "matches_collection", FakeCollection(list(matches)))
+    monkeypatch.setattr(admin_stats_module, "video_sessions_collection", FakeCollection([]))
+    monkeypatch.setattr(admin_stats_module, "complaints_collection", FakeCollection([]))
+
+
+def test_reconcile_skips_deleted_users(monkeypatch):
+    users = FakeCollection([
+        {"id": "a", "blocked": False},
+        {"id": "b", "blocked": True},
+        {"id": "c", "blocked": True, "deleted": True},
+    ])
+    use_collections(monkeypatch, users)
+    stats = AdminStats(300)
+
+    asyncio.run(stats.reconcile())
+
+    snapshot = stats.snapshot()
+    assert snapshot["total_users"] == 2
+    assert snapshot["blocked_users"] == 1
+
+
+def test_reconcile_keeps_changes_made_while_counting(monkeypatch):
+    stats = AdminStats(300)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=30)
+
+    def register_during_reconcile():
+        stats.incr("total_users")
+        stats.incr("total_matches")
+        stats.subscription_activated("b", expires_at)
+
+    users = FakeCollection([{"id": "a", "blocked": False}], during_count=register_during_reconcile)
+    use_collections(monkeypatch, users, matches=[{"active": True}])
+
+    asyncio.run(stats.reconcile())
+
+    snapshot = stats.snapshot()
+    # The counts do not include "b" or the second match, so the deltas stay
+    assert snapshot["total_users"] == 2
+    assert snapshot["total_matches"] == 2
+    assert snapshot["active_subscriptions"] == 1
+
+    stats.incr("total_users")
+    assert stats.snapshot()["total_users"] == 3
@@ -0,0 +1,82 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from routers import admin_router  # noqa: E402
+from routers.admin_router import decode_user_cursor, encode_user_cursor, get_all_users  # noqa: E402
+
+CREATED = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+def test_cursor_round_trips_every_sort_value():
+    for value in ("2030-01-01", 3, 0, None, CREATED, CREATED + timedelta(microseconds=5)):
+        assert decode_user_cursor(encode_user_cursor(value, "user-1")) == (value, "user-1")
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_user_cursor("?>?>", "id/+")
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", encode_user_cursor(1, "a")[:-3], "W10"])
+def test_bad_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_user_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def make_users():
+    users = []
+    # Ties on the sort key, missing values and explicit nulls
+    for i, complaints in enumerate([2, None, 0, 2, 5, None, 2, "missing", 0, 5, None]):
+        user = {
+            "id": f"user-{i:02d}", "email": f"user{i}@example.com", "name": f"User {i}",
+            "created_at": CREATED + timedelta(days=i % 3),
+        }
+        if complaints != "missing":
+            user["complaint_count"] = complaints
+        users.append(user)
+    return users
+
+
+def expected_order(users, sort, direction):
+    # MongoDB sorts null and missing values lowest
+    def key(user):
+        value = user.get(sort)
+        return (value is not None, value if value is not None else 0, user["id"])
+    return [user["id"] for user in sorted(users, key=key, reverse=direction == "desc")]
+
+
+async def list_pages(sort, order, limit):
+    pages = []
+    cursor = None
+    while True:
+        response = await get_all_users(
+            sort=sort, order=order, blocked=None, subscription=None, role=None, search=None,
+            cursor=cursor, limit=limit, admin_id="admin"
+        )
+        pages.append([user["id"] for user in json.loads(response.body)])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("sort", ["complaint_count", "created_at"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_every_user_once_in_order(monkeypatch, sort, order):
+    users = make_users()
+
+    async def main():
+        collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]["users"]
+        await collection.insert_many([dict(user) for user in users])
+        monkeypatch.setattr(admin_router, "users_collection", collection)
+
+        pages = await list_pages(sort, order, limit=3)
+        assert all(len(page) == 3 for page in pages[:-1])
+        assert [user_id for page in pages for user_id in page] == expected_order(users, sort, order)
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+from services.candidate_index import CandidateIndex
+
+
+def make_user(user_id, age, gender, city="Москва", smoking="negative"):
+    return {
+        "id": user_id, "age": age, "gender": gender, "city": city, "smoking": smoking,
+        "profile_completed": True, "blocked": False,
+    }
+
+
+def make_filters(age_range, gender, city="Москва", smoking="any"):
+    return {"age_range": age_range, "gender_preference": gender, "city": city, "smoking_preference": smoking}
+
+
+def build_index():
+    index = CandidateIndex()
+    # Wants men aged 25-35: accepts a 30 year old seeker, not a 20 year old
+    index.upsert(make_user("anna", 27, "female"))
+    index.set_filters("anna", make_filters("25-35", "male"))
+    # Wants men aged 18-25
+    index.upsert(make_user("olga", 24, "female"))
+    index.set_filters("olga", make_filters("18-25", "male"))
+    # Never set filters, accepts anyone
+    index.upsert(make_user("vera", 30, "female"))
+    return index
+
+
+SEEKER_FILTERS = make_filters("18-25", "female")
+
+
+def test_reverse_filters_apply_to_indexed_seeker():
+    index = build_index()
+    index.upsert(make_user("ivan", 20, "male"))
+    index.set_filters("ivan", make_filters("25-35", "female"))
+
+    profile = make_user("ivan", 20, "male")
+    ranked = index.rank("ivan", profile, make_filters("25-35", "female"), limit=10)
+    assert ranked == ["vera"]
+
+
+def test_reverse_filters_apply_to_seeker_missing_from_index():
+    index = build_index()
+    profile = make_user("petr", 20, "male")
+
+    # anna fits petr's filters, but petr (20) is outside hers
+    ranked = index.rank("petr", profile, make_filters("25-35", "female"), limit=10)
+    assert ranked == ["vera"]
+
+    ranked = index.rank("petr", profile, SEEKER_FILTERS, limit=10)
+    assert ranked == ["olga"]
+
+
+def test_seeker_with_unknown_attributes_only_gets_unfiltered_candidates():
+    index = build_index()
+    profile = make_user("lev", 30, "male", city="Тверь")
+
+    assert index.rank("lev", profile, make_filters("25-35", "female"), limit=10) == ["vera"]
+
+
+def test_seeker_is_never_offered_to_themselves():
+    index = build_index()
+    profile = make_user("vera", 30, "female")
+
+    assert "vera" not in index.rank("vera", profile, make_filters("25-35", "female"), limit=10)
@@ -0,0 +1,70 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from routers import export_router  # noqa: E402
+from routers.export_router import CURSOR_FIELD, decode_export_cursor, export_rows  # noqa: E402
+
+FIELDS = ["id", "reason"]
+
+
+async def make_collection(count):
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["complaints"]
+    await collection.insert_many([{"id": f"c{i}", "reason": f"reason {i}", "secret": "x"} for i in range(count)])
+    return collection
+
+
+async def export(collection, fmt, after=None):
+    return "".join([chunk async for chunk in export_rows(collection, FIELDS, after, fmt)])
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    doc_id = ObjectId()
+    assert decode_export_cursor(str(doc_id)) == doc_id
+    for cursor in ("", "123", "zz" * 12):
+        with pytest.raises(HTTPException) as error:
+            decode_export_cursor(cursor)
+        assert error.value.status_code == 400
+
+
+def test_ndjson_resumes_after_the_last_cursor(monkeypatch):
+    monkeypatch.setattr(export_router, "EXPORT_BATCH_SIZE", 2)
+
+    async def main():
+        collection = await make_collection(5)
+        rows = [json.loads(line) for line in (await export(collection, "ndjson")).splitlines()]
+        assert [row["id"] for row in rows] == ["c0", "c1", "c2", "c3", "c4"]
+        assert all(list(row) == [CURSOR_FIELD, *FIELDS] for row in rows)
+
+        # An interrupted download continues with the row after the last one received
+        after = decode_export_cursor(rows[2][CURSOR_FIELD])
+        resumed = [json.loads(line) for line in (await export(collection, "ndjson", after)).splitlines()]
+        assert resumed == rows[3:]
+
+        # Rows added since are picked up at the end
+        await collection.insert_one({"id": "c5", "reason": "late"})
+        resumed = [json.loads(line) for line in (await export(collection, "ndjson", after)).splitlines()]
+        assert [row["id"] for row in resumed] == ["c3", "c4", "c5"]
+    asyncio.run(main())
+
+
+def test_csv_header_only_on_the_first_part(monkeypatch):
+    monkeypatch.setattr(export_router, "EXPORT_BATCH_SIZE", 2)
+
+    async def main():
+        collection = await make_collection(4)
+        first = list(csv.reader(io.StringIO(await export(collection, "csv"))))
+        assert first[0] == [CURSOR_FIELD, *FIELDS]
+        assert [row[1] for row in first[1:]] == ["c0", "c1", "c2", "c3"]
+
+        after = decode_export_cursor(first[2][0])
+        resumed = list(csv.reader(io.StringIO(await export(collection, "csv", after))))
+        assert resumed == first[3:]
+    asyncio.run(main())
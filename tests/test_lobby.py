@@ -0,0 +1,61 @@
+from services.lobby import WaitingUser, pair_batch
+
+
+def waiting(user_id, age, gender, wants, age_range="25-35", city="Москва", filter_city="Москва"):
+    profile = {"id": user_id, "age": age, "gender": gender, "city": city, "smoking": "negative"}
+    filters = {"city": filter_city, "gender_preference": wants, "age_range": age_range, "smoking_preference": "any"}
+    return WaitingUser(f"sid-{user_id}", profile, filters)
+
+
+def ids(pairs):
+    return [(a.user_id, b.user_id) for a, b in pairs]
+
+
+def test_pairs_only_mutually_eligible_users():
+    ivan = waiting("ivan", 30, "male", "female")
+    # Wants men aged 18-25, so she does not accept ivan
+    olga = waiting("olga", 24, "female", "male", age_range="18-25")
+    anna = waiting("anna", 28, "female", "male")
+
+    assert ids(pair_batch([ivan, olga, anna])) == [("ivan", "anna")]
+
+
+def test_longest_waiting_user_is_paired_first():
+    ivan = waiting("ivan", 30, "male", "female")
+    petr = waiting("petr", 31, "male", "female")
+    anna = waiting("anna", 28, "female", "male")
+
+    assert ids(pair_batch([petr, ivan, anna])) == [("petr", "anna")]
+
+
+def test_users_in_other_cities_are_not_paired():
+    ivan = waiting("ivan", 30, "male", "female")
+    anna = waiting("anna", 28, "female", "male", city="Казань", filter_city="Казань")
+
+    assert pair_batch([ivan, anna]) == []
+
+
+def test_never_pairs_a_user_with_themselves():
+    # Accepts their own profile
+    alex = waiting("alex", 30, "male", "male")
+    # The same user twice, e.g. from two tabs
+    assert pair_batch([alex, waiting("alex", 30, "male", "male")]) == []
+
+
+def test_can_meet_vetoes_a_pair():
+    ivan = waiting("ivan", 30, "male", "female")
+    anna = waiting("anna", 28, "female", "male")
+    vera = waiting("vera", 29, "female", "male")
+
+    pairs = pair_batch([ivan, anna, vera], can_meet=lambda a, b: {a.user_id, b.user_id} != {"ivan", "anna"})
+    assert ids(pairs) == [("ivan", "vera")]
+
+
+def test_each_user_is_in_at_most_one_pair():
+    users = [waiting(f"m{i}", 30, "male", "female") for i in range(3)]
+    users += [waiting(f"f{i}", 28, "female", "male") for i in range(5)]
+
+    pairs = pair_batch(users)
+    paired = [user_id for pair in ids(pairs) for user_id in pair]
+    assert len(pairs) == 3
+    assert len(paired) == len(set(paired))
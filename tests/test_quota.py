@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import ASCENDING, ReturnDocument
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from services import quota  # noqa: E402
+
+NOW = datetime(2030, 1, 1, 12, tzinfo=timezone.utc)
+
+
+class DailyCommunications:
+    """mongomock collection whose find_one_and_update returns the document it
+    updated, as MongoDB does. mongomock looks the document up again with the
+    original filter when _id is projected out, which no longer matches once
+    the guarded update has used the last communication."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE):
+        assert return_document is ReturnDocument.AFTER
+        found = await self._collection.find_one(query, {"_id": 1})
+        if found is not None:
+            doc_id = found["_id"]
+            await self._collection.update_one({"_id": doc_id}, update)
+        elif upsert:
+            doc_id = (await self._collection.update_one(query, update, upsert=True)).upserted_id
+        else:
+            return None
+        return await self._collection.find_one({"_id": doc_id}, projection)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = DailyCommunications(mongomock_motor.AsyncMongoMockClient()["test"]["daily_communications"])
+    monkeypatch.setattr(quota, "daily_communications_collection", collection)
+    monkeypatch.setattr(quota, "_index_ready", False)
+    monkeypatch.setattr(quota, "_index_checked_at", None)
+    return collection
+
+
+async def create_index(collection):
+    await collection.create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True, name=quota.QUOTA_INDEX)
+
+
+def test_consume_stops_at_free_plus_premium(collection):
+    async def main():
+        await create_index(collection)
+        used = [await quota.consume("ivan", premium_count=2, now=NOW) for _ in range(quota.FREE_DAILY + 4)]
+
+        assert [record["used_count"] for record in used if record] == list(range(1, quota.FREE_DAILY + 3))
+        assert used[quota.FREE_DAILY + 2:] == [None, None]
+        assert await collection.count_documents({"user_id": "ivan"}) == 1
+    asyncio.run(main())
+
+
+def test_concurrent_consume_never_goes_over_the_limit(collection):
+    async def main():
+        await create_index(collection)
+        results = await asyncio.gather(*(quota.consume("ivan", now=NOW) for _ in range(quota.FREE_DAILY * 2)))
+
+        assert sum(record is not None for record in results) == quota.FREE_DAILY
+        record = await collection.find_one({"user_id": "ivan"})
+        assert record["used_count"] == quota.FREE_DAILY
+    asyncio.run(main())
+
+
+def test_refund_gives_back_one_and_never_goes_negative(collection):
+    async def main():
+        await create_index(collection)
+        for _ in range(quota.FREE_DAILY):
+            await quota.consume("ivan", now=NOW)
+        assert await quota.consume("ivan", now=NOW) is None
+
+        await quota.refund("ivan", now=NOW)
+        assert (await quota.consume("ivan", now=NOW))["used_count"] == quota.FREE_DAILY
+
+        await quota.refund("olga", now=NOW)
+        record = await quota.get_today("olga", now=NOW)
+        assert record["used_count"] == 0
+        await quota.refund("olga", now=NOW)
+        assert (await quota.get_today("olga", now=NOW))["used_count"] == 0
+    asyncio.run(main())
+
+
+def test_consume_is_refused_without_the_unique_index(collection):
+    async def main():
+        with pytest.raises(quota.QuotaUnavailable):
+            await quota.consume("ivan", now=NOW)
+        with pytest.raises(quota.QuotaUnavailable):
+            await quota.get_today("ivan", now=NOW)
+        assert await collection.count_documents({}) == 0
+    asyncio.run(main())
+
+
+def test_summarize_uses_free_communications_first():
+    assert quota.summarize({"free_count": 5, "premium_count": 3, "used_count": 2}) == {
+        "remaining_free": 3, "premium_available": 3, "total_available": 6,
+    }
+    assert quota.summarize({"free_count": 5, "premium_count": 3, "used_count": 7}) == {
+        "remaining_free": 0, "premium_available": 1, "total_available": 1,
+    }
+    # Never negative, even for a record over the limit
+    assert quota.summarize({"free_count": 5, "premium_count": 3, "used_count": 10}) == {
+        "remaining_free": 0, "premium_available": 0, "total_available": 0,
+    }
+    assert quota.summarize({})["total_available"] == quota.FREE_DAILY
+
+
+def test_precreate_is_idempotent(collection):
+    async def main():
+        await create_index(collection)
+        await quota.consume("ivan", now=NOW)
+        day = quota.day_key(NOW)
+
+        assert await quota.precreate([("ivan", 0), ("olga", 2)], day) == 1
+        assert await quota.precreate([("ivan", 0), ("olga", 2)], day) == 0
+        assert (await collection.find_one({"user_id": "ivan"}))["used_count"] == 1
+        assert await collection.count_documents({}) == 2
+    asyncio.run(main())
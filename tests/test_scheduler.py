@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from services import scheduler as scheduler_module  # noqa: E402
+from services.scheduler import Job, Scheduler, every  # noqa: E402
+
+NOW = datetime(2030, 1, 1, 12, tzinfo=timezone.utc)
+LEASE = 300
+
+
+@pytest.fixture
+def jobs_collection(monkeypatch):
+    collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]["scheduler_jobs"]
+    monkeypatch.setattr(scheduler_module, "scheduler_jobs_collection", collection)
+    return collection
+
+
+def make_job(runs):
+    async def func():
+        runs.append(1)
+    # Due right away: next_run_at is set to now when the job is first seen
+    return Job("cleanup", func, lambda now: now)
+
+
+def test_only_one_worker_claims_a_due_job(jobs_collection):
+    async def main():
+        job = make_job([])
+        workers = [Scheduler(15, LEASE) for _ in range(3)]
+        for worker in workers:
+            await worker._ensure(job, NOW)
+        assert await jobs_collection.count_documents({}) == 1
+
+        claims = [await worker._claim(job, NOW) for worker in workers]
+        assert claims == [True, False, False]
+        assert (await jobs_collection.find_one({"_id": "cleanup"}))["owner"] == workers[0].owner
+    asyncio.run(main())
+
+
+def test_lease_of_a_dead_worker_expires(jobs_collection):
+    async def main():
+        job = make_job([])
+        first, second = Scheduler(15, LEASE), Scheduler(15, LEASE)
+        await first._ensure(job, NOW)
+        assert await first._claim(job, NOW)
+
+        assert not await second._claim(job, NOW + timedelta(seconds=LEASE - 1))
+        assert await second._claim(job, NOW + timedelta(seconds=LEASE))
+    asyncio.run(main())
+
+
+def test_finished_job_releases_the_lease_until_its_next_run(jobs_collection):
+    async def main():
+        runs = []
+        job = Job("cleanup", make_job(runs).func, every(3600))
+        first, second = Scheduler(15, LEASE), Scheduler(15, LEASE)
+        await jobs_collection.insert_one({"_id": "cleanup", "next_run_at": NOW, "lease_until": NOW})
+
+        assert await first._claim(job, NOW)
+        await first.run_job(job)
+        assert runs == [1]
+
+        state = await jobs_collection.find_one({"_id": "cleanup"})
+        assert state["last_error"] is None
+        assert state["next_run_at"] > datetime.now(timezone.utc) + timedelta(minutes=59)
+        # Not due again until next_run_at, whoever asks
+        assert not await second._claim(job, datetime.now(timezone.utc))
+        assert await second._claim(job, state["next_run_at"])
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from services import seen_filter as seen_filter_module
+from services.seen_filter import SeenFilter, id_hash
+
+START = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+class Clock(datetime):
+    current = START
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+def make_filter(monkeypatch):
+    Clock.current = START
+    monkeypatch.setattr(seen_filter_module, "datetime", Clock)
+    return SeenFilter(window_days=2, bits=4096)
+
+
+def test_record_is_symmetric(monkeypatch):
+    seen = make_filter(monkeypatch)
+    seen.record("ivan", "anna")
+
+    assert seen.seen("ivan", "anna")
+    assert seen.seen("anna", "ivan")
+    assert not seen.seen("ivan", "olga")
+    assert not seen.seen("olga", "ivan")
+
+
+def test_matcher_tests_an_array_of_hashes(monkeypatch):
+    seen = make_filter(monkeypatch)
+    seen.record("ivan", "anna")
+    seen.record("ivan", "vera")
+
+    assert seen.matcher("olga") is None
+    hashes = np.array([id_hash(user_id) for user_id in ("anna", "olga", "vera")], dtype=np.uint64)
+    assert seen.matcher("ivan")(hashes).tolist() == [True, False, True]
+
+
+def test_entries_survive_one_rotation_and_expire_after_two(monkeypatch):
+    seen = make_filter(monkeypatch)
+    seen.record("ivan", "anna")
+
+    # Next half of the window: the entry moves to the previous filter
+    Clock.current = START + timedelta(days=1)
+    seen.record("ivan", "vera")
+    assert seen.seen("ivan", "anna")
+    assert seen.seen("ivan", "vera")
+
+    # One more half: only what was recorded in the previous half remains
+    Clock.current = START + timedelta(days=2)
+    assert not seen.seen("ivan", "anna")
+    assert seen.seen("ivan", "vera")
+
+    Clock.current = START + timedelta(days=3)
+    assert not seen.seen("ivan", "vera")
+
+    # prune() drops users whose whole window has passed
+    Clock.current = START + timedelta(days=5)
+    seen.prune()
+    assert len(seen) == 0
+
+
+def test_records_older_than_the_window_are_ignored(monkeypatch):
+    seen = make_filter(monkeypatch)
+    seen.record("ivan", "anna", at=START - timedelta(days=1))
+    seen.record("ivan", "olga", at=START - timedelta(days=2))
+
+    assert seen.seen("ivan", "anna")
+    assert not seen.seen("ivan", "olga")
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("lupa")
+fakeredis = pytest.importorskip("fakeredis")
+
+from services.signaling import RedisSignalingRegistry  # noqa: E402
+
+
+def run(test):
+    async def main():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        try:
+            await test(RedisSignalingRegistry(redis, prefix="test:"), redis)
+        finally:
+            await redis.aclose()
+    asyncio.run(main())
+
+
+def test_join_pairs_with_first_peer_in_room():
+    async def test(registry, redis):
+        assert await registry.join("a", "room1", "alice") == (None, [])
+        assert await registry.join("b", "room1", "bob") == (None, ["a"])
+
+        assert await registry.peer_of("a") == "b"
+        assert await registry.peer_of("b") == "a"
+        assert await registry.room_sids("room1") == ["a", "b"]
+        assert await registry.user_sids("alice") == ["a"]
+    run(test)
+
+
+def test_join_another_room_leaves_the_previous_one():
+    async def test(registry, redis):
+        await registry.join("a", "room1", "alice")
+        await registry.join("b", "room1", "bob")
+
+        assert await registry.join("a", "room2", "alice") == ("room1", [])
+        assert await registry.room_sids("room1") == ["b"]
+        assert await registry.peer_of("a") is None
+        assert await registry.peer_of("b") is None
+        assert await registry.user_sids("alice") == ["a"]
+    run(test)
+
+
+def test_disconnect_returns_peer_and_cleans_up():
+    async def test(registry, redis):
+        await registry.join("a", "room1", "alice")
+        await registry.join("b", "room1", "bob")
+
+        assert await registry.disconnect("a") == "b"
+        assert await registry.peer_of("b") is None
+        assert await registry.room_sids("room1") == ["b"]
+        assert await registry.user_sids("alice") == []
+        assert not await redis.exists("test:conn:a")
+
+        assert await registry.disconnect("b") is None
+        assert await registry.room_sids("room1") == []
+        assert await redis.keys("test:*") == ["test:seq"]
+    run(test)
+
+
+def test_disconnect_unknown_sid():
+    async def test(registry, redis):
+        assert await registry.disconnect("missing") is None
+    run(test)